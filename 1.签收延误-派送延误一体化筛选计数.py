@@ -1,5 +1,14 @@
 import pandas as pd
 import os
+import re
+import glob
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ccr_tools.common_io import iter_table_chunks, DEFAULT_CHUNKSIZE
+from ccr_tools.excel_cache import read_excel_cached
+from ccr_tools.schema import apply_schema, fill_missing, normalize_text
+from ccr_tools.script_loader import call_script
+from ccr_tools.table_writer import write_table
 
 PARAM_PROMPTS = {
     "input_path": "请输入文件的绝对路径：",
@@ -7,7 +16,125 @@ PARAM_PROMPTS = {
     "date_prefix": '请输入输出文件的日期前缀：'
 }
 
-def main(input_path, output_dir, date_prefix):
+# 需要读取的列
+SELECTED_COLUMNS = ['省区名称', 'K码', '揽收网点名称', '工单来源', '工单小类', '客户名称']
+
+# 计数分组的客户维度
+GROUP_COLUMNS = ['省区名称', '揽收网点名称', 'K码', '客户名称']
+
+
+def count_chunks(chunks):
+    """
+    逐块筛选“客户管家小圆”的签收延误/派送延误工单，并累加各客户的计数。
+    内存占用只与客户分组数量有关，与文件行数无关。
+    """
+    running_count = None
+    source_values, subtype_values = set(), set()
+    source_rows = sign_rows = delivery_rows = 0
+
+    for chunk in chunks:
+        # 筛选需要的列（按分类类型处理），填充空值为"空值"，确保所有列中空值都显示为"空值"
+        filtered_df = fill_missing(apply_schema(chunk[SELECTED_COLUMNS].copy()), "空值")
+
+        # 记录筛选条件的唯一值
+        source_values.update(filtered_df['工单来源'].unique())
+        subtype_values.update(filtered_df['工单小类'].unique())
+
+        # 去除列值中的额外空格并统一转换为小写
+        filtered_df['工单来源'] = normalize_text(filtered_df['工单来源'])
+        filtered_df['工单小类'] = normalize_text(filtered_df['工单小类'])
+
+        # 记录满足单个条件的数据行数
+        is_source = filtered_df['工单来源'] == '客户管家小圆'
+        is_sign = filtered_df['工单小类'] == '签收延误'
+        is_delivery = filtered_df['工单小类'] == '派送延误'
+        source_rows += int(is_source.sum())
+        sign_rows += int(is_sign.sum())
+        delivery_rows += int(is_delivery.sum())
+
+        # 筛选特定条件的行，并对本块数据进行计数统计
+        chunk_count = filtered_df[is_source & (is_sign | is_delivery)].groupby(GROUP_COLUMNS, observed=True).size()
+        if running_count is None:
+            running_count = chunk_count
+        else:
+            running_count = running_count.add(chunk_count, fill_value=0)
+
+    if running_count is None:
+        return None
+
+    # 打印筛选条件的唯一值
+    print("工单来源的唯一值：", list(source_values))
+    print("工单小类的唯一值：", list(subtype_values))
+
+    # 检查满足单个条件的数据
+    print("满足 '工单来源 == 客户管家小圆' 的数据行数：", source_rows)
+    print("满足 '工单小类 == 签收延误' 的数据行数：", sign_rows)
+    print("满足 '工单小类 == 派送延误' 的数据行数：", delivery_rows)
+
+    return running_count.astype(int).reset_index(name='计数项：单号')
+
+
+def count_file(input_path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    读取单个文件并统计各客户的签收延误/派送延误工单数，按计数降序排列
+    """
+    if chunksize:
+        # 流式模式：只读取需要的列，逐块筛选并累加计数
+        chunks = iter_table_chunks(input_path, usecols=SELECTED_COLUMNS, chunksize=chunksize,
+                                   dtype={col: 'category' for col in SELECTED_COLUMNS})
+    else:
+        # Excel 文件通过列式缓存读取，未改动过的文件不再重复解析
+        if input_path.lower().endswith(('.xlsx', '.xls')):
+            df = read_excel_cached(input_path)
+        else:
+            df = pd.read_csv(input_path)
+
+        # 打印列名
+        print("列名：", df.columns)
+        chunks = [df]
+
+    count_result = count_chunks(chunks)
+    if count_result is None:
+        raise ValueError(f"输入文件中没有数据：{input_path}")
+
+    # 按计数降序排列
+    return count_result.sort_values(by='计数项：单号', ascending=False)
+
+
+def count_frame(df):
+    """
+    对已读入内存的表格统计各客户的签收延误/派送延误工单数，按计数降序排列（供流水线直接传入数据）
+    """
+    count_result = count_chunks([df])
+    if count_result is None:
+        raise ValueError("输入表格中没有数据")
+    return count_result.sort_values(by='计数项：单号', ascending=False)
+
+
+def save_count_result(count_result, output_dir, date_prefix, output_format=None):
+    """
+    将计数结果保存为“日期前缀-签收派送延误筛选.xlsx”（output_format 可改为 csv/parquet），返回输出文件路径
+    """
+    # 确保输出文件夹存在
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"创建输出文件夹：{output_dir}")
+
+    # 设置输出文件名
+    output_filename = f"{date_prefix}-签收派送延误筛选.xlsx"
+    output_path = os.path.join(output_dir, output_filename)
+
+    print(f"正在保存结果到文件：{output_path}")
+    output_path = write_table(count_result, output_path, fmt=output_format)
+
+    # 打印结果
+    print("筛选并计数完成！")
+    print(count_result)
+    print(f"结果已保存到 {output_path}")
+    return output_path
+
+
+def main(input_path, output_dir, date_prefix, chunksize=DEFAULT_CHUNKSIZE, output_format=None):
     try:
         # 去除路径中的引号
         input_path = input_path.strip('"')
@@ -34,92 +161,188 @@ def main(input_path, output_dir, date_prefix):
             print(f"文件不存在：{input_path}")
             return
 
-        # 判断文件是否为 CSV 文件
-        is_csv = input_path.lower().endswith('.csv')
-
-        # 若不是 CSV 文件且是 Excel 文件，则转换为 CSV 文件
-        if not is_csv and input_path.lower().endswith(('.xlsx', '.xls')):
-            # 创建一个新的 CSV 文件路径
-            csv_file_path = input_path.rsplit('.', 1)[0] + '_转换.csv'
-            # 读取 Excel 文件并保存为 CSV
-            df = pd.read_excel(input_path)
-            df.to_csv(csv_file_path, index=False)
-            print(f"已将 Excel 文件转换为 CSV 文件：{csv_file_path}")
-            input_path = csv_file_path
-        elif not is_csv:
-            print("不支持的文件格式，请输入 CSV 或 Excel 文件")
-            return
+        count_result = count_file(input_path, chunksize)
+        save_count_result(count_result, output_dir, date_prefix, output_format)
+    
+        return {'success': True, 'message': "操作成功完成！"}
+    
+    except Exception as e:
+        # 返回失败状态和错误信息
+        return {'success': False, 'message': str(e)}
 
-        # 读取文件
-        df = pd.read_csv(input_path)
+# 从文件名中推断日期前缀的规则，按顺序匹配
+DATE_PATTERNS = [
+    r'(?<!\d)\d{4}[-_.年]\d{1,2}[-_.月]\d{1,2}日?(?!\d)',
+    r'(?<!\d)\d{8}(?!\d)',
+    r'(?<!\d)\d{1,2}[-_.月]\d{1,2}日?(?!\d)',
+]
 
-        # 打印列名
-        print("列名：", df.columns)
 
-        # 筛选需要的列
-        selected_columns = ['省区名称', 'K码', '揽收网点名称', '工单来源', '工单小类', '客户名称']
-        filtered_df = df[selected_columns]
+def infer_date_prefix(file_path):
+    """
+    从文件名中推断日期前缀，如“2024-10-01投诉明细.xlsx”得到“2024-10-01”；
+    文件名中没有日期时使用文件名本身
+    """
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    for pattern in DATE_PATTERNS:
+        match = re.search(pattern, stem)
+        if match:
+            return match.group(0)
+    return stem
 
-        # 填充空值为"空值"，确保所有列中空值都显示为"空值"
-        filtered_df = filtered_df.fillna("空值")
 
-        # 打印筛选条件的唯一值
-        print("工单来源的唯一值：", filtered_df['工单来源'].unique())
-        print("工单小类的唯一值：", filtered_df['工单小类'].unique())
+def parse_date_prefix(date_prefix):
+    """
+    把日期前缀解析为 (年, 月, 日)，没有年份时年为 None；不是有效日期时返回 None
+    """
+    digits = re.findall(r'\d+', date_prefix)
+    if len(digits) == 1 and len(digits[0]) == 8:
+        digits = [digits[0][:4], digits[0][4:6], digits[0][6:]]
+    if len(digits) == 3 and len(digits[0]) == 4:
+        year, month, day = (int(part) for part in digits)
+    elif len(digits) == 2:
+        year, (month, day) = None, (int(part) for part in digits)
+    else:
+        return None
+    try:
+        date(year or 2000, month, day)
+    except ValueError:
+        return None
+    return year, month, day
 
-        # 使用.copy() 来确保操作的 DataFrame 是原始 DataFrame 或其副本
-        filtered_df = filtered_df.copy()
 
-        # 去除列值中的额外空格
-        filtered_df['工单来源'] = filtered_df['工单来源'].str.strip()
-        filtered_df['工单小类'] = filtered_df['工单小类'].str.strip()
+def date_sort_key(date_prefix):
+    """
+    日期前缀的排序键：能解析为日期的按日期先后排列（如 2024-10-2 排在 2024-10-10 之前），其余按文本排在最后
+    """
+    parsed = parse_date_prefix(date_prefix)
+    if parsed is None:
+        return 1, 0, 0, 0, date_prefix
+    year, month, day = parsed
+    return 0, year or 0, month, day, date_prefix
 
-        # 统一转换为小写
-        filtered_df['工单来源'] = filtered_df['工单来源'].str.lower()
-        filtered_df['工单小类'] = filtered_df['工单小类'].str.lower()
 
-        # 检查满足单个条件的数据
-        print("满足 '工单来源 == 客户管家小圆' 的数据行数：", filtered_df[filtered_df['工单来源'] == '客户管家小圆'].shape[0])
-        print("满足 '工单小类 == 签收延误' 的数据行数：", filtered_df[filtered_df['工单小类'] == '签收延误'].shape[0])
-        print("满足 '工单小类 == 派送延误' 的数据行数：", filtered_df[filtered_df['工单小类'] == '派送延误'].shape[0])
+def format_date_prefix(date_prefix):
+    """
+    用于输出文件名的日期文本：能解析时统一为 YYYY-MM-DD（没有年份时为 MM-DD），否则保持原样
+    """
+    parsed = parse_date_prefix(date_prefix)
+    if parsed is None:
+        return date_prefix
+    year, month, day = parsed
+    return f"{year:04d}-{month:02d}-{day:02d}" if year else f"{month:02d}-{day:02d}"
 
-        # 筛选特定条件的行
-        filtered_df = filtered_df[(filtered_df['工单来源'] == '客户管家小圆') & 
-                                ((filtered_df['工单小类'] == '签收延误') | (filtered_df['工单小类'] == '派送延误'))]
 
-        # 对筛选后的数据进行计数统计
-        count_result = filtered_df.groupby(['省区名称', '揽收网点名称', 'K码', '客户名称']).size().reset_index(name='计数项：单号')
+def list_batch_files(input_pattern):
+    """
+    展开文件夹或通配符路径，返回其中的 CSV/Excel 文件（跳过临时文件和本脚本的输出文件）
+    """
+    input_pattern = input_pattern.strip('"')
+    if os.path.isdir(input_pattern):
+        paths = [os.path.join(input_pattern, name) for name in os.listdir(input_pattern)]
+    else:
+        paths = glob.glob(input_pattern)
 
-        # 按计数降序排列
-        count_result = count_result.sort_values(by='计数项：单号', ascending=False)
+    return sorted(
+        path for path in paths
+        if path.lower().endswith(('.csv', '.xlsx', '.xls'))
+        and not os.path.basename(path).startswith('~$')
+        and not path.endswith(('-签收派送延误筛选.xlsx', '-签收派送延误多日排名.xlsx'))
+    )
 
-        # 确保输出文件夹存在
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            print(f"创建输出文件夹：{output_dir}")
 
-        # 设置输出文件名
-        output_filename = f"{date_prefix}-签收派送延误筛选.xlsx"
-        output_path = os.path.join(output_dir, output_filename)
+def process_day(input_path, output_dir, date_prefix, chunksize=DEFAULT_CHUNKSIZE, output_format=None):
+    """
+    批量模式中单个文件的处理任务：统计并保存当天结果，返回计数结果
+    """
+    count_result = count_file(input_path, chunksize)
+    save_count_result(count_result, output_dir, date_prefix, output_format)
+    return count_result
 
-        print(f"正在保存结果到文件：{output_path}")
-        count_result.to_excel(output_path, index=False)
 
-        # 打印结果
-        print("筛选并计数完成！")
-        print(count_result)
-        print(f"结果已保存到 {output_path}")
-    
-        return {'success': True, 'message': "操作成功完成！"}
-    
+def build_multi_day_ranking(daily_results):
+    """
+    合并各天的计数结果，按日期展开并按合计降序排列
+    """
+    dates = sorted(daily_results, key=date_sort_key)
+    combined = pd.concat(
+        [daily_results[date].astype({col: object for col in GROUP_COLUMNS}).assign(日期=date) for date in dates],
+        ignore_index=True
+    )
+    ranking = combined.pivot_table(index=GROUP_COLUMNS, columns='日期', values='计数项：单号',
+                                   aggfunc='sum', fill_value=0)
+    ranking = ranking.reindex(columns=dates, fill_value=0)
+    ranking['出现天数'] = (ranking[dates] > 0).sum(axis=1)
+    ranking['合计'] = ranking[dates].sum(axis=1)
+    ranking.columns.name = None
+    return ranking.sort_values(by='合计', ascending=False).reset_index()
+
+
+def batch_main(input_pattern, output_dir, max_workers=None, chunksize=DEFAULT_CHUNKSIZE, output_format=None):
+    """
+    批量模式：处理文件夹或通配符匹配到的多天导出文件，按文件名推断日期前缀，
+    各文件在进程池中并行处理，最后输出多日合并排名
+    """
+    try:
+        output_dir = output_dir.strip('"') if output_dir else None
+        if not output_dir:
+            raise ValueError("输出目录路径不能为空")
+
+        input_paths = list_batch_files(input_pattern)
+        if not input_paths:
+            raise ValueError("未找到任何 CSV 或 Excel 文件")
+
+        date_prefixes = {path: infer_date_prefix(path) for path in input_paths}
+        if len(set(date_prefixes.values())) < len(date_prefixes):
+            raise ValueError("多个文件推断出了相同的日期前缀，请检查文件名")
+        print(f"共找到 {len(input_paths)} 个文件，开始并行处理")
+
+        daily_results = {}
+        failed = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(call_script, __file__, 'process_day', path, output_dir, date_prefix,
+                                chunksize, output_format): path
+                for path, date_prefix in date_prefixes.items()
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    daily_results[date_prefixes[path]] = future.result()
+                    print(f"[{len(daily_results) + len(failed)}/{len(futures)}] 已完成：{path}")
+                except Exception as e:
+                    failed.append(f"{path}：{e}")
+                    print(f"[{len(daily_results) + len(failed)}/{len(futures)}] 处理失败：{path}：{e}")
+
+        if not daily_results:
+            raise ValueError("所有文件均处理失败：\n" + "\n".join(failed))
+
+        # 输出多日合并排名
+        ranking = build_multi_day_ranking(daily_results)
+        dates = sorted(daily_results, key=date_sort_key)
+        ranking_path = os.path.join(
+            output_dir, f"{format_date_prefix(dates[0])}至{format_date_prefix(dates[-1])}-签收派送延误多日排名.xlsx"
+        )
+        ranking_path = write_table(ranking, ranking_path, fmt=output_format)
+        print(f"多日排名已保存到 {ranking_path}")
+
+        message = f"操作成功完成！共处理 {len(daily_results)} 个文件"
+        if failed:
+            message += f"，{len(failed)} 个文件处理失败：\n" + "\n".join(failed)
+        return {'success': True, 'message': message, 'failed': failed}
+
     except Exception as e:
-        # 返回失败状态和错误信息
         return {'success': False, 'message': str(e)}
 
+
 # 如果直接运行此脚本（而非被导入），则可以从命令行获取参数并调用 main 函数
+# 输入文件夹或通配符路径（如 D:\投诉\*.xlsx）时进入批量模式
 if __name__ == "__main__":
-    input_path = input("请输入文件的绝对路径：").strip('"')
+    input_path = input("请输入文件的绝对路径（批量处理时输入文件夹或通配符路径）：").strip('"')
     output_dir = input("请输入输出文件夹的绝对路径：").strip('"')
-    date_prefix = input('请输入输出文件的日期前缀：').strip('"')
-    result = main(input_path, output_dir, date_prefix)
+    if os.path.isdir(input_path) or any(ch in input_path for ch in '*?['):
+        result = batch_main(input_path, output_dir)
+    else:
+        date_prefix = input('请输入输出文件的日期前缀：').strip('"')
+        result = main(input_path, output_dir, date_prefix)
     print(result['message'])
\ No newline at end of file
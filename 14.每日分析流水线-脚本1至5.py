@@ -0,0 +1,135 @@
+import pandas as pd
+import os
+from ccr_tools.common_io import DEFAULT_CHUNKSIZE
+from ccr_tools.excel_cache import read_excel_cached
+from ccr_tools.schema import apply_schema
+from ccr_tools.script_loader import find_script, load_script
+
+"""
+14. 每日分析流水线：脚本1（客户排名）→ 2（客户明细）→ 3（匹配入库时间）→ 4（透视分析）→ 5（图表）
+各步骤之间在内存中直接传递数据表，原始表格和轨迹表各只解析一次；中间结果只在需要时写出
+"""
+PARAM_PROMPTS = {
+    'input_path': "请输入原始工单表格的路径：",
+    'tracking_path': "请输入“查询结果-运单号”表格的路径：",
+    'output_dir': "请输入输出文件夹的绝对路径：",
+    'date_prefix': '请输入输出文件的日期前缀：',
+    'top_n': '请输入要分析的前几位客户数量：'
+}
+
+def read_table(file_path):
+    """
+    读取原始表格（Excel 经列式缓存），客户维度等低基数列按分类类型处理
+    """
+    if file_path.lower().endswith('.csv'):
+        df = pd.read_csv(file_path)
+    else:
+        df = read_excel_cached(file_path)
+    return apply_schema(df)
+
+def main(input_path, tracking_path, output_dir, date_prefix, top_n=3, extra_conditions=None,
+         save_intermediate=False, rollup=False, store_path=None, chunksize=DEFAULT_CHUNKSIZE,
+         output_format=None):
+    try:
+        # 去除路径中的引号
+        input_path = input_path.strip('"')
+        tracking_path = tracking_path.strip('"') if tracking_path else None
+        store_path = store_path.strip('"') if store_path else None
+        output_dir = output_dir.strip('"')
+
+        # 检查输入路径
+        if not input_path or not os.path.exists(input_path):
+            raise ValueError("原始工单表格路径无效或不存在")
+        if tracking_path and not os.path.exists(tracking_path):
+            raise ValueError("查询结果-运单号表格路径无效或不存在")
+        if not tracking_path and not store_path:
+            raise ValueError("查询结果-运单号表格路径无效或不存在")
+
+        # 检查输出目录和日期前缀
+        if not output_dir:
+            raise ValueError("输出目录路径不能为空")
+        if not date_prefix:
+            raise ValueError("日期前缀不能为空")
+
+        # 检查文件格式
+        for path in (input_path, tracking_path):
+            if path and not path.lower().endswith(('.csv', '.xlsx', '.xls')):
+                raise ValueError(f"不支持的文件格式，请使用Excel或CSV文件：{path}")
+
+        try:
+            top_n = int(top_n)
+        except (TypeError, ValueError):
+            raise ValueError("前几位客户数量必须是整数")
+        if top_n <= 0:
+            raise ValueError("前几位客户数量必须大于 0")
+
+        ranking_script = load_script(find_script(1))
+        detail_script = load_script(find_script(2))
+        time_diff_script = load_script(find_script(3))
+        analysis_script = load_script(find_script(4))
+        chart_script = load_script(find_script(5))
+
+        # 原始表格只解析一次，脚本1的计数和脚本2的明细筛选共用
+        raw_df = read_table(input_path)
+        print(f"原始表格共有 {len(raw_df)} 行数据。")
+
+        # 1. 统计各客户的签收延误/派送延误工单数
+        print("\n[1/5] 客户排名")
+        count_result = ranking_script.count_frame(raw_df).reset_index(drop=True)
+        if save_intermediate:
+            ranking_script.save_count_result(count_result, output_dir, date_prefix, output_format)
+        if len(count_result) == 0:
+            raise ValueError("原始表格中没有满足条件的签收延误/派送延误工单")
+
+        # 2. 取前几位客户的明细
+        print("\n[2/5] 客户明细")
+        top_n = min(top_n, len(count_result))
+        row_numbers = ','.join(str(i) for i in range(top_n))
+        conditions_b, row_quantity = detail_script.select_condition_rows(count_result, top_n, row_numbers)
+        df_a = raw_df
+        conditions = detail_script.parse_extra_conditions(extra_conditions)
+        if conditions:
+            condition_filter = detail_script.ConditionFilter(conditions, df_a.columns)
+            df_a = df_a[condition_filter(df_a)]
+            condition_filter.report()
+        detail_df = detail_script.match_customers(df_a, conditions_b)
+        if save_intermediate:
+            detail_script.save_detail(detail_df, output_dir, date_prefix, row_quantity, output_format)
+
+        # 3. 匹配最早入库时间并计算时间差
+        print("\n[3/5] 时间差值明细")
+        time_diff_df = time_diff_script.build_time_diff_detail(detail_df, tracking_path, store_path, chunksize)
+        if save_intermediate:
+            time_diff_script.save_time_diff_detail(time_diff_df, output_dir, date_prefix, output_format)
+
+        # 4. 透视分析
+        print("\n[4/5] 时间差值分析")
+        sheets = analysis_script.analyze_time_diff(time_diff_df, rollup)
+        analysis_path = analysis_script.save_analysis(sheets, output_dir, date_prefix)
+
+        # 5. 图表
+        print("\n[5/5] 图表")
+        interval_matrix = chart_script.count_intervals(time_diff_df)
+        chart_script.save_interval_matrix(interval_matrix, output_dir, date_prefix)
+        total_image_data = chart_script.render_charts(interval_matrix, output_dir, date_prefix)
+
+        return {
+            'success': True,
+            'message': f"操作成功完成！分析结果已保存到 {analysis_path}，并生成了{len(interval_matrix)}个客户的图表",
+            'total_image_data': total_image_data
+        }
+
+    except Exception as e:
+        # 返回失败状态和错误信息
+        return {'success': False, 'message': str(e)}
+
+# 如果直接运行此脚本（而非被导入），则可以从命令行获取参数并调用 main 函数
+if __name__ == "__main__":
+    input_path = input("请输入原始工单表格的路径：").strip('"')
+    tracking_path = input("请输入“查询结果-运单号”表格的路径：").strip('"')
+    output_dir = input("请输入输出文件夹的绝对路径：").strip('"')
+    date_prefix = input('请输入输出文件的日期前缀：').strip('"')
+    top_n = input('请输入要分析的前几位客户数量：').strip()
+    save_intermediate = input('是否保存脚本1-3的中间结果（y/N）：').strip().lower() == 'y'
+    result = main(input_path, tracking_path, output_dir, date_prefix, top_n, save_intermediate=save_intermediate)
+    print(result['message'])
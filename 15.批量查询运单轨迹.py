@@ -0,0 +1,88 @@
+import pandas as pd
+import os
+from ccr_tools.excel_cache import read_excel_cached
+from ccr_tools.schema import normalize_keys
+from ccr_tools.table_writer import write_table
+from ccr_tools.tracking_client import DEFAULT_BATCH_SIZE, TRACKING_COLUMNS, HttpTrackingClient, query_tracking
+
+"""
+15. 批量查询运单轨迹：读取脚本2输出的单号列表，分批并发提交给轨迹查询接口，
+查询结果逐批写入“查询结果-运单号”表（脚本3的输入），不再需要按脚本7拆分后手工上传、再合并
+"""
+PARAM_PROMPTS = {
+    'input_path': "请输入单号列表（脚本2输出）表格的路径：",
+    'output_dir': "请输入输出文件夹的绝对路径：",
+    'date_prefix': '请输入输出文件的日期前缀：',
+    'endpoint': '请输入轨迹查询接口地址（直接回车使用环境变量 CCR_TRACKING_ENDPOINT）：'
+}
+
+# 单号列表中运单号所在的列，按顺序查找
+WAYBILL_COLUMNS = ['单号', '运单号']
+
+def read_waybills(input_path):
+    """
+    读取单号列表，返回运单号列（统一为键文本，含空值的数字列不会带上小数点）
+    """
+    if input_path.lower().endswith('.csv'):
+        df = pd.read_csv(input_path, dtype=str)
+    else:
+        df = read_excel_cached(input_path)
+    for col in WAYBILL_COLUMNS:
+        if col in df.columns:
+            return normalize_keys(df[col]).dropna()
+    raise ValueError(f"单号列表中没有找到运单号列（{'/'.join(WAYBILL_COLUMNS)}）")
+
+def print_progress(done, total, size):
+    print(f"[{done}/{total}] 已查询 {size} 个运单")
+
+def main(input_path, output_dir, date_prefix, endpoint=None, client=None, batch_size=DEFAULT_BATCH_SIZE,
+         max_workers=4, rate=None, max_retries=3, output_format=None):
+    try:
+        # 去除路径中的引号
+        input_path = input_path.strip('"')
+        output_dir = output_dir.strip('"')
+        endpoint = endpoint.strip('"') if endpoint else None
+
+        # 检查输入路径
+        if not input_path or not os.path.exists(input_path):
+            raise ValueError("单号列表路径无效或不存在")
+        if not input_path.lower().endswith(('.csv', '.xlsx', '.xls')):
+            raise ValueError("不支持的文件格式，请使用Excel或CSV文件")
+
+        # 检查输出目录和日期前缀
+        if not output_dir:
+            raise ValueError("输出目录路径不能为空")
+        if not date_prefix:
+            raise ValueError("日期前缀不能为空")
+
+        waybills = read_waybills(input_path)
+        print(f"单号列表共有 {len(waybills)} 个运单号，每批 {batch_size} 个，并发 {max_workers} 个请求")
+
+        # 未传入 client 时使用 HTTP 接口；对接其他查询系统时传入 TrackingClient 的子类
+        own_client = client is None
+        if own_client:
+            client = HttpTrackingClient(endpoint, max_retries=max_retries, rate=rate)
+        try:
+            # 查询结果逐批写出，不在内存中合并；没有任何结果时也写出表头
+            chunks = query_tracking(waybills, client, batch_size, max_workers, progress=print_progress)
+            output_path = os.path.join(output_dir, f"{date_prefix}-查询结果-运单号.xlsx")
+            output_path = write_table(chunks, output_path, sheet_name='查询结果', fmt=output_format,
+                                      columns=TRACKING_COLUMNS)
+        finally:
+            if own_client:
+                client.close()
+
+        return {'success': True, 'message': f"操作成功完成！查询结果已保存到 {output_path}", 'output_path': output_path}
+
+    except Exception as e:
+        # 返回失败状态和错误信息
+        return {'success': False, 'message': str(e)}
+
+# 如果直接运行此脚本（而非被导入），则可以从命令行获取参数并调用 main 函数
+if __name__ == "__main__":
+    input_path = input("请输入单号列表（脚本2输出）表格的路径：").strip('"')
+    output_dir = input("请输入输出文件夹的绝对路径：").strip('"')
+    date_prefix = input('请输入输出文件的日期前缀：').strip('"')
+    endpoint = input('请输入轨迹查询接口地址（直接回车使用环境变量 CCR_TRACKING_ENDPOINT）：').strip('"') or None
+    result = main(input_path, output_dir, date_prefix, endpoint)
+    print(result['message'])
@@ -1,7 +1,13 @@
 # 优化后的 _2筛选前几位客户明细.py 文件（适用于打包为 .exe 程序）
 
 import pandas as pd
+import numpy as np
 import os
+from ccr_tools.common_io import iter_table_chunks, DEFAULT_CHUNKSIZE
+from ccr_tools.key_index import read_matching_rows
+from ccr_tools.schema import (CATEGORY_COLUMNS, CUSTOMER_KEY_COLUMNS, apply_schema, concat_chunks, key_mask,
+                              normalize_keys, unify_categories)
+from ccr_tools.table_writer import write_table
 
 """
 2. 筛选前几位客户明细
@@ -16,7 +22,157 @@ PARAM_PROMPTS = {
     'extra_conditions': "请输入额外的固定值筛选条件（按列设置，可以输入多个条件）：\n例如：列名=工单小类,值=签收延误,派送延误\n请输入条件（格式：列名=值1,值2,...）："
 }
 
-def main(input_pathA=None, input_pathB=None, output_dir=None, date_prefix=None, row_quantity=None, row_numbers=None, extra_conditions=None):
+def parse_extra_conditions(extra_conditions):
+    """
+    解析“列名=值1,值2;列名=值1,...”格式的额外筛选条件，返回 [(列名, [值, ...]), ...]
+    """
+    parsed = []
+    if not extra_conditions:
+        return parsed
+    
+    for condition in extra_conditions.split(';'):
+        if '=' not in condition:
+            print(f"条件格式无效：{condition}，跳过此条件。")
+            continue
+        
+        col, values = condition.split('=', 1)
+        parsed.append((col.strip(), [value.strip() for value in values.split(',')]))
+    return parsed
+
+
+class ConditionFilter:
+    """
+    额外筛选条件：按输入顺序逐个应用，并累计每个条件应用后剩余的行数。
+    输入值按键文本比较（1001、1001.0 与输入的 "1001" 相同），与表格A各块推断出的数据类型无关；
+    只把少量的输入值转换为列的类型后 isin，不逐行转换表格A
+    """
+
+    def __init__(self, conditions, columns):
+        self.checks = []
+        for col, values in conditions:
+            # 验证列名是否有效
+            if col not in columns:
+                print(f"列名 '{col}' 不存在于表格A中，跳过此条件。")
+                continue
+            
+            # 输入值按原文匹配文本列，能转换为数字的同时按数字的键文本匹配数字列
+            numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce')
+            keys = set(value.strip() for value in values) | set(normalize_keys(numbers).dropna())
+            self.checks.append((col, values, keys))
+        self.remaining = [0] * len(self.checks)
+
+    def __call__(self, chunk):
+        mask = np.ones(len(chunk), dtype=bool)
+        for i, (col, values, keys) in enumerate(self.checks):
+            mask &= key_mask(chunk[col], keys)
+            self.remaining[i] += int(mask.sum())
+        return mask
+
+    def report(self):
+        for (col, values, _), count in zip(self.checks, self.remaining):
+            print(f"应用条件 '{col} in {values}' 后的表格A数据行数：", count)
+
+
+def read_filtered_table(file_path, conditions, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    分块读取表格，逐块应用筛选条件，只保留满足条件的行，返回 (筛选后的表格, 原始总行数)
+    """
+    condition_filter = None
+    kept_chunks = []
+    total_rows = 0
+    # 分类列按推断的类型读取后再使用整个文件共用的字典，数字 K码 保持为数字
+    for chunk in iter_table_chunks(file_path, chunksize=chunksize,
+                                   dtype={col: 'category' for col in CATEGORY_COLUMNS}):
+        if condition_filter is None:
+            condition_filter = ConditionFilter(conditions, chunk.columns)
+        total_rows += len(chunk)
+        kept_chunks.append(chunk[condition_filter(chunk)])
+    
+    if not kept_chunks:
+        return pd.DataFrame(), 0
+    condition_filter.report()
+    return concat_chunks(kept_chunks), total_rows
+
+def select_condition_rows(df_b, row_quantity, row_numbers):
+    """
+    按“行数量”和逗号分隔的“行索引”从筛选条件表中取出客户维度列，返回 (条件数据, 行数量)
+    """
+    try:
+        row_numbers = [int(num.strip()) for num in row_numbers.split(',')]
+        row_quantity = int(row_quantity)
+    except:
+        raise ValueError("行索引或行数量参数格式不正确")
+    
+    # 验证输入的行数量是否与指定数量一致
+    if len(row_numbers) != row_quantity:
+        raise ValueError(f"输入的行索引数量与指定的行数量 {row_quantity} 不一致")
+    
+    # 验证索引是否在有效范围内
+    if any(idx < 0 or idx >= len(df_b) for idx in row_numbers):
+        raise ValueError("输入的行索引超出有效范围")
+    
+    conditions_b = df_b[CUSTOMER_KEY_COLUMNS].iloc[row_numbers]
+    
+    # 打印条件数据，供用户检查
+    print("用于筛选的条件数据：")
+    print(conditions_b)
+    return conditions_b, row_quantity
+
+
+def match_customers(df_a, conditions_b):
+    """
+    将（已应用额外筛选条件的）表格A与条件数据按客户维度匹配，返回匹配到的明细
+    """
+    required_columns = CUSTOMER_KEY_COLUMNS
+    
+    # 客户维度等低基数列按分类类型处理
+    df_a = apply_schema(df_a)
+    
+    print(f"应用额外筛选条件后的表格A数据行数：{len(df_a)}")
+    print("原始表格A的列名：", df_a.columns)
+    print("原始表格A的前10行数据：")
+    print(df_a.head(10))
+    
+    # 检查应用条件后表格A是否有数据
+    if len(df_a) == 0:
+        raise ValueError("应用条件后，表格A没有剩余数据。")
+    
+    # 合并表格A和表格B（客户维度列共用同一份字典，按整数编码匹配）
+    conditions_b = apply_schema(conditions_b.copy(), required_columns)
+    unify_categories([df_a, conditions_b], required_columns)
+    filtered_df = pd.merge(df_a, conditions_b, on=required_columns, how='inner')
+    print("合并后的数据框行数：", len(filtered_df))
+    
+    if len(filtered_df) == 0:
+        raise ValueError("合并后没有数据满足条件，请检查筛选条件是否正确。")
+    
+    print(f"原始表格A有 {len(df_a)} 行，筛选后得到 {len(filtered_df)} 行。")
+    return filtered_df
+
+
+def save_detail(filtered_df, output_dir, date_prefix, row_quantity, output_format=None):
+    """
+    保存筛选后的客户明细和单号列表，返回客户明细的输出文件路径
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    
+    file_name = f"{date_prefix}-前{row_quantity}位客户明细.xlsx"
+    detail_path = os.path.join(output_dir, file_name)
+    detail_path = write_table(filtered_df, detail_path, fmt=output_format)
+    print(f"筛选完成！结果已保存到 {detail_path}")
+    
+    # 保存单号列到新的Excel文件
+    if '单号' in filtered_df.columns:
+        file_name = f"{date_prefix}-筛选后客户运单号列表.xlsx"
+        file_path = os.path.join(output_dir, file_name)
+        file_path = write_table(filtered_df[['单号']], file_path, fmt=output_format)
+        print(f"单号列表已保存到 {file_path}")
+    else:
+        print("合并后的数据表中没有找到“单号”列，无法保存单号列表。")
+    return detail_path
+
+def main(input_pathA=None, input_pathB=None, output_dir=None, date_prefix=None, row_quantity=None, row_numbers=None, extra_conditions=None, use_index=True, chunksize=DEFAULT_CHUNKSIZE, output_format=None):
     try:
         # 去除路径中的引号
         input_pathA = input_pathA.strip('"') if input_pathA else None
@@ -49,19 +205,6 @@ def main(input_pathA=None, input_pathB=None, output_dir=None, date_prefix=None,
         if not input_pathB.lower().endswith(('.csv', '.xlsx', '.xls')):
             raise ValueError("筛选条件表格格式不支持，请使用Excel或CSV文件")
         
-        # 读取表格A
-        if input_pathA.lower().endswith(('.xlsx', '.xls')):
-            df_a = pd.read_excel(input_pathA)
-        elif input_pathA.lower().endswith('.csv'):
-            df_a = pd.read_csv(input_pathA)
-        else:
-            raise ValueError("原始表格格式不支持，请使用Excel或CSV文件")
-        
-        print(f"原始表格A共有 {len(df_a)} 行数据。")
-        print("原始表格A的列名：", df_a.columns)
-        print("原始表格A的前10行数据：")
-        print(df_a.head(10))
-        
         # 读取表格B
         if input_pathB.lower().endswith(('.xlsx', '.xls')):
             df_b = pd.read_excel(input_pathB)
@@ -75,98 +218,31 @@ def main(input_pathA=None, input_pathB=None, output_dir=None, date_prefix=None,
         print(df_b.head(10))
         
         # 提取表格B中作为筛选条件的列
-        required_columns = ['省区名称', '揽收网点名称', 'K码', '客户名称']
+        required_columns = CUSTOMER_KEY_COLUMNS
         if not all(col in df_b.columns for col in required_columns):
             print(f"筛选条件表格中缺少必要的列：{', '.join(required_columns)}")
             return
         
-        conditions_b = df_b[required_columns]
-        
-        # 处理行索引参数
-        try:
-            row_numbers = [int(num.strip()) for num in row_numbers.split(',')]
-            row_quantity = int(row_quantity)
-        except:
-            raise ValueError("行索引或行数量参数格式不正确")
-        
-        # 验证输入的行数量是否与指定数量一致
-        if len(row_numbers) != row_quantity:
-            raise ValueError(f"输入的行索引数量与指定的行数量 {row_quantity} 不一致")
+        conditions_b, row_quantity = select_condition_rows(df_b, row_quantity, row_numbers)
         
-        # 验证索引是否在有效范围内
-        if any(idx < 0 or idx >= len(df_b) for idx in row_numbers):
-            raise ValueError("输入的行索引超出有效范围")
+        # 解析额外的固定值筛选条件
+        conditions = parse_extra_conditions(extra_conditions)
         
-        conditions_b = df_b[required_columns].iloc[row_numbers]
-        
-        # 打印条件数据，供用户检查
-        print("用于筛选的条件数据：")
-        print(conditions_b)
-        
-        # 应用额外的固定值筛选条件
-        if extra_conditions:
-            conditions = extra_conditions.split(';')
-            for condition in conditions:
-                if '=' in condition:
-                    parts = condition.split('=', 1)
-                    if len(parts) != 2:
-                        print(f"条件格式无效：{condition}，跳过此条件。")
-                        continue
-                    
-                    col, values = parts
-                    col = col.strip()
-                    values = [value.strip() for value in values.split(',')]
-                    
-                    # 验证列名是否有效
-                    if col not in df_a.columns:
-                        print(f"列名 '{col}' 不存在于表格A中，跳过此条件。")
-                        continue
-                    
-                    # 检查列的数据类型，并转换输入值
-                    if pd.api.types.is_numeric_dtype(df_a[col]):
-                        try:
-                            values = [float(value) if '.' in value else int(value) for value in values]
-                        except ValueError:
-                            print(f"输入的值 {values} 无法转换为数字，跳过此条件。")
-                            continue
-                    
-                    # 应用固定值筛选条件
-                    mask = df_a[col].isin(values)
-                    df_a = df_a[mask]
-                    print(f"应用条件 '{col} in {values}' 后的表格A数据行数：", len(df_a))
-                else:
-                    print(f"条件格式无效：{condition}，跳过此条件。")
-        
-        # 检查应用条件后表格A是否有数据
-        if len(df_a) == 0:
-            raise ValueError("应用条件后，表格A没有剩余数据。")
-        
-        # 合并表格A和表格B
-        filtered_df = pd.merge(df_a, conditions_b, on=required_columns, how='inner')
-        print("合并后的数据框行数：", len(filtered_df))
-        
-        if len(filtered_df) == 0:
-            raise ValueError("合并后没有数据满足条件，请检查筛选条件是否正确。")
-        
-        # 保存筛选结果
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-        
-        file_name = f"{date_prefix}-前{row_quantity}位客户明细.xlsx"
-        file_path = os.path.join(output_dir, file_name)
-        filtered_df.to_excel(file_path, index=False)
-        
-        print(f"筛选完成！结果已保存到 {file_path}")
-        print(f"原始表格A有 {len(df_a)} 行，筛选后得到 {len(filtered_df)} 行。")
-        
-        # 保存单号列到新的Excel文件
-        if '单号' in filtered_df.columns:
-            file_name = f"{date_prefix}-筛选后客户运单号列表.xlsx"
-            file_path = os.path.join(output_dir, file_name)
-            filtered_df[['单号']].to_excel(file_path, index=False)
-            print(f"单号列表已保存到 {file_path}")
+        # 读取表格A
+        if use_index:
+            # 借助客户维度键索引，只读取与筛选条件匹配的行（首次运行时会为表格A建立索引）
+            df_a, total_rows = read_matching_rows(input_pathA, conditions_b, required_columns)
+            print(f"原始表格A共有 {total_rows} 行数据，其中与筛选条件匹配的有 {len(df_a)} 行。")
+            condition_filter = ConditionFilter(conditions, df_a.columns)
+            df_a = df_a[condition_filter(df_a)]
+            condition_filter.report()
         else:
-            print("合并后的数据表中没有找到“单号”列，无法保存单号列表。")
+            # 分块读取表格A，读取时即应用额外筛选条件，不满足条件的行不会保留在内存中
+            df_a, total_rows = read_filtered_table(input_pathA, conditions, chunksize)
+            print(f"原始表格A共有 {total_rows} 行数据。")
+        
+        filtered_df = match_customers(df_a, conditions_b)
+        save_detail(filtered_df, output_dir, date_prefix, row_quantity, output_format)
         
         return {'success': True, 'message': "操作成功完成！"}
     
@@ -1,6 +1,12 @@
 import pandas as pd
 import os
 import numpy as np
+from ccr_tools.common_io import iter_table_chunks, DEFAULT_CHUNKSIZE
+from ccr_tools.excel_cache import read_excel_cached
+from ccr_tools.inbound_store import InboundStore
+from ccr_tools.operation_stages import stage_mask
+from ccr_tools.schema import key_mask, normalize_keys
+from ccr_tools.table_writer import write_table
 
 PARAM_PROMPTS = {
     'table_a_path': "请输入“客户明细”表格的路径: ",
@@ -14,26 +20,152 @@ def read_file(file_path):
     if file_path.endswith('.csv'):
         return pd.read_csv(file_path)
     elif file_path.endswith(('.xls', '.xlsx')):
-        df = pd.read_excel(file_path)
-        csv_path = file_path.rsplit('.', 1)[0] + '.csv'
-        df.to_csv(csv_path, index=False)
-        return pd.read_csv(csv_path)
+        # 通过列式缓存读取，未改动过的文件不再重复解析
+        return read_excel_cached(file_path)
     else:
         raise ValueError("不支持的文件格式，请提供CSV或Excel文件")
 
-def main(table_a_path, table_b_path, output_dir, date_prefix):
+def earliest_inbound(df_b):
+    """
+    从“查询结果-运单号”表中取出每个运单最早的入库环节（入柜/入库）记录
+    """
+    cols_b = ['运单号', '操作时间', '操作名称']
+    df_b_selected = df_b[stage_mask(df_b['操作名称'], '入库')][cols_b].copy()
+    df_b_selected['操作时间'] = pd.to_datetime(df_b_selected['操作时间'])
+    return df_b_selected.sort_values('操作时间').drop_duplicates('运单号', keep='first')
+
+def earliest_inbound_chunked(table_b_path, waybills, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    分块读取“查询结果-运单号”表，只保留投诉表中出现过的运单，逐块维护每个运单最早的入柜/入库时间。
+    内存占用只与投诉运单数量有关，与轨迹记录条数无关
+    """
+    # 先建立投诉运单号集合（键文本），轨迹记录按该集合做半连接裁剪：只把投诉运单号转换为轨迹块的类型后 isin，
+    # 不逐行转换轨迹表；某一侧含空值、数字列被读成浮点数时也能匹配
+    waybill_set = set(normalize_keys(pd.Series(waybills).dropna()))
+
+    running_min = None
+    for chunk in iter_table_chunks(table_b_path, usecols=['运单号', '操作时间', '操作名称'], chunksize=chunksize):
+        chunk = chunk[key_mask(chunk['运单号'], waybill_set)]
+        chunk = chunk[stage_mask(chunk['操作名称'], '入库')]
+        if chunk.empty:
+            continue
+
+        # 裁剪后只剩投诉运单的记录，再按键文本分组
+        chunk_min = pd.to_datetime(chunk['操作时间']).groupby(normalize_keys(chunk['运单号'])).min()
+        if running_min is None:
+            running_min = chunk_min
+        else:
+            running_min = pd.concat([running_min, chunk_min]).groupby(level=0).min()
+
+    if running_min is None:
+        return pd.DataFrame({'运单号': pd.Series(dtype=str), '操作时间': pd.Series(dtype='datetime64[ns]')})
+    return running_min.rename_axis('运单号').reset_index(name='操作时间')
+
+# 入库前后的取值，编码 0 表示进线时间缺失等无法判断的情况
+INBOUND_STATUS_LABELS = ['', '入库后', '入库前', '无入库']
+
+# 入库后进线的时间差分布区间，按天数向下取整后对应区间编码，3天及以上都归入“超过3天”
+DIFF_BUCKET_LABELS = ['1天以内', '2天以内', '3天以内', '超过3天']
+
+def add_time_diff_columns(df):
+    """
+    一次向量化计算“进线-入库时间差”（天）、“入库前后”和时间差分布区间。
+    时间差保持浮点类型、空值保持 NaN，两个分类列直接由整数编码生成，写出时空值显示为空白
+    """
+    diff_seconds = (df['进线时间'] - df['入库时间']).dt.total_seconds().to_numpy(dtype='float64', na_value=np.nan)
+    diff_days = diff_seconds / 3600 / 24
+    has_inbound = df['入库时间'].notna().to_numpy()
+    diff_days[~has_inbound | df['进线时间'].isna().to_numpy()] = np.nan
+
+    status_codes = np.zeros(len(df), dtype=np.int8)
+    status_codes[~has_inbound] = 3
+    status_codes[diff_days < 0] = 2
+    status_codes[diff_days > 0] = 1
+
+    bucket_codes = np.full(len(df), -1, dtype=np.int8)
+    after_inbound = diff_days >= 0
+    bucket_codes[after_inbound] = np.minimum(np.floor(diff_days[after_inbound]), 3).astype(np.int8)
+
+    return df.assign(**{
+        '进线-入库时间差': diff_days,
+        '入库前后': pd.Categorical.from_codes(status_codes, categories=INBOUND_STATUS_LABELS),
+        '入库后进线-进线与入库时间差分布区间': pd.Categorical.from_codes(bucket_codes, categories=DIFF_BUCKET_LABELS, ordered=True),
+    })
+
+def build_time_diff_detail(df_a, table_b_path=None, store_path=None, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    为客户明细匹配每个运单最早的入库时间，并计算时间差相关的几列，返回“客户-时间差值明细”
+    """
+    # 选取需要的列
+    cols_a = ['省区名称','单号', '揽收网点名称', 'K码', '客户名称', '进线时间', '工单小类', '投诉/催查内容']
+    df_a_selected = df_a[cols_a].copy()
+    df_a_selected['进线时间'] = pd.to_datetime(df_a_selected['进线时间'])
+
+    if store_path:
+        # 先把新的轨迹表增量写入入库时间库，再从库中查询投诉运单的最早入库时间
+        with InboundStore(store_path) as store:
+            if table_b_path:
+                store.update_from_file(table_b_path)
+            df_b_earliest = store.lookup(df_a_selected['单号'])
+    elif chunksize:
+        # 分块读取轨迹表，只统计投诉运单的最早入库时间
+        df_b_earliest = earliest_inbound_chunked(table_b_path, df_a_selected['单号'], chunksize)
+    else:
+        df_b_earliest = earliest_inbound(read_file(table_b_path))
+
+    # 将表格A的单号与表格B的运单号进行匹配，两边都按键文本比较（不受空值导致的浮点类型影响）
+    df_b_earliest = df_b_earliest.dropna(subset=['运单号'])
+    df_b_earliest = df_b_earliest.assign(运单号=normalize_keys(df_b_earliest['运单号']))
+    df_a_keyed = df_a_selected.assign(匹配单号=normalize_keys(df_a_selected['单号']))
+    df_merged = pd.merge(df_a_keyed, df_b_earliest, left_on='匹配单号', right_on='运单号', how='left')
+    df_merged = df_merged.rename(columns={'操作时间': '入库时间'})
+    df_merged = df_merged.drop(['运单号', '匹配单号'], axis=1)
+
+    cols_order = ['省区名称', '单号', '揽收网点名称', 'K码', '客户名称', '进线时间', '入库时间', '工单小类', '投诉/催查内容']
+    df_merged = df_merged[cols_order]
+
+    # 新增几列数据
+    df_merged = add_time_diff_columns(df_merged)
+
+    cols_order_new = ['省区名称', '单号', '揽收网点名称', 'K码', '客户名称', '进线时间', '入库时间', 
+                    '进线-入库时间差', '入库前后', '入库后进线-进线与入库时间差分布区间', 
+                    '工单小类', '投诉/催查内容']
+    return df_merged[cols_order_new]
+
+def save_time_diff_detail(df_merged, output_dir, date_prefix, output_format=None):
+    """
+    保存“客户-时间差值明细”，返回输出文件路径
+    """
+    # 确保输出文件夹存在
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    output_filename = f"{date_prefix}-客户-时间差值明细.xlsx"
+    output_path = os.path.join(output_dir, output_filename)
+
+    # 输出excel文件（可通过 output_format 改为 csv/parquet）
+    output_path = write_table(df_merged, output_path, fmt=output_format)
+
+    print(f"文件已成功保存到: {output_path}")
+    return output_path
+
+def main(table_a_path, table_b_path, output_dir, date_prefix, output_format=None, store_path=None,
+         chunksize=DEFAULT_CHUNKSIZE):
     try:
         # 去除路径中的引号
         table_a_path = table_a_path.strip('"')
-        table_b_path = table_b_path.strip('"')
+        table_b_path = table_b_path.strip('"') if table_b_path else None
+        store_path = store_path.strip('"') if store_path else None
         output_dir = output_dir.strip('"')
         
         # 检查输入路径A是否为空
         if not table_a_path or not os.path.exists(table_a_path):
             raise ValueError("客户明细表格路径无效或不存在")
         
-        # 检查输入路径B是否为空
-        if not table_b_path or not os.path.exists(table_b_path):
+        # 检查输入路径B是否为空（使用入库时间库时可以不提供，直接查询库中已有的数据）
+        if table_b_path and not os.path.exists(table_b_path):
+            raise ValueError("查询结果-运单号表格路径无效或不存在")
+        if not table_b_path and not store_path:
             raise ValueError("查询结果-运单号表格路径无效或不存在")
         
         # 检查输出目录是否为空
@@ -48,70 +180,11 @@ def main(table_a_path, table_b_path, output_dir, date_prefix):
         if not table_a_path.lower().endswith(('.csv', '.xlsx', '.xls')):
             raise ValueError("客户明细表格格式不支持，请使用Excel或CSV文件")
         
-        if not table_b_path.lower().endswith(('.csv', '.xlsx', '.xls')):
+        if table_b_path and not table_b_path.lower().endswith(('.csv', '.xlsx', '.xls')):
             raise ValueError("查询结果-运单号表格格式不支持，请使用Excel或CSV文件")
     
-        df_a = read_file(table_a_path)
-        df_b = read_file(table_b_path)
-
-        # 选取需要的列
-        cols_a = ['省区名称','单号', '揽收网点名称', 'K码', '客户名称', '进线时间', '工单小类', '投诉/催查内容']
-        df_a_selected = df_a[cols_a].copy()
-
-        cols_b = ['运单号', '操作时间', '操作名称']
-        df_b_selected = df_b[df_b['操作名称'].str.contains('入柜|入库')][cols_b]
-
-        # 将表格A的单号与表格B的运单号进行匹配
-        df_a_selected.loc[:, '进线时间'] = pd.to_datetime(df_a_selected['进线时间'])
-        df_b_selected.loc[:, '操作时间'] = pd.to_datetime(df_b_selected['操作时间'])
-
-        df_b_earliest = df_b_selected.sort_values('操作时间').drop_duplicates('运单号', keep='first')
-
-        df_merged = pd.merge(df_a_selected, df_b_earliest, left_on='单号', right_on='运单号', how='left')
-        df_merged = df_merged.rename(columns={'操作时间': '入库时间'})
-        df_merged = df_merged.drop('运单号', axis=1)
-
-        cols_order = ['省区名称', '单号', '揽收网点名称', 'K码', '客户名称', '进线时间', '入库时间', '工单小类', '投诉/催查内容']
-        df_merged = df_merged[cols_order]
-
-        # 新增几列数据
-        df_merged['进线-入库时间差'] = (df_merged['进线时间'] - df_merged['入库时间']).apply(lambda x: x.total_seconds() / 3600 / 24 if not pd.isnull(x) else np.nan)
-
-        conditions = [
-            (df_merged['进线-入库时间差'] > 0),
-            (df_merged['进线-入库时间差'] < 0),
-            (df_merged['入库时间'].isna())
-        ]
-        choices = ['入库后', '入库前', '无入库']
-        df_merged['入库前后'] = np.select(conditions, choices, default='')
-
-        bins = [0, 1, 2, 3, float('inf')]
-        labels = ['1天以内', '2天以内', '3天以内', '超过3天']
-        df_merged['入库后进线-进线与入库时间差分布区间'] = pd.cut(
-            df_merged['进线-入库时间差'],
-            bins=bins,
-            labels=labels,
-            right=False
-        )
-
-        cols_order_new = ['省区名称', '单号', '揽收网点名称', 'K码', '客户名称', '进线时间', '入库时间', 
-                        '进线-入库时间差', '入库前后', '入库后进线-进线与入库时间差分布区间', 
-                        '工单小类', '投诉/催查内容']
-        df_merged = df_merged[cols_order_new]
-
-        df_merged[['入库时间', '进线-入库时间差']] = df_merged[['入库时间', '进线-入库时间差']].fillna('')
-
-        # 确保输出文件夹存在
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        output_filename = f"{date_prefix}-客户-时间差值明细.xlsx"
-        output_path = os.path.join(output_dir, output_filename)
-
-        # 输出excel文件
-        df_merged.to_excel(output_path, index=False)
-
-        print(f"文件已成功保存到: {output_path}")
+        df_merged = build_time_diff_detail(read_file(table_a_path), table_b_path, store_path, chunksize)
+        save_time_diff_detail(df_merged, output_dir, date_prefix, output_format)
 
         # 显示试运行结果
         print("\n试运行结果:")
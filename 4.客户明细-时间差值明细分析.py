@@ -1,5 +1,9 @@
 import pandas as pd
 import os
+from ccr_tools.excel_cache import read_excel_cached
+from ccr_tools.pivot_engine import pivot_counts
+from ccr_tools.schema import CUSTOMER_KEY_COLUMNS, apply_schema, fill_missing
+from ccr_tools.table_writer import write_sheets
 
 PARAM_PROMPTS = {
     'input_path': "请输入“客户-时间差值明细”文件路径：",
@@ -7,7 +11,78 @@ PARAM_PROMPTS = {
     'date_prefix': '请输入输出文件的日期前缀：'
 }
 
-def main(input_path, output_dir, date_prefix):
+# 透视的维度：{工作表名: (列名, 类别)}，类别顺序即输出列顺序
+PIVOT_MEASURES = {
+    '入库进线分析': ('入库前后', ['无入库', '入库前', '入库后']),
+    '入库后催件时间分析': ('入库后进线-进线与入库时间差分布区间', ['1天以内', '2天以内', '3天以内', '超过3天']),
+}
+
+# 分层汇总的键前缀长度：总计、省区、省区+揽收网点（客户明细行本身即最细一级）
+ROLLUP_LEVELS = [0, 1, 2]
+
+def analyze_time_diff(df, rollup=False):
+    """
+    对“客户-时间差值明细”做客户维度的透视分析，返回 {工作表名: 数据}；不修改传入的表格
+    """
+    # 客户维度等低基数列按分类类型处理
+    df = apply_schema(df.copy())
+
+    # 处理缺失值，指定每个列的数据类型
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].fillna(0)
+    df = fill_missing(df, '')
+
+    # 一次分组计数，同时得到两个工作表所需的全部计数
+    pivot = pivot_counts(df, CUSTOMER_KEY_COLUMNS, PIVOT_MEASURES)
+
+    # 创建第一个工作表的数据（含总计行）
+    sheet1_data = pivot.sheet(
+        '入库进线分析',
+        count_names={'无入库': '无入库进线', '入库前': '入库前进线', '入库后': '入库后进线'},
+        total_label='总计', label_column='揽收网点名称'
+    ).drop(columns='省区名称')
+
+    # 创建第二个工作表的数据（含总计行）
+    sheet2_data = pivot.sheet(
+        '入库后催件时间分析',
+        share_names={'超过3天': '超3天占比'},
+        total_label='总计', label_column='揽收网点名称'
+    ).drop(columns='省区名称')
+
+    sheets = {'入库进线分析': sheet1_data, '入库后催件时间分析': sheet2_data}
+
+    # 分层汇总：在同一份客户级计数上累加出省区、网点小计，不再重新分组明细
+    if rollup:
+        rolled = pivot.rollup(ROLLUP_LEVELS)
+        sheets['入库进线分层汇总'] = rolled.sheet(
+            '入库进线分析',
+            count_names={'无入库': '无入库进线', '入库前': '入库前进线', '入库后': '入库后进线'}
+        )
+        sheets['催件时间分层汇总'] = rolled.sheet(
+            '入库后催件时间分析',
+            share_names={'超过3天': '超3天占比'}
+        )
+    return sheets
+
+
+def save_analysis(sheets, output_dir, date_prefix):
+    """
+    将分析结果写入“日期前缀-客户-时间差值明细分析.xlsx”，返回输出文件路径
+    """
+    # 确保输出文件夹存在
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    output_filename = f"{date_prefix}-客户-时间差值明细分析.xlsx"
+    output_path = os.path.join(output_dir, output_filename)
+
+    # 将两个工作表写入 Excel 文件
+    write_sheets(sheets, output_path)
+    print("分析完成，结果已保存到：", output_path)
+    return output_path
+
+def main(input_path, output_dir, date_prefix, rollup=False):
     try:
         # 去除路径中的引号
         input_path = input_path.strip('"')
@@ -33,83 +108,14 @@ def main(input_path, output_dir, date_prefix):
         if input_path.endswith('.csv'):
             df = pd.read_csv(input_path)
         elif input_path.endswith(('.xls', '.xlsx')):
-            df = pd.read_excel(input_path)
-            csv_path = input_path.replace('.xlsx', '.csv').replace('.xls', '.csv')
-            df.to_csv(csv_path, index=False)
-            df = pd.read_csv(csv_path)
+            # 通过列式缓存读取，未改动过的文件不再重复解析
+            df = read_excel_cached(input_path)
         else:
             print("不支持的文件格式")
             return
 
-        # 处理缺失值，指定每个列的数据类型
-        for col in df.columns:
-            if pd.api.types.is_numeric_dtype(df[col]):
-                df.loc[:, col] = df[col].fillna(0)
-            else:
-                df.loc[:, col] = df[col].fillna('')
-
-        # 创建第一个工作表的数据
-        sheet1_data = df.groupby(['省区名称', '揽收网点名称', 'K码', '客户名称'])['入库前后'].value_counts().unstack(fill_value=0).reset_index()
-        sheet1_data['总计'] = sheet1_data[['入库后', '入库前', '无入库']].sum(axis=1)
-        sheet1_data[['入库后占比', '入库前占比', '无入库占比']] = sheet1_data[['入库后', '入库前', '无入库']].div(sheet1_data['总计'], axis=0)
-
-        # 调整列顺序
-        sheet1_data = sheet1_data[['揽收网点名称', 'K码', '客户名称', '无入库', '无入库占比', '入库前', '入库前占比', '入库后', '入库后占比', '总计']]
-        sheet1_data.rename(columns={'入库后': '入库后进线', '入库前': '入库前进线', '无入库': '无入库进线'}, inplace=True)
-
-        # 添加总计行
-        total_row1 = {
-            '省区名称': '',
-            '揽收网点名称': '总计',
-            'K码': '',
-            '客户名称': '',
-            '无入库进线': sheet1_data['无入库进线'].sum(),
-            '无入库占比': sheet1_data['无入库进线'].sum() / sheet1_data['总计'].sum(),
-            '入库前进线': sheet1_data['入库前进线'].sum(),
-            '入库前占比': sheet1_data['入库前进线'].sum() / sheet1_data['总计'].sum(),
-            '入库后进线': sheet1_data['入库后进线'].sum(),
-            '入库后占比': sheet1_data['入库后进线'].sum() / sheet1_data['总计'].sum(),
-            '总计': sheet1_data['总计'].sum()
-        }
-        sheet1_data = pd.concat([sheet1_data, pd.DataFrame([total_row1])], ignore_index=True)
-
-        # 创建第二个工作表的数据
-        sheet2_data = df.groupby(['省区名称', '揽收网点名称', 'K码', '客户名称'])['入库后进线-进线与入库时间差分布区间'].value_counts().unstack(fill_value=0).reset_index()
-        sheet2_data['总计'] = sheet2_data[['1天以内', '2天以内', '3天以内', '超过3天']].sum(axis=1)
-        sheet2_data[['1天以内占比', '2天以内占比', '3天以内占比', '超3天占比']] = sheet2_data[['1天以内', '2天以内', '3天以内', '超过3天']].div(sheet2_data['总计'], axis=0)
-        sheet2_data = sheet2_data[['揽收网点名称', 'K码', '客户名称', '1天以内', '1天以内占比', '2天以内', '2天以内占比', '3天以内', '3天以内占比', '超过3天', '超3天占比', '总计']]
-
-        # 添加总计行
-        total_row2 = {
-            '省区名称': '',
-            '揽收网点名称': '总计',
-            'K码': '',
-            '客户名称': '',
-            '1天以内': sheet2_data['1天以内'].sum(),
-            '1天以内占比': sheet2_data['1天以内'].sum() / sheet2_data['总计'].sum(),
-            '2天以内': sheet2_data['2天以内'].sum(),
-            '2天以内占比': sheet2_data['2天以内'].sum() / sheet2_data['总计'].sum(),
-            '3天以内': sheet2_data['3天以内'].sum(),
-            '3天以内占比': sheet2_data['3天以内'].sum() / sheet2_data['总计'].sum(),
-            '超过3天': sheet2_data['超过3天'].sum(),
-            '超3天占比': sheet2_data['超过3天'].sum() / sheet2_data['总计'].sum(),
-            '总计': sheet2_data['总计'].sum()
-        }
-        sheet2_data = pd.concat([sheet2_data, pd.DataFrame([total_row2])], ignore_index=True)
-
-        # 确保输出文件夹存在
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        output_filename = f"{date_prefix}-客户-时间差值明细分析.xlsx"
-        output_path = os.path.join(output_dir, output_filename)
-
-        # 将两个工作表写入 Excel 文件
-        with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-            sheet1_data.to_excel(writer, sheet_name='入库进线分析', index=False)
-            sheet2_data.to_excel(writer, sheet_name='入库后催件时间分析', index=False)
-
-        print("分析完成，结果已保存到：", output_path)
+        sheets = analyze_time_diff(df, rollup)
+        save_analysis(sheets, output_dir, date_prefix)
         
         return {'success': True, 'message': "操作成功完成！"}
     
@@ -122,5 +128,6 @@ if __name__ == "__main__":
     input_path = input("请输入“客户-时间差值明细”文件路径：").strip('"')
     output_dir = input("请输入输出文件夹的绝对路径：").strip('"')
     date_prefix = input('请输入输出文件的日期前缀：').strip('"')
-    result = main(input_path, output_dir, date_prefix)
+    rollup = input('是否输出省区/网点分层汇总（y/N）：').strip().lower() == 'y'
+    result = main(input_path, output_dir, date_prefix, rollup=rollup)
     print(result['message'])
\ No newline at end of file
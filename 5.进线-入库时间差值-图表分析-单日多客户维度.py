@@ -3,10 +3,14 @@ import matplotlib.pyplot as plt
 import numpy as np
 import os
 import io
-from collections import Counter
+import threading
+from matplotlib.figure import Figure
+from ccr_tools.chart_farm import render_parallel
+from ccr_tools.excel_cache import read_excel_cached
+from ccr_tools.table_writer import write_table
 
 PARAM_PROMPTS = {
-    'input_path': "请输入“客户明细-时间差值明细文件”路径(注：csv格式)：",
+    'input_path': "请输入“客户明细-时间差值明细文件”路径(csv或Excel格式)：",
     'output_dir': "请输入输出文件夹的绝对路径：",
     'date_prefix': '请输入输出文件的日期前缀：'
 }
@@ -14,7 +18,267 @@ PARAM_PROMPTS = {
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
-def main(input_path, output_dir, date_prefix):
+# 进线-入库时间差的区间：<0、0-1 … 13-14、>14
+INTERVAL_LABELS = ['<0'] + [f'{i}-{i+1}' for i in range(14)] + ['>14']
+
+def count_intervals(df):
+    """
+    一次分组分箱统计每个客户的“进线-入库时间差”在各区间的计数，返回 客户 × 区间 的计数矩阵（行按客户首次出现的顺序）。
+    恰好为 14 天的计入 13-14，空值（无入库时间）按原逻辑计入 >14
+    """
+    customer_codes, customers = pd.factorize(df['客户名称'])
+    values = df['进线-入库时间差'].to_numpy(dtype='float64', na_value=np.nan)
+
+    # 区间编码：<0 为 0，[i, i+1) 为 i+1，14 以上及空值为 15
+    bin_codes = np.digitize(values, np.arange(15))
+    bin_codes[values == 14] = 14
+    bin_codes[np.isnan(values)] = len(INTERVAL_LABELS) - 1
+
+    # 客户编码 × 区间编码合并为一个编码，只做一次 bincount
+    n_bins = len(INTERVAL_LABELS)
+    valid = customer_codes >= 0
+    counts = np.bincount(customer_codes[valid] * n_bins + bin_codes[valid], minlength=len(customers) * n_bins)
+    return pd.DataFrame(counts.reshape(len(customers), n_bins),
+                        index=pd.Index(customers, name='客户名称'), columns=INTERVAL_LABELS)
+
+
+def save_interval_matrix(interval_matrix, output_dir, date_prefix):
+    """
+    将 客户 × 区间 的计数矩阵导出为 CSV，返回输出文件路径
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    output_path = os.path.join(output_dir, f'{date_prefix}-客户进线-入库时间差区间计数.csv')
+    return write_table(interval_matrix.reset_index(), output_path, fmt='csv')
+
+
+def generate_count_chart(customer, intervals, counts, date_prefix, output_path):
+    """
+    绘制单个客户的时间差计数折线图
+    """
+    fig_individual = Figure(figsize=(12, 8))
+    ax_individual = fig_individual.subplots()
+
+    total_count = sum(counts)
+    ax_individual.plot(intervals, counts, marker='o', linestyle='-', linewidth=2, color='purple')
+
+    # 在图上显示数值
+    for i, count in enumerate(counts):
+        ax_individual.text(i, count + 0.5, str(count), ha='center', fontsize=16)
+
+    ax_individual.set_title(f' {customer} -{date_prefix}-进线-入库时间差计数：{total_count}', fontsize=16, fontweight='bold')
+    ax_individual.set_xlabel('进线-入库时间差', fontsize=14)
+    ax_individual.set_ylabel('计数', fontsize=18)
+    ax_individual.grid(True, linestyle='--', alpha=0.7)
+    ax_individual.set_facecolor('#f5f5f5')
+    ax_individual.tick_params(axis='both', labelsize=12)
+
+    fig_individual.tight_layout()
+    fig_individual.savefig(output_path, dpi=300, bbox_inches='tight')
+
+
+def generate_pareto_chart(customer, intervals, counts, date_prefix, output_path):
+    """
+    绘制单个客户的时间差帕累托图（计数柱状图 + 累积百分比折线）
+    """
+    # 计算累积百分比
+    percentages = np.cumsum(counts) / sum(counts) * 100
+    fig = Figure(figsize=(12, 8))
+    ax1 = fig.subplots()
+
+    # 绘制柱状图
+    bars = ax1.bar(intervals, counts, color='skyblue', label='计数')
+    ax1.set_xlabel('进线-入库时间差', fontsize=14)
+    ax1.set_ylabel('计数', fontsize=14, color='b')
+    ax1.tick_params(axis='y', labelcolor='b')
+    ax1.set_facecolor('#f5f5f5')
+    ax1.grid(True, linestyle='--', alpha=0.7)
+
+    # 在柱状图上显示数值
+    for bar in bars:
+        height = bar.get_height()
+        ax1.text(bar.get_x() + bar.get_width()/2., height + 0.5,
+                f'{height}', ha='center', va='bottom', fontsize=12)
+
+    # 绘制累积百分比折线图（调整颜色为紫色）
+    ax2 = ax1.twinx()
+    line, = ax2.plot(intervals, percentages, color='red', marker='o', linestyle='-', linewidth=2, label='累积百分比')
+
+    # 在折线图上显示数值（调整字体大小）
+    for i, percentage in enumerate(percentages):
+        ax2.text(i, percentage + 1, f'{percentage:.1f}%', ha='center', va='bottom', fontsize=12)
+
+    # 添加图例（放在图外）
+    fig.legend([bars, line], ['计数', '累积百分比'], 
+              loc='upper left', bbox_to_anchor=(0.1, 0.9), fontsize=10)
+
+    # 设置标题
+    ax1.set_title(f'{customer} - {date_prefix} - 帕累托图', fontsize=16, fontweight='bold')
+
+    fig.tight_layout()
+    # 保存图表
+    fig.savefig(output_path, dpi=300, bbox_inches='tight')
+
+
+def customer_chart_names(customer):
+    """
+    单个客户的计数图和帕累托图文件名
+    """
+    return [f'客户_{customer}_进线-入库时间差计数.png', f'客户_{customer}_进线-入库时间差帕累托图.png']
+
+
+def render_customer_charts(customer, intervals, counts, output_dir, date_prefix):
+    """
+    绘制单个客户的计数图和帕累托图，只需要该客户自己的区间计数，可在渲染进程池中运行。返回两张图的路径
+    """
+    count_path, pareto_path = [os.path.join(output_dir, name) for name in customer_chart_names(customer)]
+    generate_count_chart(customer, intervals, counts, date_prefix, count_path)
+    generate_pareto_chart(customer, intervals, counts, date_prefix, pareto_path)
+    return count_path, pareto_path
+
+
+# 两张所有客户总览图的文件名
+OVERVIEW_CHART_NAMES = ['所有客户进线-入库时间差计数总览.png', '所有客户进线-入库时间差帕累托图总览.png']
+
+# 预览图的分辨率，只用于界面上先行显示
+PREVIEW_DPI = 50
+
+def build_overview_figure(customers, intervals, count_rows, date_prefix):
+    """
+    生成所有客户的计数总览图
+    """
+    fig_total = Figure(figsize=(14, 10))
+    ax_total = fig_total.subplots()
+    colors_total = plt.get_cmap('tab20c', len(customers))
+
+    for i, (customer, counts) in enumerate(zip(customers, count_rows)):
+        total_count = sum(counts)
+        ax_total.plot(intervals, counts, label=f"{customer} - {total_count}", 
+                      color=colors_total(i), linewidth=2, linestyle='-', marker='o')
+
+    # 设置图例位置为外部右侧
+    ax_total.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=10)
+    ax_total.set_title(f'{date_prefix}-所有客户进线-入库时间差计数总览', fontsize=16, fontweight='bold')
+    ax_total.set_xlabel('进线-入库时间差', fontsize=14)
+    ax_total.set_ylabel('计数', fontsize=14)
+    ax_total.grid(True, linestyle='--', alpha=0.7)
+    ax_total.set_facecolor('#f5f5f5')
+    ax_total.tick_params(axis='both', labelsize=12)
+
+    fig_total.tight_layout()
+    return fig_total
+
+
+def overview_image(interval_matrix, date_prefix, dpi=None):
+    """
+    把计数总览图渲染为 PNG 字节流（默认按图表自身的分辨率），供界面显示
+    """
+    buffer = io.BytesIO()
+    fig_total = build_overview_figure(*_chart_inputs(interval_matrix), date_prefix)
+    fig_total.savefig(buffer, format='png', dpi=dpi or 'figure')
+    return buffer.getvalue()
+
+
+def render_overview_charts(customers, intervals, count_rows, output_dir, date_prefix):
+    """
+    生成计数总览图和帕累托图总览（300dpi），返回两张图的路径
+    """
+    total_output_path, pareto_total_output_path = [os.path.join(output_dir, name) for name in OVERVIEW_CHART_NAMES]
+
+    fig_total = build_overview_figure(customers, intervals, count_rows, date_prefix)
+    fig_total.savefig(total_output_path, dpi=300, bbox_inches='tight')
+
+    # 生成所有客户的帕累托图总览
+    fig_pareto_total = Figure(figsize=(14, 10))
+    ax_pareto_total = fig_pareto_total.subplots()
+    for i, (customer, counts) in enumerate(zip(customers, count_rows)):
+        percentages = np.cumsum(counts) / sum(counts) * 100
+
+        ax_pareto_total.plot(intervals, percentages, label=f"{customer}",
+                             color=plt.get_cmap('tab20c', len(customers))(i),
+                             linewidth=2, linestyle='-', marker='o')
+
+    ax_pareto_total.set_title(f'{date_prefix}-所有客户进线-入库时间差帕累托图总览', fontsize=16, fontweight='bold')
+    ax_pareto_total.set_xlabel('进线-入库时间差', fontsize=14)
+    ax_pareto_total.set_ylabel('累积百分比', fontsize=14)
+    ax_pareto_total.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=10)
+    ax_pareto_total.grid(True, linestyle='--', alpha=0.7)
+    ax_pareto_total.set_facecolor('#f5f5f5')
+    ax_pareto_total.tick_params(axis='both', labelsize=12)
+
+    fig_pareto_total.tight_layout()
+    fig_pareto_total.savefig(pareto_total_output_path, dpi=300, bbox_inches='tight')
+    return total_output_path, pareto_total_output_path
+
+
+def _chart_inputs(interval_matrix):
+    return list(interval_matrix.index), list(interval_matrix.columns), interval_matrix.to_numpy().tolist()
+
+
+def render_chart_files(interval_matrix, output_dir, date_prefix, max_workers=None, use_cache=True):
+    """
+    生成 300dpi 的总览图、帕累托图总览，以及各客户的计数图和帕累托图，返回所有图表路径。
+    各客户的图表由 max_workers 个进程并行渲染（默认按 CPU 核数），use_cache 时输入没有变化的图表直接使用缓存
+    """
+    customers, intervals, count_rows = _chart_inputs(interval_matrix)
+
+    overview_jobs = [('总览图',
+                      {'customers': customers, 'intervals': intervals, 'count_rows': count_rows,
+                       'date_prefix': date_prefix},
+                      OVERVIEW_CHART_NAMES)]
+    overview_paths = render_parallel(__file__, 'render_overview_charts', overview_jobs, output_dir,
+                                     max_workers, use_cache=use_cache)
+
+    # 各客户的计数图和帕累托图分发到渲染进程池，每个任务只带该客户的区间计数
+    jobs = [(customer,
+             {'customer': customer, 'intervals': intervals, 'counts': counts, 'date_prefix': date_prefix},
+             customer_chart_names(customer))
+            for customer, counts in zip(customers, count_rows)]
+    customer_paths = render_parallel(__file__, 'render_customer_charts', jobs, output_dir,
+                                     max_workers, use_cache=use_cache)
+    return [path for paths in overview_paths + customer_paths for path in paths]
+
+
+def render_charts(interval_matrix, output_dir, date_prefix, max_workers=None, use_cache=True):
+    """
+    生成全部图表，返回总览图的 PNG 字节流
+    """
+    render_chart_files(interval_matrix, output_dir, date_prefix, max_workers, use_cache)
+    return overview_image(interval_matrix, date_prefix)
+
+
+def render_charts_in_background(interval_matrix, output_dir, date_prefix, on_complete=None,
+                                max_workers=None, use_cache=True):
+    """
+    在后台线程中生成全部 300dpi 图表，立即返回线程对象。
+    完成后调用 on_complete({'success': ..., 'message': ..., 'generated_charts': [...]})，失败时 generated_charts 为空列表；
+    同一结果也保存在线程对象的 result 属性中，没有传入 on_complete 时失败信息会打印出来。
+    注意 on_complete 在后台线程中执行：Tk 等界面程序不能在其中直接操作控件，
+    需要转交给主线程，例如 on_complete=lambda result: root.after(0, show_result, result)
+    """
+    def run():
+        try:
+            paths = render_chart_files(interval_matrix, output_dir, date_prefix, max_workers, use_cache)
+            result = {
+                'success': True,
+                'message': f"高清图表已全部生成！共{len(interval_matrix)}个客户",
+                'generated_charts': paths
+            }
+        except Exception as e:
+            result = {'success': False, 'message': f"高清图表生成失败：{e}", 'generated_charts': []}
+        thread.result = result
+        if on_complete:
+            on_complete(result)
+        elif not result['success']:
+            print(result['message'])
+
+    thread = threading.Thread(target=run, name='ccr-chart-render')
+    thread.result = None
+    thread.start()
+    return thread
+
+
+def main(input_path, output_dir, date_prefix, max_workers=None, use_cache=True, preview=False, on_complete=None):
     try:
         # 去除路径中的引号
         input_path = input_path.strip('"')
@@ -33,165 +297,38 @@ def main(input_path, output_dir, date_prefix):
             raise ValueError("日期前缀不能为空")
         
         # 检查文件格式
-        if not input_path.lower().endswith('.csv'):
-            raise ValueError("不支持的文件格式，请提供CSV文件")
+        if not input_path.lower().endswith(('.csv', '.xlsx', '.xls')):
+            raise ValueError("不支持的文件格式，请提供CSV或Excel文件")
     
-        df = pd.read_csv(input_path)
-
-        selected_data = df[['客户名称', '进线-入库时间差']]
-        customers = selected_data['客户名称'].unique()
-
-        customer_count = {}
-        for customer in customers:
-            customer_data = selected_data[selected_data['客户名称'] == customer]['进线-入库时间差']
-            interval_count = {'<0': 0}
-            for i in range(14):
-                interval_count[f'{i}-{i+1}'] = 0
-            interval_count['>14'] = 0
-
-            for value in customer_data:
-                if value < 0:
-                    interval_count['<0'] += 1
-                elif 0 <= value <= 14:
-                    interval_count[f'{int(value)}-{int(value)+1}'] += 1
-                else:
-                    interval_count['>14'] += 1
-
-            customer_count[customer] = interval_count
-
-        # 为所有客户生成总览图
-        fig_total, ax_total = plt.subplots(figsize=(14, 10))
-        colors_total = plt.cm.get_cmap('tab20c', len(customers))
-
-        for i, customer in enumerate(customers):
-            intervals = list(customer_count[customer].keys())
-            counts = list(customer_count[customer].values())
-            total_count = sum(counts)
-            ax_total.plot(intervals, counts, label=f"{customer} - {total_count}", 
-                          color=colors_total(i), linewidth=2, linestyle='-', marker='o')
-
-        # 设置图例位置为外部右侧
-        ax_total.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=10)
-        ax_total.set_title(f'{date_prefix}-所有客户进线-入库时间差计数总览', fontsize=16, fontweight='bold')
-        ax_total.set_xlabel('进线-入库时间差', fontsize=14)
-        ax_total.set_ylabel('计数', fontsize=14)
-        ax_total.grid(True, linestyle='--', alpha=0.7)
-        ax_total.set_facecolor('#f5f5f5')
-        ax_total.tick_params(axis='both', labelsize=12)
-
-        plt.tight_layout()
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-
-        total_output_path = os.path.join(output_dir, '所有客户进线-入库时间差计数总览.png')
-        plt.savefig(total_output_path, dpi=300, bbox_inches='tight')
-        
-        # 将总览图转换为字节流
-        total_image_buffer = io.BytesIO()
-        plt.savefig(total_image_buffer, format='png')
-        plt.close()  # 关闭图表以释放资源
-
-        # 为每个客户生成单独的图表
-        for customer in customers:
-            fig_individual, ax_individual = plt.subplots(figsize=(12, 8))
-            intervals = list(customer_count[customer].keys())
-            counts = list(customer_count[customer].values())
-            
-            total_count = sum(counts)
-            ax_individual.plot(intervals, counts, marker='o', linestyle='-', linewidth=2, color='purple')
-            
-            # 在图上显示数值
-            for i, count in enumerate(counts):
-                ax_individual.text(i, count + 0.5, str(count), ha='center', fontsize=16)
-            
-            ax_individual.set_title(f' {customer} -{date_prefix}-进线-入库时间差计数：{total_count}', fontsize=16, fontweight='bold')
-            ax_individual.set_xlabel('进线-入库时间差', fontsize=14)
-            ax_individual.set_ylabel('计数', fontsize=18)
-            ax_individual.grid(True, linestyle='--', alpha=0.7)
-            ax_individual.set_facecolor('#f5f5f5')
-            ax_individual.tick_params(axis='both', labelsize=12)
-            
-            plt.tight_layout()
-            customer_output_path = os.path.join(output_dir, f'客户_{customer}_进线-入库时间差计数.png')
-            plt.savefig(customer_output_path, dpi=300, bbox_inches='tight')
-            plt.close()  # 关闭图表以释放资源
-
-        # 生成帕累托图
-        def generate_pareto_chart(customer, intervals, counts, output_path):
-            # 计算累积百分比
-            percentages = np.cumsum(counts) / sum(counts) * 100
-            fig, ax1 = plt.subplots(figsize=(12, 8))
-
-            # 绘制柱状图
-            bars = ax1.bar(intervals, counts, color='skyblue', label='计数')
-            ax1.set_xlabel('进线-入库时间差', fontsize=14)
-            ax1.set_ylabel('计数', fontsize=14, color='b')
-            ax1.tick_params(axis='y', labelcolor='b')
-            ax1.set_facecolor('#f5f5f5')
-            ax1.grid(True, linestyle='--', alpha=0.7)
-            
-            # 在柱状图上显示数值
-            for bar in bars:
-                height = bar.get_height()
-                ax1.text(bar.get_x() + bar.get_width()/2., height + 0.5,
-                        f'{height}', ha='center', va='bottom', fontsize=12)
-
-            # 绘制累积百分比折线图（调整颜色为紫色）
-            ax2 = ax1.twinx()
-            line, = ax2.plot(intervals, percentages, color='red', marker='o', linestyle='-', linewidth=2, label='累积百分比')
-            
-            # 在折线图上显示数值（调整字体大小）
-            for i, percentage in enumerate(percentages):
-                ax2.text(i, percentage + 1, f'{percentage:.1f}%', ha='center', va='bottom', fontsize=12)
-            
-            # 添加图例（放在图外）
-            fig.legend([bars, line], ['计数', '累积百分比'], 
-                      loc='upper left', bbox_to_anchor=(0.1, 0.9), fontsize=10)
-
-            # 设置标题
-            ax1.set_title(f'{customer} - {date_prefix} - 帕累托图', fontsize=16, fontweight='bold')
-
-            plt.tight_layout()
-            # 保存图表
-            plt.savefig(output_path, dpi=300, bbox_inches='tight')
-            plt.close()
-
-        # 生成所有客户的帕累托图总览
-        fig_pareto_total, ax_pareto_total = plt.subplots(figsize=(14, 10))
-        for i, customer in enumerate(customers):
-            intervals = list(customer_count[customer].keys())
-            counts = list(customer_count[customer].values())
-            percentages = np.cumsum(counts) / sum(counts) * 100
-
-            ax_pareto_total.plot(intervals, percentages, label=f"{customer}",
-                                 color=plt.cm.get_cmap('tab20c', len(customers))(i),
-                                 linewidth=2, linestyle='-', marker='o')
-
-        ax_pareto_total.set_title(f'{date_prefix}-所有客户进线-入库时间差帕累托图总览', fontsize=16, fontweight='bold')
-        ax_pareto_total.set_xlabel('进线-入库时间差', fontsize=14)
-        ax_pareto_total.set_ylabel('累积百分比', fontsize=14)
-        ax_pareto_total.legend(bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=10)
-        ax_pareto_total.grid(True, linestyle='--', alpha=0.7)
-        ax_pareto_total.set_facecolor('#f5f5f5')
-        ax_pareto_total.tick_params(axis='both', labelsize=12)
-
-        plt.tight_layout()
-        pareto_total_output_path = os.path.join(output_dir, '所有客户进线-入库时间差帕累托图总览.png')
-        plt.savefig(pareto_total_output_path, dpi=300, bbox_inches='tight')
-        plt.close()
-
-        # 为每个客户生成单独的帕累托图
-        for customer in customers:
-            intervals = list(customer_count[customer].keys())
-            counts = list(customer_count[customer].values())
-            generate_pareto_chart(customer, intervals, counts, 
-                                 os.path.join(output_dir, f'客户_{customer}_进线-入库时间差帕累托图.png'))
+        if input_path.lower().endswith('.csv'):
+            df = pd.read_csv(input_path)
+        else:
+            # 直接读取脚本3输出的Excel文件（经列式缓存），不再需要先手动转换为CSV
+            df = read_excel_cached(input_path, columns=['客户名称', '进线-入库时间差'])
+
+        interval_matrix = count_intervals(df)
+        customers = list(interval_matrix.index)
+        save_interval_matrix(interval_matrix, output_dir, date_prefix)
+
+        if preview:
+            # 先返回低分辨率的总览预览图，300dpi 图表在后台生成，完成后回调 on_complete
+            preview_data = overview_image(interval_matrix, date_prefix, dpi=PREVIEW_DPI)
+            render_thread = render_charts_in_background(interval_matrix, output_dir, date_prefix, on_complete,
+                                                        max_workers, use_cache)
+            return {
+                'success': True,
+                'message': f"预览图已生成，{len(customers)}个客户的高清图表正在后台生成……",
+                'total_image_data': preview_data,
+                'render_thread': render_thread
+            }
+
+        total_image_data = render_charts(interval_matrix, output_dir, date_prefix, max_workers, use_cache)
 
         # 返回总览图数据（客户单独图保存到文件夹中）
         return {
             'success': True,
             'message': f"操作成功完成！已生成总览图和{len(customers)}个客户单独图表，以及对应的帕累托图",
-            'total_image_data': total_image_buffer.getvalue()
+            'total_image_data': total_image_data
         }
     
     except Exception as e:
@@ -200,7 +337,7 @@ def main(input_path, output_dir, date_prefix):
 
 # 如果直接运行此脚本（而非被导入），则可以从命令行获取参数并调用 main 函数
 if __name__ == "__main__":
-    input_path = input("请输入“客户明细-时间差值明细文件”路径(注：csv格式)：").strip('"')
+    input_path = input("请输入“客户明细-时间差值明细文件”路径(csv或Excel格式)：").strip('"')
     output_dir = input("请输入输出文件夹的绝对路径：").strip('"')
     date_prefix = input('请输入输出文件的日期前缀：').strip('"')
     result = main(input_path, output_dir, date_prefix)
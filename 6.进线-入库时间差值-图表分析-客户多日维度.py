@@ -2,8 +2,12 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import io
+from matplotlib.figure import Figure
+from ccr_tools.chart_farm import render_parallel
+from ccr_tools.history_store import BIN_LABELS, HistoryStore, rolling_sum, time_diff_bin_codes
+from ccr_tools.table_writer import write_sheets
 
 """
 6. 时间差值_图表分析_客户多日维度
@@ -17,7 +21,179 @@ PARAM_PROMPTS = {
 plt.rcParams['font.sans-serif'] = ['SimHei']
 plt.rcParams['axes.unicode_minus'] = False
 
-def main(direct_table_path=None, output_dir=None, file_paths=None):
+# 图表用到的列
+CHART_COLUMNS = ['客户名称', '进线时间', '进线-入库时间差']
+
+# 帕累托图的颜色列表（各客户依次接着使用）
+PARETO_COLORS = ['r', 'g', 'b', 'c', 'm', 'y', 'k', 'orange', 'purple', 'pink']
+
+# 进线-入库时间差的区间：<0、0-1 … 14-15、>14（恰好为 14 天的计入 14-15，空值计入 >14），与历史库日汇总一致
+INTERVAL_LABELS = BIN_LABELS
+
+# 默认的滚动趋势窗口（天）
+TREND_WINDOWS = (7, 30)
+
+def count_customer_date_intervals(selected_data, customers):
+    """
+    一次分组分箱统计 客户 × 进线日期 × 时间差区间 的计数，不再逐客户、逐日期筛选。
+    返回 (日期列表, 各客户的日期编码（按该客户数据中首次出现的顺序）, 计数数组[客户, 日期, 区间])
+    """
+    customer_codes = pd.Categorical(selected_data['客户名称'], categories=customers).codes.astype(np.int64)
+    date_codes, dates = pd.factorize(pd.to_datetime(selected_data['进线时间']).dt.date)
+    values = selected_data['进线-入库时间差'].to_numpy(dtype='float64', na_value=np.nan)
+
+    # 区间编码：<0 为 0，[i, i+1) 为 i+1，恰好 14 为 15（14-15），大于 14 及空值为 16（>14）
+    bin_codes = time_diff_bin_codes(values)
+
+    n_customers, n_dates, n_bins = len(customers), len(dates), len(INTERVAL_LABELS)
+    valid = (customer_codes >= 0) & (date_codes >= 0)
+    cell_codes = customer_codes[valid] * n_dates + date_codes[valid]
+    counts = np.bincount(cell_codes * n_bins + bin_codes[valid], minlength=n_customers * n_dates * n_bins)
+
+    # 每个客户的日期按其数据中首次出现的顺序排列
+    cells, first_rows = np.unique(cell_codes, return_index=True)
+    cells = cells[np.argsort(first_rows, kind='stable')]
+    customer_date_codes = [[] for _ in range(n_customers)]
+    for customer_code, date_code in zip(*np.divmod(cells, n_dates)):
+        customer_date_codes[customer_code].append(date_code)
+
+    return list(dates), customer_date_codes, counts.reshape(n_customers, n_dates, n_bins)
+
+def build_rolling_trend(store, start_date=None, end_date=None, windows=TREND_WINDOWS):
+    """
+    基于历史库的日汇总计算每个客户近 N 天的时间差区间分布，不读取明细。
+    日汇总数组沿日期轴做前缀和，各窗口的合计由前缀和相减得到；返回 {工作表名: 数据表}
+    """
+    stored_dates = store.dates()
+    if not stored_dates:
+        raise ValueError("历史库中没有数据，无法计算滚动趋势")
+    start_date = pd.to_datetime(start_date).date() if start_date else stored_dates[0]
+    end_date = pd.to_datetime(end_date).date() if end_date else stored_dates[-1]
+
+    # 向前多读取最长窗口所需的天数，使起始日期的窗口也是完整的
+    lookback = max(windows) - 1
+    dates, customers, daily = store.daily_counts(start_date - timedelta(days=lookback), end_date)
+    dates = dates[lookback:]
+
+    sheets = {}
+    for window in windows:
+        rolled = rolling_sum(daily, window)[lookback:]
+        rows = rolled.reshape(-1, len(INTERVAL_LABELS))
+        totals = rows.sum(axis=1)
+        keep = totals > 0
+        trend = pd.DataFrame(rows[keep], columns=INTERVAL_LABELS)
+        trend.insert(0, '日期', np.repeat(dates, len(customers))[keep])
+        trend.insert(1, '客户名称', np.tile(np.asarray(customers, dtype=object), len(dates))[keep])
+        trend['合计'] = totals[keep]
+        sheets[f'近{window}天滚动分布'] = trend
+    return sheets
+
+def save_rolling_trend(sheets, output_dir, start_date, end_date):
+    """
+    保存滚动趋势表，返回文件路径
+    """
+    output_path = os.path.join(output_dir, f'{start_date}至{end_date}-客户时间差滚动趋势.xlsx')
+    write_sheets(sheets, output_path)
+    print(f"滚动趋势已保存到 {output_path}")
+    return output_path
+
+def customer_chart_names(customer):
+    """
+    单个客户的计数图和帕累托图文件名
+    """
+    return [f'{customer}_time_diff_count.png', f'{customer}_pareto.png']
+
+def render_customer_charts(customer, date_count, output_dir, color_index=0):
+    """
+    绘制单个客户多日的时间差计数图和帕累托图，只需要该客户自己的 {日期: 区间计数}，可在渲染进程池中运行。
+    color_index 为该客户第一天使用的颜色序号，返回两张图的路径
+    """
+    # 生成时间差计数图
+    fig = Figure(figsize=(14, 10))
+    ax = fig.subplots()
+    dates = list(date_count.keys())
+    intervals = list(date_count[dates[0]]['interval_count'].keys())
+
+    for date in dates:
+        counts = list(date_count[date]['interval_count'].values())
+        ax.plot(intervals, counts, label=f"{date} - {date_count[date]['total_count']}", 
+               marker='o', linestyle='-')
+
+        # 添加数值标注
+        for i, count in enumerate(counts):
+            ax.text(i, count + 0.2, str(count), ha='center', fontsize=9)
+
+    ax.legend(fontsize=10, loc='upper right')
+    ax.set_title(f'{customer} -进线-入库时间差计数', fontsize=16, fontweight='bold')
+    ax.set_xlabel('进线-入库时间差', fontsize=14)
+    ax.set_ylabel('计数', fontsize=14)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_facecolor('#f5f5f5')
+    ax.tick_params(axis='both', labelsize=12)
+
+    output_path, pareto_output_path = [os.path.join(output_dir, name) for name in customer_chart_names(customer)]
+    fig.savefig(output_path, dpi=300, bbox_inches='tight')
+
+    # 重新生成帕累托图，使用双Y轴
+    fig_pareto = Figure(figsize=(16, 10))
+    ax_pareto = fig_pareto.subplots()
+    ax_pareto_right = ax_pareto.twinx()  # 创建右Y轴
+    positions = np.arange(len(intervals))  # 用于错开标注
+    label_offset = 0.1  # 标签偏移量
+
+    for idx, date in enumerate(dates):
+        # 获取颜色（循环使用颜色列表）
+        color = PARETO_COLORS[color_index % len(PARETO_COLORS)]
+        color_index += 1
+
+        counts = list(date_count[date]['interval_count'].values())
+        percentages = np.cumsum(counts) / sum(counts) * 100
+
+        # 绘制柱状图
+        bars = ax_pareto.bar(intervals, counts, alpha=0.6, label=f"{date} - 计数", color=color)
+
+        # 添加柱状图数值标注
+        ax_pareto.bar_label(bars, padding=3, fontsize=9)
+
+        # 绘制折线图在右Y轴
+        line, = ax_pareto_right.plot(intervals, percentages, marker='o', linestyle='-', linewidth=2, 
+                                    label=f"{date} - 累积百分比", color=color)
+
+        # 添加折线图数值标注，错开位置
+        for i, (pct, pos) in enumerate(zip(percentages, positions)):
+            ax_pareto_right.text(pos, pct + label_offset, f"{pct:.1f}%", ha='center', fontsize=9)
+            label_offset = -label_offset if abs(label_offset) < 0.5 else -0.1  # 自动调整偏移方向
+
+    # 设置左Y轴（计数）
+    ax_pareto.set_ylabel('计数', fontsize=14, color='blue')
+    ax_pareto.tick_params(axis='y', labelcolor='blue')
+
+    # 设置右Y轴（百分比）
+    ax_pareto_right.set_ylabel('累积百分比', fontsize=14, color='red')
+    ax_pareto_right.tick_params(axis='y', labelcolor='red')
+    ax_pareto_right.set_ylim(0, 100)  # 确保百分比范围为0-100%
+
+    # 统一标题和坐标轴标签
+    ax_pareto.set_title(f'{customer} - 进线-入库时间差帕累托图', fontsize=16, fontweight='bold')
+    ax_pareto.set_xlabel('进线-入库时间差', fontsize=14)
+
+    # 合并图例并放置在图表外部
+    handles1, labels1 = ax_pareto.get_legend_handles_labels()
+    handles2, labels2 = ax_pareto_right.get_legend_handles_labels()
+    fig_pareto.legend(handles1 + handles2, labels1 + labels2, 
+                      loc='upper center', bbox_to_anchor=(0.5, -0.05),
+                      fancybox=True, shadow=True, ncol=2)
+
+    # 其他设置
+    ax_pareto.grid(True, linestyle='--', alpha=0.7)
+    ax_pareto.set_facecolor('#f5f5f5')
+    ax_pareto.tick_params(axis='both', labelsize=12)
+
+    fig_pareto.savefig(pareto_output_path, dpi=300, bbox_inches='tight')
+    return output_path, pareto_output_path
+
+def main(direct_table_path=None, output_dir=None, file_paths=None, max_workers=None, use_cache=True,
+         history_dir=None, start_date=None, end_date=None, trend_windows=None):
     try:
         # 去除路径中的引号
         direct_table_path = direct_table_path.strip('"') if direct_table_path else None
@@ -34,170 +210,103 @@ def main(direct_table_path=None, output_dir=None, file_paths=None):
         if not output_dir:
             raise ValueError("输出目录路径不能为空")
         
+        if trend_windows and direct_table_path and direct_table_path.lower() != 'n':
+            raise ValueError("滚动趋势基于历史库的日汇总计算，请使用多个表格文件或历史库方式运行")
+
+        trend_path = None
         if direct_table_path and direct_table_path.lower() != 'n':
             combined_df = pd.read_csv(direct_table_path)
         else:
-            if file_paths is None:
+            if not file_paths and not history_dir:
                 raise ValueError("file_paths 参数不能为空")
             
             # 将文件路径列表从字符串转换为列表
-            file_paths = [path.strip('"') for path in file_paths.split(',')]
+            file_paths = [path.strip().strip('"') for path in file_paths.split(',') if path.strip()] if file_paths else []
             
             # 检查每个文件路径是否有效
             for path in file_paths:
                 if not os.path.exists(path):
                     raise ValueError(f"文件路径无效或不存在: {path}")
-                if not path.lower().endswith('.csv'):
-                    raise ValueError(f"文件格式不支持，请提供CSV文件: {path}")
+                if not path.lower().endswith(('.csv', '.xlsx', '.xls')):
+                    raise ValueError(f"文件格式不支持，请提供CSV或Excel文件: {path}")
             
-            df_list = [pd.read_csv(file_path) for file_path in file_paths]
-            combined_df = pd.concat(df_list, ignore_index=True)
-            combined_df.to_csv(os.path.join(output_dir, '周度汇总.csv'), index=False)
+            # 各天的明细只写入一次按日期分区的历史库，再只读取所需日期的分区和图表用到的列；
+            # 未指定日期范围时只读取本次输入文件涉及的日期，库中介于其间的其他日期不计入图表
+            history_dir = history_dir.strip('"') if history_dir else os.path.join(output_dir, '历史明细库')
+            store = HistoryStore(history_dir)
+            imported_dates = []
+            for path in file_paths:
+                imported_dates.extend(store.append_file(path))
+            if imported_dates and not start_date and not end_date:
+                imported_dates = sorted(set(imported_dates))
+                combined_df = store.load(days=imported_dates, columns=CHART_COLUMNS)
+                print(f"从历史库读取了 {len(combined_df)} 行明细（本次输入文件涉及的 {len(imported_dates)} 天）")
+                start_date, end_date = imported_dates[0], imported_dates[-1]
+            else:
+                if imported_dates:
+                    start_date = start_date or min(imported_dates)
+                    end_date = end_date or max(imported_dates)
+                combined_df = store.load(start_date, end_date, columns=CHART_COLUMNS)
+                print(f"从历史库读取了 {len(combined_df)} 行明细（{start_date or '不限'} 至 {end_date or '不限'}）")
+
+            if trend_windows:
+                os.makedirs(output_dir, exist_ok=True)
+                trend_sheets = build_rolling_trend(store, start_date, end_date, trend_windows)
+                trend_path = save_rolling_trend(trend_sheets, output_dir,
+                                                start_date or store.dates()[0], end_date or store.dates()[-1])
 
-        selected_data = combined_df[['客户名称', '进线时间', '进线-入库时间差']]
+        selected_data = combined_df[CHART_COLUMNS]
         customer_counts = selected_data['客户名称'].value_counts()
         customers_with_counts_gt1 = customer_counts[customer_counts > 1].index
-        filtered_data = selected_data[selected_data['客户名称'].isin(customers_with_counts_gt1)]
-        filtered_data['进线时间日期'] = pd.to_datetime(filtered_data['进线时间']).dt.date
-
-        customer_date_count = {}
-        for customer in customers_with_counts_gt1:
-            customer_data = filtered_data[filtered_data['客户名称'] == customer]
-            date_count = {}
-            for date in customer_data['进线时间日期'].unique():
-                date_data = customer_data[customer_data['进线时间日期'] == date]['进线-入库时间差']
-                interval_count = {'<0': 0}
-                for i in range(15):
-                    interval_count[f'{i}-{i+1}'] = 0
-                interval_count['>14'] = 0
-
-                for value in date_data:
-                    if value < 0:
-                        interval_count['<0'] += 1
-                    elif 0 <= value <= 14:
-                        interval_count[f'{int(value)}-{int(value)+1}'] += 1
-                    else:
-                        interval_count['>14'] += 1
-
-                total_count = sum(interval_count.values())
-                date_count[date] = {'interval_count': interval_count, 'total_count': total_count}
-
-            customer_date_count[customer] = date_count
+
+        # 一次分组分箱得到 客户 × 日期 × 区间 的计数数组
+        dates, customer_date_codes, interval_counts = count_customer_date_intervals(selected_data, customers_with_counts_gt1)
 
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-        generated_charts = []  # 用于收集生成的图表文件路径
-        generated_pareto_charts = []  # 用于收集生成的帕累托图文件路径
-
-        # 为帕累托图设置颜色列表
-        colors = ['r', 'g', 'b', 'c', 'm', 'y', 'k', 'orange', 'purple', 'pink']
+        # 各客户的图表分发到渲染进程池，每个任务只带该客户的 {日期: 区间计数}，输入没有变化的客户直接使用缓存的图表；
+        # 帕累托图颜色按客户顺序依次接续，因此预先算好每个客户的起始颜色序号
+        jobs = []
         color_index = 0
+        for i, customer in enumerate(customers_with_counts_gt1):
+            if len(customer_date_codes[i]) > 1:
+                date_count = {
+                    dates[d]: {
+                        'interval_count': dict(zip(INTERVAL_LABELS, interval_counts[i, d].tolist())),
+                        'total_count': int(interval_counts[i, d].sum())
+                    }
+                    for d in customer_date_codes[i]
+                }
+                jobs.append((customer,
+                             {'customer': customer, 'date_count': date_count, 'color_index': color_index},
+                             customer_chart_names(customer)))
+                color_index += len(date_count)
 
-        for customer in customers_with_counts_gt1:
-            date_count = len(customer_date_count[customer])
-            if date_count > 1:
-                # 生成时间差计数图
-                fig, ax = plt.subplots(figsize=(14, 10))
-                dates = list(customer_date_count[customer].keys())
-                intervals = list(customer_date_count[customer][dates[0]]['interval_count'].keys())
-
-                for date in dates:
-                    counts = list(customer_date_count[customer][date]['interval_count'].values())
-                    ax.plot(intervals, counts, label=f"{date} - {customer_date_count[customer][date]['total_count']}", 
-                           marker='o', linestyle='-')
-                    
-                    # 添加数值标注
-                    for i, count in enumerate(counts):
-                        ax.text(i, count + 0.2, str(count), ha='center', fontsize=9)
-
-                ax.legend(fontsize=10, loc='upper right')
-                ax.set_title(f'{customer} -进线-入库时间差计数', fontsize=16, fontweight='bold')
-                ax.set_xlabel('进线-入库时间差', fontsize=14)
-                ax.set_ylabel('计数', fontsize=14)
-                ax.grid(True, linestyle='--', alpha=0.7)
-                ax.set_facecolor('#f5f5f5')
-                ax.tick_params(axis='both', labelsize=12)
-
-                output_path = os.path.join(output_dir, f'{customer}_time_diff_count.png')
-                plt.savefig(output_path, dpi=300, bbox_inches='tight')
-                plt.close()  
-                generated_charts.append(output_path)  
-
-                # 重新生成帕累托图，使用双Y轴
-                fig_pareto, ax_pareto = plt.subplots(figsize=(16, 10))
-                ax_pareto_right = ax_pareto.twinx()  # 创建右Y轴
-                positions = np.arange(len(intervals))  # 用于错开标注
-                label_offset = 0.1  # 标签偏移量
-                
-                for idx, date in enumerate(dates):
-                    # 获取颜色（循环使用颜色列表）
-                    color = colors[color_index % len(colors)]
-                    color_index += 1
-                    
-                    counts = list(customer_date_count[customer][date]['interval_count'].values())
-                    percentages = np.cumsum(counts) / sum(counts) * 100
-                    
-                    # 绘制柱状图
-                    bars = ax_pareto.bar(intervals, counts, alpha=0.6, label=f"{date} - 计数", color=color)
-                    
-                    # 添加柱状图数值标注
-                    ax_pareto.bar_label(bars, padding=3, fontsize=9)
-                    
-                    # 绘制折线图在右Y轴
-                    line, = ax_pareto_right.plot(intervals, percentages, marker='o', linestyle='-', linewidth=2, 
-                                                label=f"{date} - 累积百分比", color=color)
-                    
-                    # 添加折线图数值标注，错开位置
-                    for i, (pct, pos) in enumerate(zip(percentages, positions)):
-                        ax_pareto_right.text(pos, pct + label_offset, f"{pct:.1f}%", ha='center', fontsize=9)
-                        label_offset = -label_offset if abs(label_offset) < 0.5 else -0.1  # 自动调整偏移方向
-
-                # 设置左Y轴（计数）
-                ax_pareto.set_ylabel('计数', fontsize=14, color='blue')
-                ax_pareto.tick_params(axis='y', labelcolor='blue')
-                
-                # 设置右Y轴（百分比）
-                ax_pareto_right.set_ylabel('累积百分比', fontsize=14, color='red')
-                ax_pareto_right.tick_params(axis='y', labelcolor='red')
-                ax_pareto_right.set_ylim(0, 100)  # 确保百分比范围为0-100%
-                
-                # 统一标题和坐标轴标签
-                ax_pareto.set_title(f'{customer} - 进线-入库时间差帕累托图', fontsize=16, fontweight='bold')
-                ax_pareto.set_xlabel('进线-入库时间差', fontsize=14)
-                
-                # 合并图例并放置在图表外部
-                handles1, labels1 = ax_pareto.get_legend_handles_labels()
-                handles2, labels2 = ax_pareto_right.get_legend_handles_labels()
-                fig_pareto.legend(handles1 + handles2, labels1 + labels2, 
-                                  loc='upper center', bbox_to_anchor=(0.5, -0.05),
-                                  fancybox=True, shadow=True, ncol=2)
-                
-                # 其他设置
-                ax_pareto.grid(True, linestyle='--', alpha=0.7)
-                ax_pareto.set_facecolor('#f5f5f5')
-                ax_pareto.tick_params(axis='both', labelsize=12)
-
-                pareto_output_path = os.path.join(output_dir, f'{customer}_pareto.png')
-                plt.savefig(pareto_output_path, dpi=300, bbox_inches='tight')
-                plt.close()  
-                generated_pareto_charts.append(pareto_output_path)
+        chart_paths = render_parallel(__file__, 'render_customer_charts', jobs, output_dir, max_workers,
+                                      use_cache=use_cache)
+        generated_charts = [count_path for count_path, _ in chart_paths]  # 用于收集生成的图表文件路径
+        generated_pareto_charts = [pareto_path for _, pareto_path in chart_paths]  # 用于收集生成的帕累托图文件路径
+
+        trend_message = f"\n滚动趋势已保存到 {trend_path}" if trend_path else ''
 
         # 返回所有生成的图表文件路径
         if generated_charts and generated_pareto_charts:
             return {
                 'success': True,
-                'message': "操作成功完成！已生成以下图表文件：\n" + "\n".join(generated_charts + generated_pareto_charts),
-                'generated_charts': generated_charts + generated_pareto_charts
+                'message': "操作成功完成！已生成以下图表文件：\n" + "\n".join(generated_charts + generated_pareto_charts) + trend_message,
+                'generated_charts': generated_charts + generated_pareto_charts,
+                'trend_path': trend_path
             }
         elif generated_charts:
             return {
                 'success': True,
-                'message': "操作成功完成！已生成以下计数图表文件：\n" + "\n".join(generated_charts),
-                'generated_charts': generated_charts
+                'message': "操作成功完成！已生成以下计数图表文件：\n" + "\n".join(generated_charts) + trend_message,
+                'generated_charts': generated_charts,
+                'trend_path': trend_path
             }
         else:
-            return {'success': True, 'message': "操作成功完成！未生成图表文件。"}
+            return {'success': True, 'message': "操作成功完成！未生成图表文件。" + trend_message, 'trend_path': trend_path}
 
     except Exception as e:
         return {'success': False, 'message': str(e)}
@@ -208,8 +317,16 @@ if __name__ == "__main__":
     output_dir = input("请输入输出文件夹的绝对路径：").strip('"')
     file_paths = None  
 
+    start_date = end_date = None
+    trend_windows = None
+
     if direct_table_path.lower() == 'n':
         file_paths = input("请输入多个表格文件的路径（用逗号分隔）：").strip('"')
+        start_date = input("请输入起始日期（直接回车表示按输入文件的日期）：").strip() or None
+        end_date = input("请输入结束日期（直接回车表示按输入文件的日期）：").strip() or None
+        if input('是否同时输出近7天/近30天滚动趋势（y/N）：').strip().lower() == 'y':
+            trend_windows = TREND_WINDOWS
     
-    result = main(direct_table_path, output_dir, file_paths)
+    result = main(direct_table_path, output_dir, file_paths, start_date=start_date, end_date=end_date,
+                  trend_windows=trend_windows)
     print(result['message'])
\ No newline at end of file
@@ -1,82 +1,268 @@
 import pandas as pd
 import os
-from tkinter import Tk, filedialog
+import csv
+import glob
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pandas.api.types import is_bool_dtype, is_integer_dtype
+from ccr_tools.schema import CATEGORY_COLUMNS, unify_categories
+from ccr_tools.script_loader import call_script
+from ccr_tools.table_writer import write_sheets
 
-def split_excel_file(file_path, rows_per_file=5000):
+# 拆分输出支持的格式
+SPLIT_FORMATS = ('.xlsx', '.csv')
+
+
+def iter_sheet_rows(file_path):
     """
-    功能1：将Excel文件按指定行数分割
+    逐行读取第一个工作表（或 CSV 文件），第一行为表头。
+    xlsx 使用 openpyxl 只读模式，不把整个工作簿载入内存；xls 格式无法流式读取，只能整体解析
     """
-    try:
-        # 读取Excel文件
+    lower_path = file_path.lower()
+    if lower_path.endswith('.csv'):
+        with open(file_path, newline='', encoding='utf-8-sig') as f:
+            yield from csv.reader(f)
+    elif lower_path.endswith('.xlsx'):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from wb.worksheets[0].iter_rows(values_only=True)
+        finally:
+            wb.close()
+    else:
         df = pd.read_excel(file_path)
-    except Exception as e:
-        print(f"读取文件出错: {e}")
-        return None
+        yield tuple(df.columns)
+        yield from df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def _row_size(row):
+    # 按行的文本长度估算写出后的字节数
+    return sum(len(str(value)) for value in row if value is not None) + len(row)
 
-    row_count = len(df)
-    print(f"文件 '{file_path}' 的行数为: {row_count}")
 
-    # 获取文件名和目录
+class SplitPartWriter:
+    """
+    拆分出的单个文件：xlsx 使用 openpyxl 只写模式逐行追加，csv 直接逐行写出，内存占用与行数无关。
+    size 为已写出内容的估算字节数（按行的文本长度累计），用于按目标文件大小拆分
+    """
+
+    def __init__(self, path, header):
+        self.path = path
+        self.rows = 0
+        self.size = 0
+        if path.lower().endswith('.csv'):
+            self._file = open(path, 'w', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file)
+            self._workbook = None
+        else:
+            from openpyxl import Workbook
+
+            self._file = None
+            self._workbook = Workbook(write_only=True)
+            self._writer = self._workbook.create_sheet()
+        self._write_row(header)
+
+    def _write_row(self, row):
+        if self._workbook:
+            self._writer.append(row)
+        else:
+            self._writer.writerow(row)
+
+    def append(self, row):
+        self._write_row(row)
+        self.rows += 1
+        self.size += _row_size(row)
+
+    def close(self):
+        if self._workbook:
+            self._workbook.save(self.path)
+        else:
+            self._file.close()
+
+
+def _remove_split_files(part, split_files):
+    """
+    拆分出错时关闭当前文件并删除已写出的拆分文件，不留下不完整的拆分结果
+    """
+    if part is not None:
+        try:
+            part.close()
+        except Exception:
+            pass
+    for split_file_path in split_files:
+        if os.path.exists(split_file_path):
+            os.remove(split_file_path)
+
+
+def parse_batch_size(text, default_rows=5000):
+    """
+    解析每个文件的大小：纯数字为行数，以 KB/MB 结尾为目标文件大小，返回 (行数, 字节数)
+    """
+    text = (text or '').strip().upper()
+    if not text:
+        return default_rows, None
+    for unit, factor in (('KB', 1024), ('MB', 1024 * 1024)):
+        if text.endswith(unit):
+            return None, int(float(text[:-len(unit)]) * factor)
+    return int(text), None
+
+
+def split_excel_file(file_path, rows_per_file=5000, max_bytes=None, output_format=None):
+    """
+    功能1：将Excel文件按指定行数（或按目标文件大小 max_bytes）分割。
+    逐行读取并逐行写入各个输出文件，内存占用不随文件行数增长；
+    output_format 为 .xlsx 或 .csv，默认与原文件相同（xls 输出为 xlsx）
+    """
     file_dir, file_name = os.path.split(file_path)
     file_base, file_ext = os.path.splitext(file_name)
+    output_ext = (output_format or file_ext).lower()
+    if not output_ext.startswith('.'):
+        output_ext = '.' + output_ext
+    if output_ext not in SPLIT_FORMATS:
+        output_ext = '.xlsx'
 
-    # 如果行数小于或等于目标行数，无需分割
-    if row_count <= rows_per_file:
-        print("文件行数小于等于指定行数，无需分割")
-        return [file_path]
+    def is_full(rows, size):
+        return bool((rows_per_file and rows >= rows_per_file) or (max_bytes and size >= max_bytes))
+
+    def open_part():
+        split_file_path = os.path.join(file_dir, f"{file_base}_{len(split_files)+1}{output_ext}")
+        split_files.append(split_file_path)
+        return SplitPartWriter(split_file_path, header)
 
-    # 分割文件
     split_files = []
-    num_files = (row_count + rows_per_file - 1) // rows_per_file  # 向上取整计算文件数量
+    part = None
+    # 第一部分的行先缓存在内存中（不超过一个文件的大小），确定需要分割后才开始写出
+    first_rows = []
+    first_size = 0
+    row_count = 0
+    try:
+        rows = iter_sheet_rows(file_path)
+        header = next(rows, None)
+        if header is None:
+            print(f"文件 '{file_path}' 为空，无需分割")
+            return [file_path]
 
-    for i in range(num_files):
-        start_row = i * rows_per_file
-        end_row = min((i + 1) * rows_per_file, row_count)
-        subset_df = df[start_row:end_row]
+        for row in rows:
+            row_count += 1
+            if part is None:
+                if not is_full(len(first_rows), first_size):
+                    first_rows.append(row)
+                    first_size += _row_size(row)
+                    continue
+                part = open_part()
+                for first_row in first_rows:
+                    part.append(first_row)
+                first_rows = []
+            if is_full(part.rows, part.size):
+                part.close()
+                print(f"已将第 {len(split_files)} 部分数据（{part.rows} 行）保存为: {part.path}")
+                part = open_part()
+            part.append(row)
 
-        # 生成新文件名
-        split_file_path = os.path.join(file_dir, f"{file_base}_{i+1}{file_ext}")
-        subset_df.to_excel(split_file_path, index=False)
-        split_files.append(split_file_path)
-        print(f"已将第 {i+1} 部分数据保存为: {split_file_path}")
+        print(f"文件 '{file_path}' 的行数为: {row_count}")
+
+        if part is None:
+            # 不超过一个文件的大小且格式不变，无需分割，不写出任何文件
+            if output_ext == file_ext.lower():
+                print("文件行数小于等于指定行数，无需分割")
+                return [file_path]
+            # 只转换格式，输出一个文件
+            part = open_part()
+            for first_row in first_rows:
+                part.append(first_row)
+
+        part.close()
+        print(f"已将第 {len(split_files)} 部分数据（{part.rows} 行）保存为: {part.path}")
+    except Exception as e:
+        print(f"读取文件出错: {e}")
+        _remove_split_files(part, split_files)
+        return None
 
     return split_files
 
 
-def merge_multiple_excel_files_by_sheet(file_paths):
+def read_workbook_sheets(file_path):
     """
-    功能2：合并多个Excel文件的相同工作表
+    一次解析读取工作簿中的全部工作表，返回 {工作表名: DataFrame}，可在进程池中运行
+    """
+    if file_path.lower().endswith('.csv'):
+        return {'Sheet1': pd.read_csv(file_path)}
+    return pd.read_excel(file_path, sheet_name=None)
+
+
+def _read_for_merge(file_path):
+    # 子进程中的异常以文本返回，单个文件出错不影响其他文件
+    try:
+        return read_workbook_sheets(file_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def align_sheet_frames(dfs):
+    """
+    按列名对齐同一工作表在各文件中的数据：列顺序按首次出现的顺序；
+    分类列共用同一份字典；其余列在各文件中类型不一致，或整数/布尔列在部分文件中缺失时按 object 合并，
+    避免运单号等长整数列因缺失值被转换为浮点数
+    """
+    columns = list(dict.fromkeys(col for df in dfs for col in df.columns))
+    non_empty = [df for df in dfs if len(df)]
+
+    category_columns = [col for col in CATEGORY_COLUMNS if col in columns and all(col in df.columns for df in dfs)]
+    dfs = unify_categories([df.copy() for df in dfs], category_columns)
+
+    for col in columns:
+        if col in category_columns:
+            continue
+        dtypes = [df[col].dtype for df in non_empty if col in df.columns]
+        missing = not all(col in df.columns for df in non_empty)
+        if len({str(dtype) for dtype in dtypes}) > 1 or (
+                missing and any(is_integer_dtype(dtype) or is_bool_dtype(dtype) for dtype in dtypes)):
+            dtype = object
+        else:
+            dtype = dtypes[0] if dtypes else object
+        for df in dfs:
+            # 缺失的列按同一类型补空值，合并时各文件该列类型一致
+            df[col] = df[col].astype(dtype) if col in df.columns else pd.Series(index=df.index, dtype=dtype)
+    return [df[columns] for df in dfs]
+
+
+def collect_sheet_frames(file_paths, max_workers=None):
+    """
+    读取多个文件并按工作表名归集数据，返回 {工作表名: 按列名对齐后的 DataFrame 列表}。
+    每个文件只解析一次（一次读取全部工作表），多个文件分发到进程池并行解析，顺序与输入顺序一致
     """
     # 创建一个字典来存储每个工作表名称对应的数据
     sheet_data = {}
 
-    for file_path in file_paths:
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(file_paths) <= 1:
+        results = [(file_path, _read_for_merge(file_path)) for file_path in file_paths]
+    else:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(file_paths))) as executor:
+            futures = [executor.submit(call_script, __file__, '_read_for_merge', file_path) for file_path in file_paths]
+            results = [(file_path, future.result()) for file_path, future in zip(file_paths, futures)]
+
+    for file_path, (sheets, error) in results:
         print(f"正在处理文件: {file_path}")
-        try:
-            # 获取Excel文件的所有工作表
-            xls = pd.ExcelFile(file_path)
-            sheet_names = xls.sheet_names
-            print(f"文件 '{file_path}' 包含以下工作表: {sheet_names}")
-
-            for sheet_name in sheet_names:
-                print(f"正在读取工作表: {sheet_name}")
-                try:
-                    # 读取每个工作表
-                    df = pd.read_excel(file_path, sheet_name=sheet_name)
-
-                    # 如果工作表名称已存在于字典中，则追加数据
-                    if sheet_name in sheet_data:
-                        sheet_data[sheet_name].append(df)
-                    else:
-                        sheet_data[sheet_name] = [df]
-
-                    print(f"工作表 '{sheet_name}' 读取成功，行数: {len(df)}")
-                except Exception as e:
-                    print(f"读取文件 '{file_path}' 的工作表 '{sheet_name}' 时出错: {e}")
-
-        except Exception as e:
-            print(f"读取文件 '{file_path}' 时出错: {e}")
+        if error:
+            print(f"读取文件 '{file_path}' 时出错: {error}")
+            continue
+        print(f"文件 '{file_path}' 包含以下工作表: {list(sheets)}")
+
+        for sheet_name, df in sheets.items():
+            # 如果工作表名称已存在于字典中，则追加数据
+            sheet_data.setdefault(sheet_name, []).append(df)
+            print(f"工作表 '{sheet_name}' 读取成功，行数: {len(df)}")
 
+    return {sheet_name: align_sheet_frames(dfs) for sheet_name, dfs in sheet_data.items()}
+
+
+def merge_multiple_excel_files_by_sheet(file_paths, max_workers=None):
+    """
+    功能2：合并多个Excel文件的相同工作表
+    """
+    sheet_data = collect_sheet_frames(file_paths, max_workers)
     if not sheet_data:
         print("没有找到可合并的数据")
         return None
@@ -84,42 +270,95 @@ def merge_multiple_excel_files_by_sheet(file_paths):
     # 合并每个工作表的数据
     merged_sheets = {}
     for sheet_name, dfs in sheet_data.items():
-        merged_df = pd.concat(dfs, ignore_index=True)
-        merged_sheets[sheet_name] = merged_df
+        merged_sheets[sheet_name] = pd.concat(dfs, ignore_index=True)
 
     return merged_sheets
 
 
-def save_merged_file_with_sheets(merged_sheets):
+def save_merged_file_with_sheets(merged_sheets, output_path=None):
     """
-    保存合并后的文件，包含多个工作表
+    保存合并后的文件，包含多个工作表；未指定 output_path 时弹出对话框选择保存位置。
+    merged_sheets 的值可以是 DataFrame 或 DataFrame 列表，以只写模式逐块写出
     """
-    # 使用tkinter的文件对话框让用户选择保存位置
-    root = Tk()
-    root.withdraw()
-    output_path = filedialog.asksaveasfilename(
-        title="选择保存合并文件的位置",
-        defaultextension=".xlsx",
-        filetypes=[("Excel文件", "*.xlsx")]
-    )
+    if not output_path:
+        # 使用tkinter的文件对话框让用户选择保存位置
+        from tkinter import Tk, filedialog
+
+        root = Tk()
+        root.withdraw()
+        output_path = filedialog.asksaveasfilename(
+            title="选择保存合并文件的位置",
+            defaultextension=".xlsx",
+            filetypes=[("Excel文件", "*.xlsx")]
+        )
 
     if not output_path:
         print("未选择保存路径，合并结果未保存")
         return None
 
     try:
-        # 使用ExcelWriter保存多个工作表
-        with pd.ExcelWriter(output_path) as writer:
-            for sheet_name, merged_df in merged_sheets.items():
-                merged_df.to_excel(writer, sheet_name=sheet_name, index=False)
-        
-        print(f"合并完成！已保存到: {output_path}")
-        return output_path
+        row_counts, output_paths = write_sheets(merged_sheets, output_path)
+        for sheet_name, rows in row_counts.items():
+            print(f"工作表 '{sheet_name}' 合并后行数: {rows}")
+        print(f"合并完成！已保存到: {', '.join(output_paths)}")
+        return output_paths[0]
     except Exception as e:
         print(f"保存合并文件时出错: {e}")
         return None
 
 
+def list_merge_files(input_pattern, exclude=None):
+    """
+    展开文件夹或通配符路径，返回其中的 CSV/Excel 文件（跳过临时文件和 exclude 指定的输出文件）
+    """
+    input_pattern = input_pattern.strip('"')
+    if os.path.isdir(input_pattern):
+        paths = [os.path.join(input_pattern, name) for name in os.listdir(input_pattern)]
+    else:
+        paths = glob.glob(input_pattern)
+
+    exclude = os.path.abspath(exclude) if exclude else None
+    return sorted(
+        path for path in paths
+        if path.lower().endswith(('.csv', '.xlsx', '.xls'))
+        and not os.path.basename(path).startswith('~$')
+        and os.path.abspath(path) != exclude
+    )
+
+
+def batch_merge(input_pattern, output_path, max_workers=None):
+    """
+    批量模式（无交互）：合并文件夹或通配符匹配到的全部查询结果文件，
+    各工作表以只写模式直接写入 output_path（xlsx，或 .csv 时每个工作表一个文件），返回各工作表的行数
+    """
+    try:
+        output_path = output_path.strip('"') if output_path else None
+        if not output_path:
+            raise ValueError("输出文件路径不能为空")
+
+        file_paths = list_merge_files(input_pattern, exclude=output_path)
+        if not file_paths:
+            raise ValueError("未找到任何 CSV 或 Excel 文件")
+        print(f"共找到 {len(file_paths)} 个文件，开始合并")
+
+        sheet_data = collect_sheet_frames(file_paths, max_workers)
+        if not sheet_data:
+            raise ValueError("没有找到可合并的数据")
+
+        # 各文件的数据逐块写出，不再整体合并成一个 DataFrame
+        row_counts, output_paths = write_sheets(sheet_data, output_path)
+        summary = "\n".join(f"{sheet_name}：{rows} 行" for sheet_name, rows in row_counts.items())
+        return {
+            'success': True,
+            'message': f"操作成功完成！已合并 {len(file_paths)} 个文件，保存到 {', '.join(output_paths)}\n{summary}",
+            'row_counts': row_counts,
+            'output_paths': output_paths
+        }
+
+    except Exception as e:
+        return {'success': False, 'message': str(e)}
+
+
 def main():
     """
     主程序：根据用户输入调用相应功能
@@ -133,7 +372,10 @@ def main():
     if choice == "1":
         # 功能1：按行数分割文件
         file_path = input("请输入要分割的文件路径: ").strip('"')
-        split_excel_file(file_path)
+        batch_size = input("请输入每个文件的行数（直接回车为5000，以KB/MB结尾表示按文件大小，如 20MB）: ")
+        output_format = input("请输入输出格式 xlsx/csv（直接回车与原文件相同）: ").strip() or None
+        rows_per_file, max_bytes = parse_batch_size(batch_size)
+        split_excel_file(file_path, rows_per_file, max_bytes, output_format)
     
     elif choice == "2":
         # 功能2：合并多个文件
@@ -152,5 +394,11 @@ def main():
         print("无效的选择，请输入1或2")
 
 
+# 带两个参数运行时为无交互的批量合并，可用于定时任务：
+# python 7-拆分运单号_合并查询数据.py "D:\查询结果\*.xlsx" "D:\查询结果-运单号.xlsx"
 if __name__ == "__main__":
+    if len(sys.argv) >= 3:
+        result = batch_merge(sys.argv[1], sys.argv[2])
+        print(result['message'])
+        sys.exit(0 if result['success'] else 1)
     main()
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""
+脚本3“进线-入库时间差”派生列计算的性能对比：原逐行 apply 实现 vs 向量化实现
+用法：python benchmarks/bench_time_diff.py [行数1,行数2,...]（默认 1000000,10000000）
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ccr_tools.script_loader import find_script, load_script
+
+
+def legacy_time_diff_columns(df_merged):
+    """
+    原脚本3的实现（逐行 apply + np.select + pd.cut + fillna('')）
+    """
+    df_merged = df_merged.copy()
+    df_merged['进线-入库时间差'] = (df_merged['进线时间'] - df_merged['入库时间']).apply(lambda x: x.total_seconds() / 3600 / 24 if not pd.isnull(x) else np.nan)
+
+    conditions = [
+        (df_merged['进线-入库时间差'] > 0),
+        (df_merged['进线-入库时间差'] < 0),
+        (df_merged['入库时间'].isna())
+    ]
+    choices = ['入库后', '入库前', '无入库']
+    df_merged['入库前后'] = np.select(conditions, choices, default='')
+
+    bins = [0, 1, 2, 3, float('inf')]
+    labels = ['1天以内', '2天以内', '3天以内', '超过3天']
+    df_merged['入库后进线-进线与入库时间差分布区间'] = pd.cut(
+        df_merged['进线-入库时间差'],
+        bins=bins,
+        labels=labels,
+        right=False
+    )
+
+    df_merged[['入库时间', '进线-入库时间差']] = df_merged[['入库时间', '进线-入库时间差']].fillna('')
+    return df_merged
+
+
+def make_data(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.datetime64('2024-10-01T00:00:00')
+    inbound = base + rng.integers(0, 86400 * 10, rows).astype('timedelta64[s]')
+    incoming = inbound + rng.integers(-86400 * 2, 86400 * 6, rows).astype('timedelta64[s]')
+    df = pd.DataFrame({'进线时间': incoming, '入库时间': inbound})
+    df.loc[rng.random(rows) < 0.2, '入库时间'] = pd.NaT
+    return df
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in (sys.argv[1] if len(sys.argv) > 1 else '1000000,10000000').split(',')]
+    add_time_diff_columns = load_script(find_script(3)).add_time_diff_columns
+
+    print(f"{'行数':>10} {'原实现(秒)':>12} {'向量化(秒)':>12} {'加速比':>8}")
+    for rows in sizes:
+        df = make_data(rows)
+        legacy, legacy_seconds = timed(legacy_time_diff_columns, df)
+        vectorized, vectorized_seconds = timed(add_time_diff_columns, df)
+
+        # 校验两种实现的结果一致
+        assert legacy['入库前后'].astype(str).equals(vectorized['入库前后'].astype(str))
+        assert legacy['入库后进线-进线与入库时间差分布区间'].astype(str).equals(
+            vectorized['入库后进线-进线与入库时间差分布区间'].astype(str))
+
+        print(f"{rows:>10} {legacy_seconds:>12.3f} {vectorized_seconds:>12.3f} {legacy_seconds / vectorized_seconds:>7.1f}x")
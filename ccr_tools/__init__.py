@@ -0,0 +1,3 @@
+"""
+CCR 分析脚本共用工具
+"""
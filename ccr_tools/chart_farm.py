@@ -0,0 +1,100 @@
+"""
+图表渲染进程池：把逐客户的绘图任务分发到多个进程并行渲染（非交互的 Agg 后端），
+并按绘图输入的哈希缓存渲染结果，输入没有变化的图表直接从缓存复制
+"""
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+from ccr_tools.disk_cache import DiskCache, file_cache_key
+from ccr_tools.script_loader import call_script
+
+# 图表缓存格式版本，缓存内容的生成方式变化时加一使旧缓存失效
+CHART_CACHE_VERSION = 1
+
+# 图表缓存大小上限（默认 512MB），可通过环境变量 CCR_CHART_CACHE_MAX_MB 修改
+CHART_CACHE_MAX_BYTES = int(os.environ.get('CCR_CHART_CACHE_MAX_MB', 512)) * 1024 * 1024
+
+
+def _use_agg_backend():
+    # 子进程只保存图片，不需要图形界面
+    matplotlib.use('Agg')
+
+
+def print_progress(done, total, job_name):
+    print(f"[{done}/{total}] 图表已生成：{job_name}")
+
+
+def chart_cache_key(script_path, func_name, kwargs, output_names):
+    """
+    图表的缓存键：脚本内容（含字体、配色等样式设置）+ matplotlib 版本 + 绘图函数 + 绘图参数 + 输出文件名
+    """
+    return file_cache_key(script_path, 'chart', CHART_CACHE_VERSION, matplotlib.__version__, func_name,
+                          repr(sorted(kwargs.items())), '|'.join(output_names))
+
+
+def render_parallel(script_path, func_name, jobs, output_dir, max_workers=None, progress=print_progress,
+                    use_cache=True):
+    """
+    在进程池中对每个任务调用脚本中的绘图函数 func_name(output_dir=output_dir, **参数)，
+    返回按任务顺序排列的输出文件路径元组列表。
+    jobs 为 [(任务名, 参数字典, 输出文件名列表), ...]，参数只应包含该客户自己的小规模计数数据；
+    use_cache 时参数和样式都没有变化的任务直接从图表缓存复制输出文件，不再重新渲染。
+    每完成一个任务调用 progress(已完成数, 总数, 任务名)。max_workers=1 时在当前进程中依次渲染
+    """
+    jobs = list(jobs)
+    total = len(jobs)
+    results = [None] * total
+    if total == 0:
+        return results
+
+    os.makedirs(output_dir, exist_ok=True)
+    cache = DiskCache(max_bytes=CHART_CACHE_MAX_BYTES, namespace='charts') if use_cache else None
+
+    done = 0
+    pending = []
+    for index, (job_name, kwargs, output_names) in enumerate(jobs):
+        results[index] = tuple(os.path.join(output_dir, name) for name in output_names)
+        key = None
+        if cache is not None:
+            key = chart_cache_key(script_path, func_name, kwargs, output_names)
+            cached_paths = [cache.get(f"{key}-{i}", os.path.splitext(name)[1])
+                            for i, name in enumerate(output_names)]
+            if all(cached_paths):
+                for cached_path, output_path in zip(cached_paths, results[index]):
+                    shutil.copyfile(cached_path, output_path)
+                done += 1
+                if progress:
+                    progress(done, total, f"{job_name}（未变化，使用缓存）")
+                continue
+        pending.append((index, job_name, kwargs, key))
+
+    def finish(index, job_name, key):
+        nonlocal done
+        if cache is not None:
+            for i, output_path in enumerate(results[index]):
+                cache.put(f"{key}-{i}", os.path.splitext(output_path)[1],
+                          lambda tmp_path, source=output_path: shutil.copyfile(source, tmp_path))
+        done += 1
+        if progress:
+            progress(done, total, job_name)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(pending) <= 1:
+        for index, job_name, kwargs, key in pending:
+            call_script(script_path, func_name, output_dir=output_dir, **kwargs)
+            finish(index, job_name, key)
+        return results
+
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(pending)), initializer=_use_agg_backend) as executor:
+        futures = {
+            executor.submit(call_script, script_path, func_name, output_dir=output_dir, **kwargs): (index, job_name, key)
+            for index, job_name, kwargs, key in pending
+        }
+        for future in as_completed(futures):
+            index, job_name, key = futures[future]
+            future.result()
+            finish(index, job_name, key)
+    return results
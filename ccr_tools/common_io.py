@@ -0,0 +1,39 @@
+"""
+表格读取的公共工具
+"""
+import pandas as pd
+
+from ccr_tools.excel_cache import iter_excel_chunks
+from ccr_tools.schema import SharedCategories
+
+# 分块读取时每块的默认行数
+DEFAULT_CHUNKSIZE = 100000
+
+
+def iter_table_chunks(file_path, usecols=None, chunksize=DEFAULT_CHUNKSIZE, sheet_name=0, dtype=None):
+    """
+    分块读取CSV或Excel文件，只保留usecols中的列，逐块返回DataFrame
+    dtype 为 {列名: 类型} 字典，CSV 在解析时直接按该类型读取，其他格式逐块转换；
+    类型为 'category' 的列先按推断的类型读取（数字键保持为数字），再按整个文件共用的字典转换为分类类型
+    """
+    file_path = file_path.strip('"')
+    lower_path = file_path.lower()
+    dtype = dtype or {}
+    shared = SharedCategories([col for col, col_type in dtype.items() if col_type == 'category'])
+    dtype = {col: col_type for col, col_type in dtype.items() if col_type != 'category'}
+
+    if lower_path.endswith('.csv'):
+        for chunk in pd.read_csv(file_path, usecols=usecols, chunksize=chunksize, dtype=dtype or None):
+            yield shared.encode(chunk)
+        return
+
+    if lower_path.endswith(('.xlsx', '.xls')):
+        # Excel 文件经列式缓存分块读取：首次读取时边解析边写入缓存，之后的运行不再解析 Excel
+        chunks = iter_excel_chunks(file_path, sheet_name, usecols, chunksize)
+    else:
+        raise ValueError("不支持的文件格式，请提供CSV或Excel文件")
+
+    for chunk in chunks:
+        if dtype:
+            chunk = chunk.astype({col: dtype[col] for col in chunk.columns if col in dtype})
+        yield shared.encode(chunk)
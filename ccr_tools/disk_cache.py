@@ -0,0 +1,160 @@
+"""
+按大小限制、最近最少使用（LRU）淘汰的磁盘缓存
+"""
+import hashlib
+import os
+import uuid
+
+# 默认缓存目录，可通过环境变量 CCR_CACHE_DIR 修改
+DEFAULT_CACHE_DIR = os.environ.get('CCR_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.ccr_cache'))
+
+# 默认缓存大小上限（2GB），可通过环境变量 CCR_CACHE_MAX_MB 修改
+DEFAULT_MAX_BYTES = int(os.environ.get('CCR_CACHE_MAX_MB', 2048)) * 1024 * 1024
+
+
+class DiskCache:
+    """
+    缓存文件直接存放在目录中，以文件修改时间作为最近访问时间。
+    不维护共享索引，多个进程同时读写同一缓存目录也是安全的。
+    写入时只累加本进程估计的总大小，超过上限时才扫描目录淘汰。
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, namespace=''):
+        self.cache_dir = os.path.join(cache_dir or DEFAULT_CACHE_DIR, namespace)
+        self.max_bytes = max_bytes
+        # 缓存目录总大小的估计值，首次写入时扫描一次目录初始化
+        self._total_bytes = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, key, suffix=''):
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def get(self, key, suffix=''):
+        """
+        命中时刷新访问时间并返回缓存文件路径，未命中返回 None
+        """
+        path = self.path_for(key, suffix)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, key, suffix, writer):
+        """
+        调用 writer(临时路径) 写出缓存文件，写完后原子替换到缓存位置并按大小淘汰
+        """
+        tmp_path = self.tmp_path_for(key, suffix)
+        try:
+            writer(tmp_path)
+            return self.commit(tmp_path, key, suffix)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def tmp_path_for(self, key, suffix=''):
+        """
+        分多次写出缓存文件时使用的临时路径，写完后调用 commit；中途放弃时由调用方删除
+        """
+        return f"{self.path_for(key, suffix)}.{uuid.uuid4().hex}.tmp"
+
+    def commit(self, tmp_path, key, suffix=''):
+        """
+        把写完的临时文件原子替换到缓存位置并按大小淘汰，返回缓存文件路径
+        """
+        path = self.path_for(key, suffix)
+        if self._total_bytes is None:
+            self._total_bytes = self._scan_total_bytes()
+        self._total_bytes += os.path.getsize(tmp_path) - _file_size(path)
+        os.replace(tmp_path, path)
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+        return path
+
+    def get_text(self, key, suffix='.txt'):
+        path = self.get(key, suffix)
+        if path is None:
+            return None
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def put_text(self, key, text, suffix='.txt'):
+        def writer(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return self.put(key, suffix, writer)
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """
+        缓存总大小超过上限时，从最久未访问的文件开始删除
+        """
+        entries = self._entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total_bytes -= size
+            except OSError:
+                pass
+        self._total_bytes = total_bytes
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def content_hash(file_path, block_size=1024 * 1024):
+    """
+    计算文件内容的 SHA1
+    """
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+_fingerprints = None
+
+
+def file_cache_key(file_path, *parts):
+    """
+    生成源文件的缓存键：先按 路径+大小+修改时间 查找已记录的内容哈希，
+    查不到时再计算内容哈希，最后与 parts 一起组成缓存键
+    """
+    global _fingerprints
+    if _fingerprints is None:
+        _fingerprints = DiskCache(namespace='fingerprint')
+
+    stat = os.stat(file_path)
+    stat_key = hashlib.sha1(
+        f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode('utf-8')
+    ).hexdigest()
+
+    file_hash = _fingerprints.get_text(stat_key)
+    if file_hash is None:
+        file_hash = content_hash(file_path)
+        _fingerprints.put_text(stat_key, file_hash)
+
+    return hashlib.sha1('|'.join([file_hash, *map(str, parts)]).encode('utf-8')).hexdigest()
@@ -0,0 +1,231 @@
+"""
+Excel 解析结果的列式缓存：同一份导出文件只解析一次，之后直接读取缓存
+"""
+import os
+
+import pandas as pd
+
+from ccr_tools.disk_cache import DiskCache, file_cache_key
+from ccr_tools.schema import apply_schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时退回到 pickle 格式
+    pa = pq = None
+
+# 缓存格式版本，修改缓存内容结构时递增
+CACHE_VERSION = 2
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(namespace='excel')
+    return _cache
+
+
+def _lookup(key):
+    cache = get_cache()
+    for suffix in ('.parquet', '.pkl'):
+        path = cache.get(key, suffix)
+        if path is not None:
+            return path
+    return None
+
+
+def cached_table_path(file_path, sheet_name=0, build=True):
+    """
+    返回 Excel 文件对应的缓存文件路径；未缓存时按 build 决定是否解析并写入缓存
+    """
+    file_path = file_path.strip('"')
+    key = file_cache_key(file_path, sheet_name, CACHE_VERSION)
+    path = _lookup(key)
+    if path is not None or not build:
+        return path
+
+    if _can_stream(file_path):
+        # 逐块解析并写入缓存，不保留解析出的数据
+        for _ in _stream_and_cache(file_path, sheet_name, key):
+            pass
+        path = _lookup(key)
+        if path is not None:
+            return path
+
+    # xls 文件、未安装 pyarrow 或各块的列类型无法统一时整表解析
+    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    return _store(key, df)
+
+
+def _can_stream(file_path):
+    return pq is not None and file_path.lower().endswith('.xlsx')
+
+
+def _iter_sheet_batches(file_path, sheet_name=0, chunksize=100000):
+    """
+    用 openpyxl 只读模式逐行解析工作表，每 chunksize 行组成一个 DataFrame；
+    第一行为表头，整行为空的行与 pd.read_excel 一样跳过
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        rows = ws.iter_rows(values_only=True)
+        header = list(next(rows, None) or [])
+        # 去掉表头末尾的空单元格，中间的空表头按 pandas 的方式命名
+        while header and header[-1] is None:
+            header.pop()
+        if not header:
+            return
+        columns = [f"Unnamed: {i}" if name is None else name for i, name in enumerate(header)]
+
+        width = len(columns)
+        batch = []
+        for row in rows:
+            row = tuple(row[:width])
+            if all(value is None for value in row):
+                continue
+            batch.append(row + (None,) * (width - len(row)))
+            if len(batch) >= chunksize:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        wb.close()
+
+
+def _stream_and_cache(file_path, sheet_name, key, chunksize=100000):
+    """
+    逐块解析 xlsx 文件并返回各块，同时用 ParquetWriter 把各块追加写入缓存，内存占用只与块大小有关。
+    列类型以第一块为准，之后的块转换为相同类型；无法转换时（如前面全为空的列后来出现了值、
+    列中混有数字和文本）放弃本次缓存，各块照常返回。调用方中途停止读取时同样不写入缓存
+    """
+    cache = get_cache()
+    tmp_path = cache.tmp_path_for(key, '.parquet')
+    writer = None
+    schema = None
+    caching = True
+    try:
+        for df in _iter_sheet_batches(file_path, sheet_name, chunksize):
+            # 分类列以字典编码存储，读取时直接得到分类类型
+            apply_schema(df)
+            if caching:
+                try:
+                    table = pa.Table.from_pandas(df, preserve_index=False)
+                    if writer is None:
+                        schema = table.schema
+                        writer = pq.ParquetWriter(tmp_path, schema)
+                    elif not table.schema.equals(schema):
+                        table = table.cast(schema)
+                    writer.write_table(table)
+                except (pa.ArrowException, ValueError, TypeError):
+                    caching = False
+            yield df
+
+        if writer is not None:
+            writer.close()
+            writer = None
+            if caching:
+                cache.commit(tmp_path, key, '.parquet')
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _store(key, df):
+    cache = get_cache()
+    # 分类列以字典编码存储，读取时直接得到分类类型
+    apply_schema(df)
+    if pq is not None:
+        try:
+            return cache.put(key, '.parquet', lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        except Exception:
+            # 列中混有多种类型时 Parquet 无法写出，改用 pickle
+            pass
+    return cache.put(key, '.pkl', df.to_pickle)
+
+
+def read_cached_table(cache_path, columns=None):
+    if cache_path.endswith('.parquet'):
+        return pd.read_parquet(cache_path, columns=columns)
+    df = pd.read_pickle(cache_path)
+    return df[columns] if columns is not None else df
+
+
+def cached_columns(cache_path):
+    """
+    缓存文件中的列名，Parquet 格式只读取文件元数据
+    """
+    if cache_path.endswith('.parquet'):
+        return pq.ParquetFile(cache_path).schema_arrow.names
+    return list(pd.read_pickle(cache_path).columns)
+
+
+def read_cached_rows(cache_path, positions):
+    """
+    只取出缓存文件中指定行号的行；Parquet 格式先在 Arrow 中按行号选取，再转换为 DataFrame
+    """
+    if cache_path.endswith('.parquet'):
+        table = pq.read_table(cache_path, memory_map=True)
+        return table.take(positions).to_pandas()
+    return read_cached_table(cache_path).iloc[positions].reset_index(drop=True)
+
+
+def iter_excel_chunks(file_path, sheet_name=0, columns=None, chunksize=100000):
+    """
+    分块读取 Excel 文件：已缓存时按批次读取缓存；未缓存的 xlsx 文件边解析边写入缓存，
+    首次读取也不需要把整个工作表载入内存。columns 中有文件缺少的列时抛出 ValueError
+    """
+    file_path = file_path.strip('"')
+    key = file_cache_key(file_path, sheet_name, CACHE_VERSION)
+    cache_path = _lookup(key)
+    if cache_path is None and _can_stream(file_path):
+        chunks = _stream_and_cache(file_path, sheet_name, key, chunksize)
+        try:
+            for i, chunk in enumerate(chunks):
+                if i == 0:
+                    _check_columns(chunk.columns, columns)
+                yield chunk if columns is None else chunk[columns]
+        finally:
+            chunks.close()
+        return
+
+    if cache_path is None:
+        cache_path = cached_table_path(file_path, sheet_name)
+    _check_columns(cached_columns(cache_path), columns)
+    yield from iter_cached_chunks(cache_path, columns, chunksize)
+
+
+def _check_columns(available, columns):
+    if columns is None:
+        return
+    missing = [col for col in columns if col not in available]
+    if missing:
+        raise ValueError(f"文件中缺少必要的列：{', '.join(missing)}")
+
+
+def iter_cached_chunks(cache_path, columns=None, chunksize=100000):
+    """
+    分块读取缓存文件，Parquet 格式按批次读取，不需要整体载入
+    """
+    if cache_path.endswith('.parquet'):
+        parquet_file = pq.ParquetFile(cache_path)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        df = read_cached_table(cache_path, columns)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+
+
+def read_excel_cached(file_path, sheet_name=0, columns=None):
+    """
+    读取 Excel 文件，未改动过的文件直接从缓存载入，跳过 Excel 解析
+    """
+    return read_cached_table(cached_table_path(file_path, sheet_name), columns)
@@ -0,0 +1,307 @@
+"""
+按进线日期分区的投诉时间差明细历史库：每天的明细只写入一次，查询时只读取日期范围内的分区和需要的列。
+每个分区文件同时保存一份 客户 × 时间差区间 的日汇总，滚动趋势直接在日汇总上计算
+"""
+import glob
+import hashlib
+import json
+import os
+import uuid
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ccr_tools.disk_cache import file_cache_key
+from ccr_tools.excel_cache import read_excel_cached
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时退回到 pickle 格式
+    pq = None
+
+# 分区目录名的前缀，如“进线日期=2024-10-01”
+PARTITION_PREFIX = '进线日期='
+
+# 分区依据的时间列
+DATE_COLUMN = '进线时间'
+
+# 已导入文件的记录目录
+MANIFEST_DIR = '_imported'
+
+# 明细分区文件和日汇总文件的文件名前缀
+PART_PREFIX = 'part-'
+COUNTS_PREFIX = 'counts-'
+
+# 日汇总的时间差区间：<0、0-1 … 14-15、>14（恰好为 14 天的计入 14-15，空值计入 >14）
+BIN_LABELS = ['<0'] + [f'{i}-{i+1}' for i in range(15)] + ['>14']
+
+
+def time_diff_bin_codes(values):
+    """
+    “进线-入库时间差”（天）对应的区间编码（BIN_LABELS 的下标）
+    """
+    values = np.asarray(values, dtype='float64')
+    codes = np.digitize(values, np.arange(15))
+    codes[(values > 14) | np.isnan(values)] = len(BIN_LABELS) - 1
+    return codes
+
+
+def count_bins_by_customer(df):
+    """
+    统计每个客户在各时间差区间的计数，返回以客户名称为索引、BIN_LABELS 为列的表
+    """
+    customer_codes, customers = pd.factorize(df['客户名称'])
+    bin_codes = time_diff_bin_codes(df['进线-入库时间差'].to_numpy(dtype='float64', na_value=np.nan))
+    valid = customer_codes >= 0
+    counts = np.bincount(customer_codes[valid] * len(BIN_LABELS) + bin_codes[valid],
+                         minlength=len(customers) * len(BIN_LABELS))
+    return pd.DataFrame(counts.reshape(len(customers), len(BIN_LABELS)),
+                        index=pd.Index(np.asarray(customers, dtype=object), name='客户名称'), columns=BIN_LABELS)
+
+
+def rolling_sum(daily, window):
+    """
+    沿第一个轴（日期）计算 window 天的滚动合计：前缀和相减，不随窗口长度重复累加；
+    开头不足 window 天时按已有的天数合计
+    """
+    cumulative = np.cumsum(daily, axis=0)
+    rolled = cumulative.copy()
+    rolled[window:] -= cumulative[:-window]
+    return rolled
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return pd.to_datetime(value).date()
+
+
+class HistoryStore:
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        os.makedirs(os.path.join(root_dir, MANIFEST_DIR), exist_ok=True)
+
+    def _manifest_path(self, file_key):
+        return os.path.join(self.root_dir, MANIFEST_DIR, f"{file_key}.json")
+
+    def _write_atomic(self, path, writer):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            writer(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _partition_dir(self, day):
+        return os.path.join(self.root_dir, f"{PARTITION_PREFIX}{day.isoformat()}")
+
+    def _write_frame(self, partition_dir, name, df):
+        os.makedirs(partition_dir, exist_ok=True)
+        path = None
+        if pq is not None:
+            try:
+                path = os.path.join(partition_dir, f"{name}.parquet")
+                self._write_atomic(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+            except Exception:
+                # 列中混有多种类型时 Parquet 无法写出，改用 pickle
+                path = None
+        if path is None:
+            path = os.path.join(partition_dir, f"{name}.pkl")
+            self._write_atomic(path, df.to_pickle)
+
+        # 同名的另一种格式的旧文件删除，避免同一份明细被读取两次
+        for ext in ('.parquet', '.pkl'):
+            other_path = os.path.join(partition_dir, f"{name}{ext}")
+            if other_path != path and os.path.exists(other_path):
+                os.remove(other_path)
+        return path
+
+    def _read_frame(self, path, columns=None):
+        if path.endswith('.parquet'):
+            return pd.read_parquet(path, columns=columns)
+        df = pd.read_pickle(path)
+        return df[columns] if columns is not None else df
+
+    def _part_files(self, day, prefix=PART_PREFIX):
+        partition_dir = self._partition_dir(day)
+        return {
+            os.path.splitext(name)[0][len(prefix):]: os.path.join(partition_dir, name)
+            for name in sorted(os.listdir(partition_dir))
+            if name.startswith(prefix) and name.endswith(('.parquet', '.pkl'))
+        }
+
+    def _remove_parts(self, day, part_name):
+        """
+        删除某一天某个分区文件的明细和日汇总，分区目录清空后一并删除
+        """
+        partition_dir = self._partition_dir(day)
+        if not os.path.isdir(partition_dir):
+            return
+        for prefix in (PART_PREFIX, COUNTS_PREFIX):
+            for ext in ('.parquet', '.pkl'):
+                path = os.path.join(partition_dir, f"{prefix}{part_name}{ext}")
+                if os.path.exists(path):
+                    os.remove(path)
+        if not os.listdir(partition_dir):
+            os.rmdir(partition_dir)
+
+    def _source_manifests(self, source_path):
+        """
+        同一源文件路径以前导入时留下的记录，返回 [(记录文件路径, 记录内容), ...]
+        """
+        manifests = []
+        for manifest_path in glob.glob(os.path.join(self.root_dir, MANIFEST_DIR, '*.json')):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('file_path') == source_path:
+                manifests.append((manifest_path, manifest))
+        return manifests
+
+    def _write_partition(self, day, part_name, df):
+        partition_dir = self._partition_dir(day)
+        path = self._write_frame(partition_dir, f"{PART_PREFIX}{part_name}", df)
+        if '客户名称' in df.columns and '进线-入库时间差' in df.columns:
+            # 写入明细的同时保存该分区的日汇总，之后计算趋势不再读取明细
+            self._write_frame(partition_dir, f"{COUNTS_PREFIX}{part_name}", count_bins_by_customer(df).reset_index())
+        else:
+            # 明细中没有计算日汇总的列，删除同名的旧日汇总，避免与新明细不一致
+            for ext in ('.parquet', '.pkl'):
+                counts_path = os.path.join(partition_dir, f"{COUNTS_PREFIX}{part_name}{ext}")
+                if os.path.exists(counts_path):
+                    os.remove(counts_path)
+        return path
+
+    def append_file(self, file_path):
+        """
+        把一份“客户-时间差值明细”按进线日期写入各自的分区。
+        已导入过的文件（内容相同）直接跳过，返回该文件涉及的日期列表；
+        同一路径的文件内容改动后重新导入时，替换该文件以前写入的全部分区文件，不会重复计入
+        """
+        file_key = file_cache_key(file_path, 'history')
+        manifest_path = self._manifest_path(file_key)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            print(f"明细已导入过历史库，跳过：{file_path}")
+            return [date.fromisoformat(day) for day in manifest['dates']]
+
+        if file_path.lower().endswith('.csv'):
+            df = pd.read_csv(file_path)
+        else:
+            df = read_excel_cached(file_path)
+        if DATE_COLUMN not in df.columns:
+            raise ValueError(f"文件中缺少必要的列：{DATE_COLUMN}（{file_path}）")
+
+        df[DATE_COLUMN] = pd.to_datetime(df[DATE_COLUMN], errors='coerce')
+        days = df[DATE_COLUMN].dt.date
+        missing = int(days.isna().sum())
+        if missing:
+            print(f"{file_path} 中有 {missing} 行没有进线时间，未写入历史库")
+
+        # 同一天来自不同文件的明细各写一个分区文件，分区文件按源文件路径命名，
+        # 同一路径的文件改动后重新导入时直接覆盖同名的分区文件
+        source_path = os.path.abspath(file_path)
+        part_name = hashlib.md5(source_path.encode('utf-8')).hexdigest()[:16]
+        stale_manifests = self._source_manifests(source_path)
+        if stale_manifests:
+            print(f"{file_path} 已改动，替换以前导入的明细")
+
+        written_days = []
+        for day, day_df in df[days.notna()].groupby(days[days.notna()], sort=True):
+            self._write_partition(day, part_name, day_df.reset_index(drop=True))
+            written_days.append(day)
+
+        # 新的分区文件全部写入后，再删除以前导入、修正后已不再涉及的日期的分区文件；
+        # 中途出错时以前导入的明细仍然保留
+        for _, old_manifest in stale_manifests:
+            for day in map(date.fromisoformat, old_manifest['dates']):
+                if day not in written_days:
+                    self._remove_parts(day, part_name)
+
+        manifest = {
+            'file_path': source_path,
+            'imported_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'dates': [day.isoformat() for day in written_days],
+        }
+        self._write_atomic(manifest_path, lambda tmp_path: _dump_json(manifest, tmp_path))
+        for old_manifest_path, _ in stale_manifests:
+            os.remove(old_manifest_path)
+        print(f"已将 {file_path} 写入历史库，共 {len(written_days)} 天")
+        return written_days
+
+    def dates(self):
+        """
+        历史库中已有的全部进线日期（升序）
+        """
+        days = []
+        for name in os.listdir(self.root_dir):
+            if name.startswith(PARTITION_PREFIX):
+                days.append(date.fromisoformat(name[len(PARTITION_PREFIX):]))
+        return sorted(days)
+
+    def load(self, start_date=None, end_date=None, columns=None, days=None):
+        """
+        读取 [start_date, end_date] 范围内（含两端，None 表示不限）的明细，只读取 columns 中的列；
+        传入 days 时只读取这些日期
+        """
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        days = set(_to_date(day) for day in days) if days is not None else None
+        frames = []
+        for day in self.dates():
+            if (start_date and day < start_date) or (end_date and day > end_date):
+                continue
+            if days is not None and day not in days:
+                continue
+            for path in self._part_files(day).values():
+                frames.append(self._read_frame(path, columns))
+
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    def day_counts(self, day):
+        """
+        某一天的 客户 × 时间差区间 日汇总（各分区文件写入时保存的日汇总之和）
+        """
+        frames = []
+        counts_files = self._part_files(day, COUNTS_PREFIX)
+        for part_name, part_path in self._part_files(day).items():
+            if part_name not in counts_files:
+                raise ValueError(f"分区文件缺少日汇总（明细中没有 客户名称/进线-入库时间差 列）：{part_path}")
+            frames.append(self._read_frame(counts_files[part_name]))
+
+        if not frames:
+            return pd.DataFrame(columns=BIN_LABELS, index=pd.Index([], name='客户名称'), dtype='int64')
+        counts = pd.concat(frames, ignore_index=True)
+        counts['客户名称'] = counts['客户名称'].astype(object)
+        return counts.groupby('客户名称', sort=False)[BIN_LABELS].sum()
+
+    def daily_counts(self, start_date, end_date):
+        """
+        读取 [start_date, end_date] 每一天的日汇总，返回 (日期列表, 客户列表, 计数数组[日期, 客户, 区间])。
+        日期逐日连续，没有数据的日期计数为 0
+        """
+        start_date, end_date = _to_date(start_date), _to_date(end_date)
+        dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        stored_dates = set(self.dates())
+
+        day_frames = {day: self.day_counts(day) for day in dates if day in stored_dates}
+        customers = list(dict.fromkeys(
+            customer for frame in day_frames.values() for customer in frame.index
+        ))
+        customer_index = pd.Index(customers, dtype=object)
+
+        daily = np.zeros((len(dates), len(customers), len(BIN_LABELS)), dtype=np.int64)
+        for i, day in enumerate(dates):
+            frame = day_frames.get(day)
+            if frame is not None and len(frame):
+                daily[i, customer_index.get_indexer(frame.index)] = frame.to_numpy()
+        return dates, customers, daily
+
+
+def _dump_json(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
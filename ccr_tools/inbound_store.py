@@ -0,0 +1,101 @@
+"""
+运单最早入库时间库：每天的轨迹导出增量写入本地 SQLite，每个运单只保留最早的入柜/入库时间
+"""
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from ccr_tools.common_io import iter_table_chunks, DEFAULT_CHUNKSIZE
+from ccr_tools.disk_cache import file_cache_key
+from ccr_tools.operation_stages import stage_mask
+from ccr_tools.schema import normalize_keys
+
+# 时间以文本保存，该格式可以直接按字符串比较先后
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class InboundStore:
+
+    def __init__(self, db_path):
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS earliest_inbound (
+                运单号 TEXT PRIMARY KEY,
+                入库时间 TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS imported_files (
+                file_key TEXT PRIMARY KEY,
+                file_path TEXT,
+                imported_at TEXT
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def update(self, earliest):
+        """
+        写入 运单号/操作时间 表，已有记录只在新时间更早时才更新。
+        运单号按 normalize_keys 转换为文本，含空值的数字列读成浮点数时也不会带上“.0”
+        """
+        earliest = earliest.dropna(subset=['运单号', '操作时间'])
+        rows = zip(normalize_keys(earliest['运单号']), earliest['操作时间'].dt.strftime(TIME_FORMAT))
+        with self.conn:
+            self.conn.executemany("""
+                INSERT INTO earliest_inbound (运单号, 入库时间) VALUES (?, ?)
+                ON CONFLICT(运单号) DO UPDATE SET 入库时间 = excluded.入库时间
+                WHERE excluded.入库时间 < earliest_inbound.入库时间
+            """, rows)
+
+    def update_from_file(self, tracking_path, chunksize=DEFAULT_CHUNKSIZE):
+        """
+        分块读取“查询结果-运单号”轨迹表，把入库类操作的最早时间写入库中。
+        已导入过的文件（内容相同）直接跳过，返回本次处理的入库记录数
+        """
+        file_key = file_cache_key(tracking_path)
+        if self.conn.execute("SELECT 1 FROM imported_files WHERE file_key = ?", (file_key,)).fetchone():
+            print(f"轨迹表已导入过，跳过：{tracking_path}")
+            return 0
+
+        inbound_rows = 0
+        for chunk in iter_table_chunks(tracking_path, usecols=['运单号', '操作时间', '操作名称'], chunksize=chunksize):
+            chunk = chunk[stage_mask(chunk['操作名称'], '入库')]
+            if chunk.empty:
+                continue
+            chunk = chunk.assign(操作时间=pd.to_datetime(chunk['操作时间'], errors='coerce'))
+            self.update(chunk.groupby('运单号', observed=True)['操作时间'].min().reset_index())
+            inbound_rows += len(chunk)
+
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO imported_files (file_key, file_path, imported_at) VALUES (?, ?, ?)",
+                (file_key, os.path.abspath(tracking_path), datetime.now().strftime(TIME_FORMAT))
+            )
+        print(f"已从 {tracking_path} 导入 {inbound_rows} 条入库记录")
+        return inbound_rows
+
+    def lookup(self, waybills):
+        """
+        查询一批运单的最早入库时间，返回 运单号/操作时间 表（库中没有的运单不返回）
+        """
+        waybills = normalize_keys(pd.Series(waybills).dropna()).unique()
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_waybills (运单号 TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM query_waybills")
+            self.conn.executemany("INSERT INTO query_waybills (运单号) VALUES (?)", ((w,) for w in waybills))
+        result = pd.read_sql_query("""
+            SELECT e.运单号, e.入库时间 AS 操作时间
+            FROM earliest_inbound e JOIN query_waybills q ON e.运单号 = q.运单号
+        """, self.conn)
+        result['操作时间'] = pd.to_datetime(result['操作时间'], format=TIME_FORMAT)
+        return result
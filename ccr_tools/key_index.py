@@ -0,0 +1,213 @@
+"""
+客户维度键索引：记录源文件中每个 (省区名称, 揽收网点名称, K码, 客户名称) 所在的行号，
+之后只需读取匹配的行，不必整表扫描
+"""
+import io
+
+import pandas as pd
+
+from ccr_tools.common_io import iter_table_chunks
+from ccr_tools.disk_cache import DiskCache, file_cache_key
+from ccr_tools.excel_cache import cached_table_path, read_cached_rows, read_cached_table
+from ccr_tools.schema import CUSTOMER_KEY_COLUMNS, apply_schema, concat_chunks, is_categorical, unify_categories
+
+# 索引格式版本，修改索引结构时递增
+INDEX_VERSION = 3
+
+# 行号列名
+ROW_COLUMN = '行号'
+
+# CSV 数据行起始字节位置的列名
+OFFSET_COLUMN = '字节位置'
+
+# 索引表 attrs 中记录 CSV 各列类型（按整个文件推断）的键
+DTYPES_ATTR = 'csv_dtypes'
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = DiskCache(namespace='key_index')
+    return _cache
+
+
+def _is_excel(file_path):
+    return file_path.lower().endswith(('.xlsx', '.xls'))
+
+
+def build_key_index(file_path, key_columns=CUSTOMER_KEY_COLUMNS):
+    """
+    扫描源文件的键列，生成 键列 + 行号 的索引表
+    Excel 文件的行号对应列式缓存中的行，CSV 文件的行号对应数据行（不含表头），
+    CSV 文件同时记录每行的起始字节位置，读取时直接定位到这些行
+    """
+    if _is_excel(file_path):
+        index = read_cached_table(cached_table_path(file_path), columns=key_columns)
+        csv_dtypes = None
+    else:
+        # 键列按推断的类型读取（数字 K码 保持为数字），再按整个文件共用的字典转换为分类类型；
+        # 同时记录各列在整个文件中的类型，之后只读取部分行时按该类型解析
+        csv_dtypes = {}
+
+        def key_chunks():
+            for chunk in iter_table_chunks(file_path, dtype={col: 'category' for col in key_columns}):
+                for col in chunk.columns:
+                    csv_dtypes[col] = _merge_dtype(csv_dtypes.get(col), _csv_dtype(chunk[col]))
+                yield chunk[key_columns]
+
+        index = concat_chunks(key_chunks())
+    index = apply_schema(index[key_columns].copy(), key_columns)
+    index[ROW_COLUMN] = range(len(index))
+
+    if csv_dtypes is not None:
+        offsets = _csv_record_offsets(file_path)
+        # 记录划分与 pandas 解析结果不一致时（如特殊的引号写法）不保存字节位置，读取时退回逐行跳过
+        if len(offsets) == len(index):
+            index[OFFSET_COLUMN] = offsets
+        index.attrs[DTYPES_ATTR] = {col: dtype for col, dtype in csv_dtypes.items() if dtype is not None}
+    return index
+
+
+def _csv_dtype(series):
+    """
+    read_csv 对一块数据推断出的类型名；分类列按字典的类型，整列为空时返回 None（不提供信息）
+    """
+    if is_categorical(series):
+        if not len(series.cat.categories):
+            return None
+        dtype = series.cat.categories.dtype
+        if pd.api.types.is_integer_dtype(dtype) and series.hasnans:
+            return 'float64'
+    else:
+        dtype = series.dtype
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_numeric_dtype(dtype):
+        return str(dtype)
+    return 'str'
+
+
+def _merge_dtype(old, new):
+    """
+    合并两块数据的类型：整数与浮点数合并为浮点数，其余不一致的情况按文本处理
+    """
+    if old is None or old == new:
+        return new
+    if new is None:
+        return old
+    if {old, new} <= {'int64', 'float64'}:
+        return 'float64'
+    return 'str'
+
+
+def _read_csv_record(f, offset):
+    """
+    从 offset 处读取一条 CSV 记录，引号内的换行属于同一条记录
+    """
+    f.seek(offset)
+    lines = []
+    in_quotes = False
+    while True:
+        line = f.readline()
+        lines.append(line)
+        if line.count(b'"') % 2:
+            in_quotes = not in_quotes
+        if not in_quotes or not line:
+            break
+    record = b''.join(lines)
+    return record if record.endswith(b'\n') else record + b'\n'
+
+
+def _csv_record_offsets(file_path):
+    """
+    按字节扫描 CSV 文件，返回每条数据记录（不含表头）的起始字节位置；
+    引号内的换行不结束记录，空行与 pandas 一样跳过
+    """
+    offsets = []
+    position = 0
+    record_start = 0
+    record_lines = 0
+    in_quotes = False
+    header_done = False
+    with open(file_path, 'rb') as f:
+        for line in f:
+            if not in_quotes:
+                record_start = position
+                record_lines = 0
+            record_lines += 1
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            position += len(line)
+            if in_quotes:
+                continue
+            if record_lines == 1 and not line.strip(b'\r\n'):
+                continue
+            if header_done:
+                offsets.append(record_start)
+            else:
+                header_done = True
+    return offsets
+
+
+def load_key_index(file_path, key_columns=CUSTOMER_KEY_COLUMNS):
+    """
+    读取源文件的键索引，源文件未建立过索引（或已改动）时先建立并保存
+    """
+    file_path = file_path.strip('"')
+    cache = get_cache()
+    key = file_cache_key(file_path, *key_columns, INDEX_VERSION)
+    index_path = cache.get(key, '.pkl')
+    if index_path is not None:
+        return pd.read_pickle(index_path)
+
+    index = build_key_index(file_path, key_columns)
+    cache.put(key, '.pkl', index.to_pickle)
+    return index
+
+
+def lookup_rows(index, keys, key_columns=CUSTOMER_KEY_COLUMNS):
+    """
+    返回与 keys 中任意一行匹配的源文件行号（升序）
+    """
+    keys = apply_schema(keys[key_columns].drop_duplicates().copy(), key_columns)
+    index_keys = index[key_columns].copy()
+    unify_categories([index_keys, keys], key_columns)
+    matched = index_keys.assign(**{ROW_COLUMN: index[ROW_COLUMN]}).merge(keys, on=key_columns, how='inner')
+    return matched[ROW_COLUMN].sort_values().to_numpy()
+
+
+def read_rows(file_path, positions, dtype=None):
+    """
+    只读取源文件中指定行号的数据行；CSV 文件按 dtype 解析（不按读到的几行重新推断类型）
+    """
+    file_path = file_path.strip('"')
+    if _is_excel(file_path):
+        return read_cached_rows(cached_table_path(file_path), positions)
+
+    # CSV 文件跳过不需要的行，被跳过的行不会转换成 DataFrame
+    wanted = set(int(pos) + 1 for pos in positions)
+    return pd.read_csv(file_path, skiprows=lambda line: line > 0 and line not in wanted, dtype=dtype)
+
+
+def read_csv_records(file_path, offsets, dtype=None):
+    """
+    按字节位置直接读取 CSV 文件中的若干条记录（连同表头一起解析），不扫描文件的其余部分；
+    按 dtype 解析，读到的几行与整表读取时的类型一致
+    """
+    with open(file_path, 'rb') as f:
+        records = [_read_csv_record(f, 0)]
+        records.extend(_read_csv_record(f, int(offset)) for offset in offsets)
+    return pd.read_csv(io.BytesIO(b''.join(records)), dtype=dtype)
+
+
+def read_matching_rows(file_path, keys, key_columns=CUSTOMER_KEY_COLUMNS):
+    """
+    借助键索引读取源文件中与 keys 匹配的行，返回 (匹配的行, 源文件总行数)
+    """
+    index = load_key_index(file_path, key_columns)
+    positions = lookup_rows(index, keys, key_columns)
+    dtype = index.attrs.get(DTYPES_ATTR)
+    if OFFSET_COLUMN in index.columns:
+        offsets = index[OFFSET_COLUMN].to_numpy()[positions]
+        return read_csv_records(file_path.strip('"'), offsets, dtype), len(index)
+    return read_rows(file_path, positions, dtype), len(index)
@@ -0,0 +1,77 @@
+"""
+操作名称 → 环节字典：只对不重复的操作名称做一次关键字匹配，再按编码映射到每条轨迹记录
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# 环节列表，顺序即分类编码
+STAGES = ['其他', '揽收', '中转', '入库', '派送', '签收']
+
+# 默认的 关键字 → 环节 规则，按顺序匹配，先匹配到的优先
+DEFAULT_STAGE_RULES = [
+    ('入柜', '入库'),
+    ('入库', '入库'),
+    ('签收', '签收'),
+    ('派送', '派送'),
+    ('派件', '派送'),
+    ('揽收', '揽收'),
+    ('收件', '揽收'),
+    ('发出', '中转'),
+    ('到达', '中转'),
+    ('中转', '中转'),
+]
+
+# 自定义规则文件（JSON 对象，如 {"入柜": "入库", "派件": "派送"}），可通过环境变量 CCR_STAGE_RULES 指定
+STAGE_RULES_ENV = 'CCR_STAGE_RULES'
+
+
+def load_stage_rules(rules_path=None):
+    """
+    读取 关键字 → 环节 规则，未指定规则文件时使用默认规则
+    """
+    rules_path = rules_path or os.environ.get(STAGE_RULES_ENV)
+    if not rules_path:
+        return DEFAULT_STAGE_RULES
+
+    with open(rules_path, encoding='utf-8') as f:
+        rules = list(json.load(f).items())
+    unknown = sorted({stage for _, stage in rules if stage not in STAGES})
+    if unknown:
+        raise ValueError(f"规则文件中存在未知的环节：{', '.join(unknown)}，可用环节为：{', '.join(STAGES)}")
+    return rules
+
+
+def _stage_code(operation, rules):
+    for keyword, stage in rules:
+        if keyword in operation:
+            return STAGES.index(stage)
+    return 0
+
+
+def classify_operations(operations, rules=None):
+    """
+    将操作名称列映射为环节分类列（类别为 STAGES），空值归入“其他”
+    """
+    rules = load_stage_rules() if rules is None else rules
+    operations = pd.Series(operations)
+
+    if isinstance(operations.dtype, pd.CategoricalDtype):
+        codes = operations.cat.codes.to_numpy()
+        uniques = operations.cat.categories
+    else:
+        codes, uniques = pd.factorize(operations)
+
+    # 只对不重复的操作名称做关键字匹配，末尾多放一个“其他”供空值（编码 -1）使用
+    unique_stage_codes = np.array([_stage_code(str(value), rules) for value in uniques] + [0], dtype=np.int8)
+    stage_codes = unique_stage_codes[codes]
+    return pd.Series(pd.Categorical.from_codes(stage_codes, categories=STAGES), index=operations.index, name='环节')
+
+
+def stage_mask(operations, stage, rules=None):
+    """
+    返回操作名称属于指定环节的布尔掩码（按整数编码比较）
+    """
+    return classify_operations(operations, rules).cat.codes.to_numpy() == STAGES.index(stage)
@@ -0,0 +1,142 @@
+"""
+多维度透视引擎：按分组键一次计数，得到任意多个分类维度的计数、占比和总计
+"""
+import numpy as np
+import pandas as pd
+
+
+class PivotResult:
+    """
+    一次分组计数的结果：key_frame 为各分组的键值，counts[维度] 为 分组数 × 类别数 的计数矩阵
+    """
+
+    def __init__(self, keys, key_frame, categories, counts):
+        self.keys = keys
+        self.key_frame = key_frame
+        self.categories = categories
+        self.counts = counts
+
+    def sheet(self, measure, count_names=None, share_names=None, total_name='总计',
+              total_label=None, label_column=None):
+        """
+        生成某个维度的报表：分组键 + 各类别的计数与占比（交替排列）+ 总计列。
+        count_names/share_names 用于重命名计数列和占比列（默认为“类别”和“类别占比”）；
+        给出 total_label 时在末尾追加总计行，total_label 写在 label_column 列（默认为最后一个分组键）
+        """
+        count_names = count_names or {}
+        share_names = share_names or {}
+        counts = self.counts[measure]
+        totals = counts.sum(axis=1)
+
+        table = self.key_frame.copy()
+        for i, category in enumerate(self.categories[measure]):
+            table[count_names.get(category, category)] = counts[:, i]
+            table[share_names.get(category, f'{category}占比')] = _share(counts[:, i], totals)
+        table[total_name] = totals
+
+        if total_label is None:
+            return table
+
+        label_column = label_column or self.keys[-1]
+        total_row = {key: '' for key in self.keys}
+        total_row[label_column] = total_label
+        grand_total = totals.sum()
+        for i, category in enumerate(self.categories[measure]):
+            column_total = counts[:, i].sum()
+            total_row[count_names.get(category, category)] = column_total
+            total_row[share_names.get(category, f'{category}占比')] = _share(column_total, grand_total)
+        total_row[total_name] = grand_total
+
+        table = table.astype({key: object for key in self.keys})
+        return pd.concat([table, pd.DataFrame([total_row])], ignore_index=True)
+
+
+    def rollup(self, levels, subtotal_label='小计', total_label='总计'):
+        """
+        按分组键前缀做多级汇总（类似 SQL GROUPING SETS），直接在已有计数矩阵上累加，不再重新分组明细。
+        levels 为参与汇总的键前缀长度，如 [0, 1, 2] 表示总计、第一级键小计、前两级键小计；
+        小计行排在所属分组的明细之后，被汇总掉的第一个键列写 subtotal_label（总计行写 total_label）
+        """
+        n_keys = len(self.keys)
+        n_rows = len(self.key_frame)
+        key_codes = [pd.factorize(self.key_frame[key], sort=False)[0] for key in self.keys]
+
+        frames = [self.key_frame.astype(object)]
+        counts = {name: [matrix] for name, matrix in self.counts.items()}
+        # 排序键：(所属分组最后一行明细的位置, 层级)，层级越粗越靠后
+        sort_end = [np.arange(n_rows)]
+        sort_level = [np.zeros(n_rows, dtype=np.int64)]
+
+        for level in sorted(set(levels), reverse=True):
+            if not 0 <= level < n_keys:
+                raise ValueError(f"汇总层级必须在 0 到 {n_keys - 1} 之间：{level}")
+            if n_rows == 0:
+                continue
+            # key_frame 已按分组键排序，同一前缀的行是连续的，直接按边界分段求和
+            changed = np.zeros(n_rows, dtype=bool)
+            changed[0] = True
+            for codes in key_codes[:level]:
+                changed[1:] |= codes[1:] != codes[:-1]
+            starts = np.flatnonzero(changed)
+            ends = np.append(starts[1:], n_rows) - 1
+
+            frame = self.key_frame.iloc[starts, :level].astype(object).reset_index(drop=True)
+            frame[self.keys[level]] = total_label if level == 0 else subtotal_label
+            for key in self.keys[level + 1:]:
+                frame[key] = ''
+            frames.append(frame[self.keys])
+            for name, matrix in self.counts.items():
+                counts[name].append(np.add.reduceat(matrix, starts, axis=0))
+            sort_end.append(ends)
+            sort_level.append(np.full(len(starts), n_keys - level, dtype=np.int64))
+
+        order = np.lexsort((np.concatenate(sort_level), np.concatenate(sort_end)))
+        key_frame = pd.concat(frames, ignore_index=True).iloc[order].reset_index(drop=True)
+        counts = {name: np.concatenate(parts)[order] for name, parts in counts.items()}
+        return PivotResult(self.keys, key_frame, self.categories, counts)
+
+
+def _share(part, total):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.true_divide(part, total)
+
+
+def pivot_counts(df, keys, measures):
+    """
+    按 keys 分组，对 measures（{维度名: (列名, 类别列表)}）中所有维度一次完成计数。
+    各维度的类别编码按偏移量拼接到同一个编码空间，只做一次 bincount；
+    不在类别列表中的值（如空值）不计数
+    """
+    grouper = df.groupby(keys, observed=True, sort=True)
+    group_codes = grouper.ngroup().to_numpy()
+    key_frame = grouper.size().index.to_frame(index=False)
+    n_groups = len(key_frame)
+
+    categories = {name: list(cats) for name, (_, cats) in measures.items()}
+    width = sum(len(cats) for cats in categories.values())
+
+    flat_codes = []
+    offset = 0
+    for name, (column, _) in measures.items():
+        cats = categories[name]
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # 分类列只需在字典上重新映射，不必逐行比较
+            codes = values.cat.set_categories(cats).cat.codes.to_numpy().astype(np.int64)
+        else:
+            # 不在类别列表中的值（含空值）编码为 -1
+            codes = pd.Index(cats).get_indexer(values).astype(np.int64)
+        valid = (codes >= 0) & (group_codes >= 0)
+        flat_codes.append(group_codes[valid].astype(np.int64) * width + offset + codes[valid])
+        offset += len(cats)
+
+    flat_counts = np.bincount(np.concatenate(flat_codes), minlength=n_groups * width) if flat_codes else np.zeros(0)
+    matrix = flat_counts.reshape(n_groups, width)
+
+    counts = {}
+    offset = 0
+    for name, cats in categories.items():
+        counts[name] = matrix[:, offset:offset + len(cats)]
+        offset += len(cats)
+
+    return PivotResult(list(keys), key_frame, categories, counts)
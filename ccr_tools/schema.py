@@ -0,0 +1,206 @@
+"""
+共用的数据结构定义：低基数的文本列统一按分类（字典编码）类型载入
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# 客户分组维度，所有分析都按这四列分组或匹配
+CUSTOMER_KEY_COLUMNS = ['省区名称', '揽收网点名称', 'K码', '客户名称']
+
+# 按分类类型载入的列
+CATEGORY_COLUMNS = CUSTOMER_KEY_COLUMNS + ['工单来源', '工单小类', '操作名称', '入库前后']
+
+
+def is_categorical(series):
+    return isinstance(series.dtype, pd.CategoricalDtype)
+
+
+def apply_schema(df, columns=CATEGORY_COLUMNS):
+    """
+    将 df 中存在的分类列转换为分类类型（原地修改并返回 df）
+    """
+    for col in columns:
+        if col in df.columns and not is_categorical(df[col]):
+            df[col] = df[col].astype('category')
+    return df
+
+
+def unify_categories(frames, columns=CUSTOMER_KEY_COLUMNS):
+    """
+    让多个 DataFrame 的同名分类列共用同一份字典，合并和 isin 时可以直接比较整数编码
+    """
+    for col in columns:
+        if not all(col in df.columns for df in frames):
+            continue
+        series_list = [df[col].astype('category') for df in frames]
+        try:
+            categories = union_categoricals(series_list, ignore_order=True).categories
+        except TypeError:
+            # 各表中该列的取值类型不一致（如数字与文本），保持原样
+            continue
+        for df, series in zip(frames, series_list):
+            df[col] = series.cat.set_categories(categories)
+    return frames
+
+
+class SharedCategories:
+    """
+    分块读取时各块共用的分类字典：各列先按推断的类型读取，再转换为分类类型；
+    新出现的取值追加到字典末尾，已有取值的编码在各块之间保持不变
+    """
+
+    def __init__(self, columns):
+        self.categories = dict.fromkeys(columns)
+
+    def encode(self, df):
+        for col, known in self.categories.items():
+            if col not in df.columns:
+                continue
+            series = df[col]
+            values = series.cat.categories if is_categorical(series) else pd.Index(series.dropna().unique())
+            if known is None:
+                known = values
+            else:
+                new_values = values[known.get_indexer(values) < 0]
+                if len(new_values):
+                    known = known.append(new_values)
+            self.categories[col] = known
+            if is_categorical(series):
+                df[col] = series.cat.set_categories(known)
+            else:
+                df[col] = pd.Categorical(series, categories=known)
+        return df
+
+
+def concat_chunks(chunks):
+    """
+    合并分块读取的数据：分类列先对齐到同一份字典，合并后仍为分类类型
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    columns = [col for col in chunks[0].columns if is_categorical(chunks[0][col])]
+    unify_categories(chunks, columns)
+    df = pd.concat(chunks, ignore_index=True)
+    # 各块字典的取值类型不一致（如数字与文本）时合并结果为 object，重新转换为分类类型
+    return apply_schema(df, columns)
+
+
+def fill_missing(df, value):
+    """
+    填充空值，分类列会先把填充值加入字典
+    """
+    for col in df.columns:
+        if not df[col].isna().any():
+            continue
+        if is_categorical(df[col]):
+            if value not in df[col].cat.categories:
+                df[col] = df[col].cat.add_categories([value])
+            df[col] = df[col].fillna(value)
+        else:
+            df[col] = df[col].astype(object).fillna(value)
+    return df
+
+
+def normalize_text(series):
+    """
+    去除首尾空格并统一转换为小写；分类列只在字典上计算，不逐行处理
+    """
+    if is_categorical(series):
+        return series.map(lambda value: str(value).strip().lower())
+    return series.astype(str).str.strip().str.lower()
+
+
+def _key_text(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+def normalize_keys(series):
+    """
+    把运单号、K码等匹配用的键列统一转换为文本：整数值的浮点数（含空值的数字列会被读成浮点数）
+    转换为不带小数点的整数文本，空值保持为空；分类列只在字典上计算，数字列和文本列按列向量化转换
+    """
+    if is_categorical(series) or pd.api.types.is_object_dtype(series):
+        return series.map(_key_text, na_action='ignore')
+    if pd.api.types.is_integer_dtype(series) and not series.hasnans:
+        return series.astype(str)
+    if pd.api.types.is_float_dtype(series):
+        values = series.to_numpy(dtype='float64', na_value=np.nan)
+        integral = np.isfinite(values) & (values == np.floor(values))
+        other = ~integral & ~np.isnan(values)
+        text = np.full(len(values), np.nan, dtype=object)
+        text[integral] = values[integral].astype('int64').astype(str)
+        text[other] = values[other].astype(str)
+        return pd.Series(text, index=series.index, name=series.name, dtype='str')
+    if pd.api.types.is_string_dtype(series):
+        return series.str.strip()
+    return series.map(_key_text, na_action='ignore')
+
+
+def key_mask(series, keys):
+    """
+    series 中取值与 keys（normalize_keys 得到的键文本）之一相同的行，返回布尔数组。
+    只把少量的 keys 转换为 series 的取值类型后直接 isin，不逐行转换 series；分类列只在字典上比较
+    """
+    if is_categorical(series):
+        matched = np.append(key_mask(pd.Series(series.cat.categories), keys), False)
+        return matched[series.cat.codes.to_numpy()]
+
+    keys = pd.Series(list(keys), dtype=object)
+    numbers = pd.to_numeric(keys, errors='coerce').dropna()
+    if pd.api.types.is_bool_dtype(series):
+        return normalize_keys(series).isin(set(keys)).to_numpy()
+    if pd.api.types.is_numeric_dtype(series):
+        return series.isin(numbers).to_numpy()
+    if pd.api.types.is_string_dtype(series) and not pd.api.types.is_object_dtype(series):
+        return series.str.strip().isin(set(keys)).to_numpy()
+    # object 列中可能同时有数字和文本
+    return series.isin(set(keys) | set(numbers)).to_numpy()
+
+
+def footprint_report(df, columns=CATEGORY_COLUMNS, group_columns=CUSTOMER_KEY_COLUMNS):
+    """
+    对比转换为分类类型前后的内存占用与分组计数耗时，返回汇总表
+    """
+    columns = [col for col in columns if col in df.columns]
+    group_columns = [col for col in group_columns if col in df.columns]
+    before = df[columns].astype(object)
+
+    start = time.perf_counter()
+    after = apply_schema(before.copy(), columns)
+    convert_seconds = time.perf_counter() - start
+
+    rows = []
+    for name, frame, observed in (('转换前(object)', before, False), ('转换后(category)', after, True)):
+        start = time.perf_counter()
+        if group_columns:
+            frame.groupby(group_columns, observed=observed).size()
+        group_seconds = time.perf_counter() - start
+        rows.append({
+            '类型': name,
+            '行数': len(frame),
+            '内存占用(MB)': round(frame.memory_usage(deep=True).sum() / 1024 / 1024, 2),
+            '分组计数耗时(秒)': round(group_seconds, 4)
+        })
+
+    report = pd.DataFrame(rows)
+    print(f"分类类型转换耗时：{convert_seconds:.4f} 秒")
+    print(report.to_string(index=False))
+    return report
+
+
+# 直接运行时对指定文件输出内存/耗时对比报告
+if __name__ == "__main__":
+    file_path = sys.argv[1] if len(sys.argv) > 1 else input("请输入要分析的文件路径：")
+    file_path = file_path.strip('"')
+    if file_path.lower().endswith('.csv'):
+        data = pd.read_csv(file_path)
+    else:
+        data = pd.read_excel(file_path)
+    footprint_report(data)
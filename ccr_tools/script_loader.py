@@ -0,0 +1,51 @@
+"""
+按路径或编号载入分析脚本（脚本文件名以数字开头，不能直接 import）
+"""
+import glob
+import hashlib
+import importlib.util
+import os
+import sys
+
+# 分析脚本所在目录
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def find_script(number):
+    """
+    按编号查找脚本路径，如 find_script(3) 返回“3.客户明细-...”脚本
+    """
+    for path in sorted(glob.glob(os.path.join(SCRIPT_DIR, f"{number}*.py"))):
+        name = os.path.basename(path)
+        if name[len(str(number))] in '.-_':
+            return path
+    raise ValueError(f"未找到编号为 {number} 的脚本")
+
+
+def load_script(script_path):
+    """
+    载入脚本并缓存到 sys.modules，同一脚本在同一进程内只载入一次
+    """
+    script_path = os.path.abspath(script_path)
+    module_name = 'ccr_script_' + hashlib.sha1(script_path.encode('utf-8')).hexdigest()[:12]
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except Exception:
+        del sys.modules[module_name]
+        raise
+    return module
+
+
+def call_script(script_path, func_name, *args, **kwargs):
+    """
+    调用脚本中的函数。可以直接提交给进程池，子进程中会按路径重新载入脚本
+    """
+    return getattr(load_script(script_path), func_name)(*args, **kwargs)
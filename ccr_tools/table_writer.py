@@ -0,0 +1,211 @@
+"""
+表格写出的公共工具：openpyxl 只写模式流式写出 Excel，超过行数上限时自动分表，
+也可以改为输出 CSV 或 Parquet
+"""
+import os
+
+import pandas as pd
+
+# Excel 单个工作表的最大行数（含表头）
+EXCEL_MAX_ROWS = 1048576
+
+# 每次转换写出的行数，控制转换时的内存占用
+WRITE_BLOCK_ROWS = 10000
+
+# 支持的输出格式
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+
+
+class StreamingExcelWriter:
+    """
+    逐块追加数据到工作表，数据直接写入临时文件，内存占用不随输出行数增长。
+    同一工作表超过行数上限时，后续数据写入“表名_2”、“表名_3”……
+    """
+
+    def __init__(self, path, max_rows=None):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.max_rows = max_rows or EXCEL_MAX_ROWS
+        self.workbook = Workbook(write_only=True)
+        self.sheets = {}
+
+    def write(self, df, sheet_name='Sheet1'):
+        state = self.sheets.get(sheet_name)
+        if state is None:
+            state = {'columns': list(df.columns), 'part': 0, 'sheet_rows': 0, 'total_rows': 0, 'worksheet': None}
+            self.sheets[sheet_name] = state
+            self._new_part(sheet_name, state)
+
+        for start in range(0, len(df), WRITE_BLOCK_ROWS):
+            block = df.iloc[start:start + WRITE_BLOCK_ROWS]
+            block = block.astype(object).where(block.notna(), None)
+            for row in block.itertuples(index=False, name=None):
+                if state['sheet_rows'] >= self.max_rows - 1:
+                    self._new_part(sheet_name, state)
+                state['worksheet'].append(row)
+                state['sheet_rows'] += 1
+                state['total_rows'] += 1
+
+    def _new_part(self, sheet_name, state):
+        state['part'] += 1
+        title = sheet_name[:31] if state['part'] == 1 else f"{sheet_name[:27]}_{state['part']}"
+        state['worksheet'] = self.workbook.create_sheet(title=title)
+        state['worksheet'].append(state['columns'])
+        state['sheet_rows'] = 0
+        if state['part'] > 1:
+            print(f"工作表 '{sheet_name}' 超过 Excel 行数上限，继续写入工作表 '{title}'")
+
+    def close(self):
+        """
+        保存文件，返回 {工作表名: 写出的数据行数}。先写入临时文件，完整写出后再替换目标文件
+        """
+        if not self.sheets:
+            self.workbook.create_sheet(title='Sheet1')
+        tmp_path = self.path + '.tmp'
+        try:
+            self.workbook.save(tmp_path)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            self.discard()
+            _remove(tmp_path)
+            raise
+        return {name: state['total_rows'] for name, state in self.sheets.items()}
+
+    def discard(self):
+        """
+        放弃写出：关闭各工作表并删除其临时文件，不生成目标文件
+        """
+        for worksheet in self.workbook.worksheets:
+            writer = getattr(worksheet, '_writer', None)
+            if writer is None or not os.path.exists(writer.out):
+                continue
+            try:
+                if not worksheet.closed:
+                    worksheet.close()
+            except Exception:
+                pass
+            writer.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+def _as_chunks(data, columns=None):
+    """
+    统一为分块迭代器；没有任何分块时，按 columns 补一个空表，保证输出带表头
+    """
+    if isinstance(data, pd.DataFrame):
+        yield data
+        return
+    empty = True
+    for chunk in data:
+        empty = False
+        yield chunk
+    if empty and columns is not None:
+        yield pd.DataFrame(columns=list(columns))
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_atomic(write_func, chunks, path):
+    """
+    先写入临时文件，完整写出后再替换目标文件，写出失败时不留下不完整的文件
+    """
+    tmp_path = path + '.tmp'
+    try:
+        rows = write_func(chunks, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        _remove(tmp_path)
+    return rows
+
+
+def _resolve_path(path, fmt):
+    fmt = (fmt or os.path.splitext(path)[1].lstrip('.') or 'xlsx').lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式：{fmt}，请使用 {'/'.join(OUTPUT_FORMATS)}")
+    return os.path.splitext(path)[0] + '.' + fmt, fmt
+
+
+def _write_csv(chunks, path):
+    rows = 0
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(path, mode='w' if header else 'a', header=header, index=False, encoding='utf-8-sig' if header else 'utf-8')
+        header = False
+        rows += len(chunk)
+    if header:
+        # 没有数据也没有列名时只能输出空文件
+        open(path, 'w').close()
+    return rows
+
+
+def _write_parquet(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            else:
+                table = table.cast(writer.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def write_sheets(sheets, path, fmt=None, columns=None):
+    """
+    写出多个工作表，sheets 为 {工作表名: DataFrame 或 DataFrame 分块迭代器}。
+    fmt 为 xlsx/csv/parquet，默认按 path 的扩展名；csv/parquet 格式每个工作表输出一个文件。
+    columns 为 {工作表名: 列名列表}，分块迭代器没有任何数据时按它写出表头。
+    返回 ({工作表名: 行数}, 实际输出路径列表)
+    """
+    columns = columns or {}
+    path, fmt = _resolve_path(path, fmt)
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if fmt == 'xlsx':
+        with StreamingExcelWriter(path) as writer:
+            for sheet_name, data in sheets.items():
+                for chunk in _as_chunks(data, columns.get(sheet_name)):
+                    writer.write(chunk, sheet_name)
+        return {name: state['total_rows'] for name, state in writer.sheets.items()}, [path]
+
+    row_counts, paths = {}, []
+    for sheet_name, data in sheets.items():
+        sheet_path = path if len(sheets) == 1 else f"{os.path.splitext(path)[0]}-{sheet_name}.{fmt}"
+        write_func = _write_csv if fmt == 'csv' else _write_parquet
+        row_counts[sheet_name] = _write_atomic(write_func, _as_chunks(data, columns.get(sheet_name)), sheet_path)
+        paths.append(sheet_path)
+    return row_counts, paths
+
+
+def write_table(data, path, sheet_name='Sheet1', fmt=None, columns=None):
+    """
+    写出单个表格（DataFrame 或 DataFrame 分块迭代器），返回实际输出路径。
+    columns 为没有任何数据时写出的表头
+    """
+    _, paths = write_sheets({sheet_name: data}, path, fmt, columns={sheet_name: columns} if columns is not None else None)
+    return paths[0]
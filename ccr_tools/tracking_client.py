@@ -0,0 +1,209 @@
+"""
+批量运单轨迹查询：把运单号列表按批次并发提交给轨迹查询接口，查询结果按“查询结果-运单号”表的格式逐批返回。
+接口地址、认证令牌、批次大小、并发数、重试次数和请求频率都可以配置；
+对接其他查询系统时继承 TrackingClient 并实现 query_batch 即可
+"""
+import http.client
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+# 查询接口地址和认证令牌，可通过环境变量 CCR_TRACKING_ENDPOINT / CCR_TRACKING_TOKEN 指定
+TRACKING_ENDPOINT_ENV = 'CCR_TRACKING_ENDPOINT'
+TRACKING_TOKEN_ENV = 'CCR_TRACKING_TOKEN'
+
+# 每批查询的运单数，与手工上传时的拆分行数一致
+DEFAULT_BATCH_SIZE = 5000
+
+# 查询结果的列，与轨迹系统导出的“查询结果-运单号”表一致
+TRACKING_COLUMNS = ['运单号', '操作时间', '操作名称', '操作网点']
+
+# 需要重试的 HTTP 状态码
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TrackingQueryError(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    限制请求频率：多个线程共用，相邻两次请求的间隔不小于 1 / rate 秒
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait_time = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+class TrackingClient(ABC):
+    """
+    轨迹查询客户端的接口：query_batch 接收一批运单号，返回 TRACKING_COLUMNS 格式的 DataFrame
+    """
+
+    @abstractmethod
+    def query_batch(self, waybills):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class HttpTrackingClient(TrackingClient):
+    """
+    通过 HTTP 接口查询：POST {"waybills": [...]}，返回 {"results": [{运单号, 操作时间, 操作名称, 操作网点}, ...]}。
+    每个线程保持一个长连接并重复使用；连接失败、超时和 429/5xx 响应按指数退避重试
+    """
+
+    def __init__(self, endpoint=None, token=None, timeout=60, max_retries=3, backoff=1.0, rate=None):
+        endpoint = endpoint or os.environ.get(TRACKING_ENDPOINT_ENV)
+        if not endpoint:
+            raise ValueError(f"未配置轨迹查询接口地址，请传入 endpoint 或设置环境变量 {TRACKING_ENDPOINT_ENV}")
+        parts = urlsplit(endpoint)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"不支持的接口地址：{endpoint}")
+
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.token = token or os.environ.get(TRACKING_TOKEN_ENV)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate_limiter = RateLimiter(rate)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_class(self.netloc, timeout=self.timeout)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _reset_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+
+    def _post(self, body):
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        conn = self._connection()
+        conn.request('POST', self.path, body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.getheader('Retry-After'), response.read()
+
+    def query_batch(self, waybills):
+        body = json.dumps({'waybills': list(waybills)}, ensure_ascii=False).encode('utf-8')
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.wait()
+            retry_after = None
+            try:
+                status, retry_after, data = self._post(body)
+            except (OSError, http.client.HTTPException) as e:
+                # 长连接被服务端关闭或超时，关闭后下次重新建立
+                self._reset_connection()
+                error = f"连接失败：{e}"
+            else:
+                if status == 200:
+                    return parse_tracking_results(json.loads(data.decode('utf-8')))
+                error = f"HTTP {status}"
+                if status not in RETRY_STATUS:
+                    raise TrackingQueryError(f"轨迹查询失败：{error}")
+
+            if attempt < self.max_retries:
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+                time.sleep(delay)
+        raise TrackingQueryError(f"轨迹查询失败（已重试 {self.max_retries} 次）：{error}")
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+
+
+def parse_tracking_results(payload):
+    """
+    把接口返回的 JSON 转换为“查询结果-运单号”表格式的 DataFrame
+    """
+    df = pd.DataFrame(payload.get('results', []))
+    for col in TRACKING_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+    df['运单号'] = df['运单号'].astype(str)
+    df['操作时间'] = pd.to_datetime(df['操作时间'], errors='coerce')
+    return df[TRACKING_COLUMNS]
+
+
+def prepare_waybills(waybills):
+    """
+    去除空值、首尾空格和重复的运单号，保持原有顺序
+    """
+    waybills = pd.Series(waybills).dropna().astype(str).str.strip()
+    return list(dict.fromkeys(waybill for waybill in waybills if waybill))
+
+
+def iter_batches(waybills, batch_size=DEFAULT_BATCH_SIZE):
+    for start in range(0, len(waybills), batch_size):
+        yield waybills[start:start + batch_size]
+
+
+def query_tracking(waybills, client, batch_size=DEFAULT_BATCH_SIZE, max_workers=4, progress=None):
+    """
+    分批并发查询运单轨迹，按批次顺序逐批返回查询结果 DataFrame。
+    同时在途的批次不超过 max_workers 的两倍，查询结果占用的内存与运单总数无关。
+    每完成一批调用 progress(已完成批数, 总批数, 该批运单数)
+    """
+    waybills = prepare_waybills(waybills)
+    total = (len(waybills) + batch_size - 1) // batch_size
+    batches = iter_batches(waybills, batch_size)
+
+    done = 0
+
+    def finish(future, size):
+        nonlocal done
+        result = future.result()
+        done += 1
+        if progress:
+            progress(done, total, size)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((executor.submit(client.query_batch, batch), len(batch)))
+            if len(in_flight) >= max_workers * 2:
+                yield finish(*in_flight.popleft())
+        while in_flight:
+            yield finish(*in_flight.popleft())
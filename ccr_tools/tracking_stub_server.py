@@ -0,0 +1,84 @@
+"""
+本地轨迹查询桩服务：按 HttpTrackingClient 的接口格式返回模拟的运单轨迹，用于在没有真实查询系统时联调。
+每个运单的轨迹由运单号确定，重复查询结果相同；fail_rate 大于 0 时随机返回 503，用于检验重试
+"""
+import hashlib
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 模拟轨迹的操作序列：(操作名称, 距上一环节的最长小时数)
+STUB_OPERATIONS = [('揽收', 0), ('到达分拨中心', 12), ('入柜', 48), ('派件', 24), ('签收', 12)]
+
+# 模拟轨迹的起始时间
+STUB_START = datetime(2026, 10, 1)
+
+
+def stub_tracks(waybill):
+    """
+    按运单号生成固定的模拟轨迹，部分运单只有前几个环节
+    """
+    seed = int(hashlib.md5(waybill.encode('utf-8')).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    operation_time = STUB_START + timedelta(minutes=rng.randrange(30 * 24 * 60))
+    tracks = []
+    for name, max_hours in STUB_OPERATIONS[:rng.randint(1, len(STUB_OPERATIONS))]:
+        operation_time += timedelta(minutes=rng.randrange(max_hours * 60 + 1))
+        tracks.append({
+            '运单号': waybill,
+            '操作时间': operation_time.strftime('%Y-%m-%d %H:%M:%S'),
+            '操作名称': name,
+            '操作网点': f"网点{seed % 50:02d}",
+        })
+    return tracks
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # 使用 HTTP/1.1 以支持客户端复用长连接
+    protocol_version = 'HTTP/1.1'
+    fail_rate = 0.0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if random.random() < self.fail_rate:
+            self._send(503, {'error': '服务繁忙'})
+            return
+        try:
+            waybills = json.loads(body.decode('utf-8'))['waybills']
+        except (ValueError, KeyError):
+            self._send(400, {'error': '请求格式错误'})
+            return
+        self._send(200, {'results': [track for waybill in waybills for track in stub_tracks(str(waybill))]})
+
+    def _send(self, status, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(port=8765, host='127.0.0.1', fail_rate=0.0):
+    """
+    创建桩服务（未启动），接口地址为 http://host:port/query
+    """
+    handler = type('StubHandler', (StubHandler,), {'fail_rate': fail_rate})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+# 直接运行时启动桩服务：python -m ccr_tools.tracking_stub_server [端口] [失败率]
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    fail_rate = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    server = make_server(port, fail_rate=fail_rate)
+    print(f"轨迹查询桩服务已启动：http://127.0.0.1:{port}/query")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ccr_tools import disk_cache, excel_cache, key_index  # noqa: E402
+from ccr_tools.disk_cache import DiskCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """
+    每个测试使用独立的缓存目录，不读写用户目录下的 ~/.ccr_cache
+    """
+    cache_dir = str(tmp_path / 'cache')
+    monkeypatch.setattr(disk_cache, 'DEFAULT_CACHE_DIR', cache_dir)
+    monkeypatch.setattr(disk_cache, '_fingerprints', DiskCache(cache_dir, namespace='fingerprint'))
+    monkeypatch.setattr(key_index, '_cache', DiskCache(cache_dir, namespace='key_index'))
+    monkeypatch.setattr(excel_cache, '_cache', DiskCache(cache_dir, namespace='excel'))
+    return cache_dir
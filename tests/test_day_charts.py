@@ -0,0 +1,17 @@
+import pandas as pd
+
+from ccr_tools.script_loader import find_script, load_script
+
+
+def test_background_failure_is_kept_and_reported(tmp_path, monkeypatch, capsys):
+    script = load_script(find_script(5))
+
+    def broken(*args, **kwargs):
+        raise OSError('磁盘已满')
+
+    monkeypatch.setattr(script, 'render_chart_files', broken)
+    thread = script.render_charts_in_background(pd.DataFrame(), str(tmp_path), 'D')
+    thread.join()
+
+    assert thread.result == {'success': False, 'message': '高清图表生成失败：磁盘已满', 'generated_charts': []}
+    assert '高清图表生成失败：磁盘已满' in capsys.readouterr().out
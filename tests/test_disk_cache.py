@@ -0,0 +1,38 @@
+import os
+from unittest import mock
+
+from ccr_tools.disk_cache import DiskCache
+
+
+def test_put_scans_directory_only_when_over_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1000, namespace='t')
+
+    with mock.patch('os.listdir', wraps=os.listdir) as listdir:
+        for i in range(20):
+            cache.put_text(f"k{i}", 'x' * 10)
+    # 首次写入扫描一次目录初始化总大小，之后未超过上限不再扫描
+    assert listdir.call_count == 1
+
+
+def test_evicts_least_recently_used_over_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250, namespace='t')
+    for i in range(3):
+        path = cache.put_text(f"k{i}", 'x' * 100)
+        os.utime(path, (i, i))
+
+    cache.put_text('k3', 'x' * 100)
+
+    assert cache.get_text('k0') is None
+    assert cache.get_text('k1') is None
+    assert cache.get_text('k2') is not None
+    assert cache.get_text('k3') is not None
+
+
+def test_overwrite_does_not_double_count(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=250, namespace='t')
+    for _ in range(5):
+        cache.put_text('k0', 'x' * 100)
+    cache.put_text('k1', 'x' * 100)
+
+    assert cache.get_text('k0') is not None
+    assert cache.get_text('k1') is not None
@@ -0,0 +1,69 @@
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from ccr_tools import excel_cache
+from ccr_tools.common_io import iter_table_chunks
+
+
+def write_export(tmp_path, df, name='导出.xlsx'):
+    path = tmp_path / name
+    df.to_excel(path, index=False)
+    return str(path)
+
+
+def export_frame(rows=25):
+    return pd.DataFrame({
+        'K码': [1001 + i % 3 for i in range(rows)],
+        '客户名称': [f"客户{i % 4}" for i in range(rows)],
+        '进线时间': pd.date_range('2026-10-01', periods=rows, freq='h'),
+        '进线-入库时间差': [i / 10 for i in range(rows)],
+    })
+
+
+def test_first_read_streams_and_builds_cache(tmp_path):
+    path = write_export(tmp_path, export_frame())
+
+    # 首次读取不调用 pd.read_excel 整表解析
+    with mock.patch('pandas.read_excel', side_effect=AssertionError('整表解析')):
+        chunks = list(iter_table_chunks(path, usecols=['K码', '进线时间'], chunksize=10))
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    assert list(chunks[0].columns) == ['K码', '进线时间']
+
+    cache_path = excel_cache.cached_table_path(path, build=False)
+    assert cache_path is not None and cache_path.endswith('.parquet')
+    cached = excel_cache.read_cached_table(cache_path)
+    expected = pd.read_excel(path)
+    assert cached['K码'].astype('int64').tolist() == expected['K码'].tolist()
+    assert cached['进线-入库时间差'].tolist() == expected['进线-入库时间差'].tolist()
+    assert cached['进线时间'].tolist() == expected['进线时间'].tolist()
+
+
+def test_stopping_early_does_not_cache(tmp_path):
+    path = write_export(tmp_path, export_frame())
+    chunks = iter_table_chunks(path, chunksize=10)
+    next(chunks)
+    chunks.close()
+    assert excel_cache.cached_table_path(path, build=False) is None
+
+
+def test_inconsistent_chunk_types_skip_cache(tmp_path):
+    # 第一块中全为空的列在后面的块中才出现值，各块类型无法统一
+    df = export_frame()
+    df['入库时间'] = [None] * 20 + list(pd.date_range('2026-10-02', periods=5, freq='h'))
+    path = write_export(tmp_path, df)
+
+    chunks = list(iter_table_chunks(path, chunksize=10))
+    assert sum(len(chunk) for chunk in chunks) == 25
+    assert chunks[2]['入库时间'].notna().all()
+    assert excel_cache.cached_table_path(path, build=False) is None
+
+    # 需要缓存路径的调用方退回到整表解析
+    assert len(excel_cache.read_excel_cached(path)) == 25
+
+
+def test_missing_columns(tmp_path):
+    path = write_export(tmp_path, export_frame())
+    with pytest.raises(ValueError, match='单号'):
+        list(iter_table_chunks(path, usecols=['K码', '单号']))
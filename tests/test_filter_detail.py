@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from ccr_tools.script_loader import find_script, load_script
+
+detail_script = load_script(find_script(2))
+
+
+@pytest.fixture
+def tables(tmp_path):
+    # 表格A为 CSV，K码为数字；表格B为 Excel，K码为整数
+    table_a = tmp_path / '原始表.csv'
+    pd.DataFrame({
+        '省区名称': ['浙江', '浙江', '浙江', '江苏', '浙江'],
+        '揽收网点名称': ['网点A', '网点A', '网点B', '网点A', '网点A'],
+        'K码': [1001, 1001, 1002, 1001, 1001],
+        '客户名称': ['甲', '甲', '乙', '甲', '甲'],
+        '工单小类': ['签收延误', '派送延误', '签收延误', '签收延误', '其他'],
+        '单号': ['YT001', 'YT002', 'YT003', 'YT004', 'YT005'],
+    }).to_csv(table_a, index=False)
+    table_b = tmp_path / '筛选条件.xlsx'
+    pd.DataFrame({'省区名称': ['浙江'], '揽收网点名称': ['网点A'], 'K码': [1001], '客户名称': ['甲']}).to_excel(table_b, index=False)
+    return str(table_a), str(table_b)
+
+
+@pytest.mark.parametrize('use_index', [True, False])
+def test_numeric_k_code_csv_with_extra_conditions(tables, tmp_path, capsys, use_index):
+    table_a, table_b = tables
+    output_dir = tmp_path / 'out'
+    result = detail_script.main(table_a, table_b, str(output_dir), 'T', '1', '0',
+                                extra_conditions='工单小类=签收延误,派送延误;K码=1001', use_index=use_index)
+    assert result['success'], result['message']
+
+    detail = pd.read_excel(output_dir / 'T-前1位客户明细.xlsx')
+    assert detail['单号'].tolist() == ['YT001', 'YT002']
+
+    output = capsys.readouterr().out
+    assert "应用条件 '工单小类 in ['签收延误', '派送延误']' 后的表格A数据行数：" in output
+    assert "应用条件 'K码 in ['1001']' 后的表格A数据行数：" in output
+
+
+def test_condition_filter_counts_rows_per_condition():
+    df = pd.DataFrame({'K码': [1001.0, 1002.0, None, 1001.0], '工单小类': ['签收延误', '签收延误', '签收延误', '其他']})
+    condition_filter = detail_script.ConditionFilter([('K码', ['1001']), ('工单小类', ['签收延误']), ('不存在', ['x'])],
+                                                     df.columns)
+    assert condition_filter(df).tolist() == [True, False, False, False]
+    assert condition_filter.remaining == [2, 1]
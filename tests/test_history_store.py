@@ -0,0 +1,81 @@
+import pandas as pd
+import pytest
+
+from ccr_tools.history_store import HistoryStore
+
+
+def write_detail(path, rows):
+    pd.DataFrame(rows, columns=['客户名称', '进线时间', '进线-入库时间差']).to_csv(path, index=False)
+    return str(path)
+
+
+def test_reimporting_corrected_file_replaces_its_rows(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'))
+    export = tmp_path / '10-02-客户-时间差值明细.csv'
+    other = write_detail(tmp_path / '另一份明细.csv', [['丙', '2026-10-02 12:00:00', 3.0]])
+
+    write_detail(export, [['甲', '2026-10-02 09:00:00', 1.5],
+                          ['乙', '2026-10-02 10:00:00', 0.5],
+                          ['甲', '2026-10-03 09:00:00', 2.5]])
+    store.append_file(str(export))
+    store.append_file(other)
+
+    # 修正后的导出少了一行，且不再包含 10-03 的明细
+    write_detail(export, [['甲', '2026-10-02 09:00:00', 1.5]])
+    assert [day.isoformat() for day in store.append_file(str(export))] == ['2026-10-02']
+
+    detail = store.load()
+    assert sorted(detail['客户名称']) == ['丙', '甲']
+    assert [day.isoformat() for day in store.dates()] == ['2026-10-02']
+
+    counts = store.day_counts(pd.Timestamp('2026-10-02').date())
+    assert counts.sum(axis=1).to_dict() == {'甲': 1, '丙': 1}
+
+    # 内容未变时再次导入直接跳过
+    store.append_file(str(export))
+    assert len(store.load()) == 2
+
+
+def test_load_only_requested_days(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'))
+    store.append_file(write_detail(tmp_path / 'a.csv', [['甲', '2026-10-01 09:00:00', 1.0],
+                                                        ['甲', '2026-10-02 09:00:00', 1.0],
+                                                        ['甲', '2026-10-03 09:00:00', 1.0]]))
+    detail = store.load(days=['2026-10-01', '2026-10-03'])
+    assert pd.to_datetime(detail['进线时间']).dt.day.tolist() == [1, 3]
+
+
+def test_failed_reimport_keeps_previous_rows(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / 'history'))
+    export = tmp_path / '明细.csv'
+    write_detail(export, [['甲', '2026-10-01 09:00:00', 1.0], ['乙', '2026-10-02 09:00:00', 1.0]])
+    store.append_file(str(export))
+
+    write_detail(export, [['丙', '2026-10-01 09:00:00', 1.0], ['丁', '2026-10-03 09:00:00', 1.0]])
+    original_write = HistoryStore._write_partition
+
+    def failing_write(self, day, part_name, df):
+        if day.day == 3:
+            raise OSError('磁盘已满')
+        return original_write(self, day, part_name, df)
+
+    monkeypatch.setattr(HistoryStore, '_write_partition', failing_write)
+    with pytest.raises(OSError):
+        store.append_file(str(export))
+
+    # 已写入的日期被新明细覆盖，其余日期保留以前导入的明细，不会重复
+    assert sorted(store.load()['客户名称']) == ['丙', '乙']
+
+    monkeypatch.setattr(HistoryStore, '_write_partition', original_write)
+    store.append_file(str(export))
+    assert sorted(store.load()['客户名称']) == ['丁', '丙']
+
+
+def test_day_counts_requires_counts_file(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'))
+    export = tmp_path / '无时间差.csv'
+    pd.DataFrame({'客户名称': ['甲'], '进线时间': ['2026-10-01 09:00:00']}).to_csv(export, index=False)
+    store.append_file(str(export))
+
+    with pytest.raises(ValueError, match='缺少日汇总'):
+        store.day_counts(pd.Timestamp('2026-10-01').date())
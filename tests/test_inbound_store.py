@@ -0,0 +1,20 @@
+import pandas as pd
+
+from ccr_tools.inbound_store import InboundStore
+
+
+def test_float_waybills_match_integer_waybills(tmp_path):
+    # 轨迹表中有一行运单号为空，运单号列被读成浮点数
+    tracking = tmp_path / '查询结果-运单号.csv'
+    pd.DataFrame({
+        '运单号': [10000000000, 10000000000, None, 10000000001],
+        '操作时间': ['2026-10-02 08:00:00', '2026-10-01 09:00:00', '2026-10-01 10:00:00', '2026-10-03 11:00:00'],
+        '操作名称': ['入柜', '入库', '入库', '派件'],
+    }).to_csv(tracking, index=False)
+
+    with InboundStore(str(tmp_path / 'inbound.sqlite')) as store:
+        store.update_from_file(str(tracking))
+        result = store.lookup(pd.Series([10000000000, 10000000001]))
+
+    assert result['运单号'].tolist() == ['10000000000']
+    assert result['操作时间'].tolist() == [pd.Timestamp('2026-10-01 09:00:00')]
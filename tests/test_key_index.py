@@ -0,0 +1,61 @@
+import pandas as pd
+
+from ccr_tools.key_index import OFFSET_COLUMN, load_key_index, read_matching_rows
+
+# 表格A：K码为数字，内容列含引号内的换行，中间有一个空行
+TABLE_A_CSV = (
+    '省区名称,揽收网点名称,K码,客户名称,单号,投诉/催查内容\n'
+    '浙江,网点A,1001,甲,YT001,"第一行\n第二行"\n'
+    '浙江,网点B,1002,乙,YT002,普通内容\n'
+    '\n'
+    '江苏,网点C,1001,甲,YT003,"含""引号""的内容"\n'
+    '浙江,网点A,1001,甲,YT004,末行\n'
+)
+
+
+def write_table_a(tmp_path):
+    path = tmp_path / '原始表.csv'
+    path.write_text(TABLE_A_CSV, encoding='utf-8')
+    return str(path)
+
+
+def test_numeric_k_code_csv_matches_integer_keys(tmp_path):
+    table_a = write_table_a(tmp_path)
+    # 表格B从 Excel 读入时 K码 为整数
+    keys = pd.DataFrame({'省区名称': ['浙江'], '揽收网点名称': ['网点A'], 'K码': [1001], '客户名称': ['甲']})
+
+    index = load_key_index(table_a)
+    assert pd.api.types.is_integer_dtype(index['K码'].cat.categories)
+
+    rows, total_rows = read_matching_rows(table_a, keys)
+    assert total_rows == 4
+    assert rows['单号'].tolist() == ['YT001', 'YT004']
+    assert rows['投诉/催查内容'].tolist() == ['第一行\n第二行', '末行']
+
+
+def test_csv_rows_are_read_by_byte_offset(tmp_path):
+    table_a = write_table_a(tmp_path)
+    index = load_key_index(table_a)
+    assert OFFSET_COLUMN in index.columns
+
+    keys = pd.DataFrame({'省区名称': ['江苏'], '揽收网点名称': ['网点C'], 'K码': [1001], '客户名称': ['甲']})
+    rows, _ = read_matching_rows(table_a, keys)
+    assert rows['单号'].tolist() == ['YT003']
+    assert rows['投诉/催查内容'].tolist() == ['含"引号"的内容']
+
+
+def test_matched_rows_keep_whole_file_dtypes(tmp_path):
+    # 匹配到的行中“网点编码”只有数字、“时效”只有整数，但整列分别是文本和浮点数
+    path = tmp_path / '原始表.csv'
+    path.write_text(
+        '省区名称,揽收网点名称,K码,客户名称,网点编码,时效\n'
+        '浙江,网点A,1001,甲,001,2\n'
+        '浙江,网点B,1002,乙,A01,2.5\n',
+        encoding='utf-8'
+    )
+    keys = pd.DataFrame({'省区名称': ['浙江'], '揽收网点名称': ['网点A'], 'K码': [1001], '客户名称': ['甲']})
+
+    rows, _ = read_matching_rows(str(path), keys)
+    assert rows['网点编码'].tolist() == ['001']
+    assert rows['时效'].dtype == 'float64'
+    assert rows['K码'].tolist() == [1001]
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ccr_tools.pivot_engine import pivot_counts
+
+KEYS = ['省区名称', '揽收网点名称', '客户名称']
+STATUS = ['无入库', '入库前', '入库后']
+BUCKETS = ['1天以内', '2天以内', '3天以内', '超过3天']
+MEASURES = {
+    '入库前后': ('入库前后', STATUS),
+    '分布区间': ('分布区间', BUCKETS),
+}
+
+
+@pytest.fixture
+def detail():
+    df = pd.DataFrame({
+        '省区名称': ['浙江', '浙江', '浙江', '江苏', '浙江', '江苏', '浙江', '广东'],
+        '揽收网点名称': ['网点B', '网点A', '网点A', '网点C', '网点B', '网点C', '网点A', '网点D'],
+        '客户名称': ['乙', '甲', '甲', '丙', '乙', '丁', '乙', '戊'],
+        '入库前后': ['入库后', '入库前', '入库后', '无入库', '入库后', None, '其他', None],
+        '分布区间': ['1天以内', None, '超过3天', None, '2天以内', None, None, None],
+    })
+    # 键列为分类类型，字典中有明细里没有出现的取值
+    for key in KEYS:
+        df[key] = pd.Categorical(df[key], categories=sorted(set(df[key])) + ['未使用'])
+    return df
+
+
+def expected_pivot(df, keys, column, categories, margins=True):
+    """
+    用 pd.pivot_table 计算的参考结果（aggfunc='size' 与 margins=True 同时使用时 pandas 会报错，
+    对常数列 count 与 size 相同）
+    """
+    valid = df[df[column].isin(categories)].astype({key: object for key in keys}).assign(计数=1)
+    table = pd.pivot_table(valid, index=keys, columns=column, values='计数', aggfunc='count',
+                           fill_value=0, margins=margins, margins_name='总计')
+    return table.reindex(columns=categories + (['总计'] if margins else []), fill_value=0)
+
+
+@pytest.mark.parametrize('measure', list(MEASURES))
+def test_pivot_counts_matches_pivot_table(detail, measure):
+    column, categories = MEASURES[measure]
+    pivot = pivot_counts(detail, KEYS, MEASURES)
+    expected = expected_pivot(detail, KEYS, column, categories)
+
+    sheet = pivot.sheet(measure, total_label='总计', label_column='省区名称')
+    body, total_row = sheet.iloc[:-1], sheet.iloc[-1]
+    body_index = pd.MultiIndex.from_frame(body[KEYS].astype(object))
+
+    # pivot_table 不输出没有任何计数的分组，pivot_counts 保留这些分组并计为 0
+    observed = expected.drop(index='总计', level=0).reindex(body_index, fill_value=0)
+    assert body[categories + ['总计']].to_numpy().tolist() == observed.to_numpy().tolist()
+    assert total_row[categories + ['总计']].tolist() == expected.loc['总计'].iloc[0].tolist()
+    assert total_row['省区名称'] == '总计'
+
+
+def test_pivot_counts_groups(detail):
+    pivot = pivot_counts(detail, KEYS, MEASURES)
+    # 分组按键排序，只包含明细中出现过的组合（不含字典中未使用的取值）
+    expected_groups = detail[KEYS].astype(object).drop_duplicates().sort_values(KEYS)
+    assert pivot.key_frame.astype(object).values.tolist() == expected_groups.values.tolist()
+    assert '未使用' not in set(pivot.key_frame.astype(object).to_numpy().ravel())
+
+    # 入库前后全为空或不在类别中的分组计数全为 0
+    empty_groups = pivot.key_frame['客户名称'].astype(object).isin(['丁', '戊']).to_numpy()
+    assert not pivot.counts['入库前后'][empty_groups].any()
+
+
+def test_pivot_counts_empty_frame(detail):
+    pivot = pivot_counts(detail.iloc[:0], KEYS, MEASURES)
+    assert len(pivot.key_frame) == 0
+    assert pivot.counts['入库前后'].shape == (0, len(STATUS))
+    sheet = pivot.sheet('入库前后', total_label='总计')
+    assert sheet['总计'].tolist() == [0]
+
+
+def expected_rollup_rows(key_frame):
+    """
+    按定义逐行构造分层汇总的行顺序：网点小计紧跟该网点的明细，省区小计紧跟该省区的最后一个网点小计，总计在最后
+    """
+    groups = [tuple(row) for row in key_frame.astype(object).itertuples(index=False)]
+    rows = []
+    for i, (province, site, customer) in enumerate(groups):
+        rows.append((province, site, customer))
+        next_group = groups[i + 1] if i + 1 < len(groups) else None
+        if next_group is None or next_group[:2] != (province, site):
+            rows.append((province, site, '小计'))
+        if next_group is None or next_group[0] != province:
+            rows.append((province, '小计', ''))
+    rows.append(('总计', '', ''))
+    return rows
+
+
+def test_rollup_row_placement(detail):
+    pivot = pivot_counts(detail, KEYS, MEASURES)
+    rolled = pivot.rollup([0, 1, 2])
+    rows = [tuple(row) for row in rolled.key_frame.itertuples(index=False)]
+    assert rows == expected_rollup_rows(pivot.key_frame)
+
+
+@pytest.mark.parametrize('measure', list(MEASURES))
+def test_rollup_subtotals_match_pivot_table(detail, measure):
+    column, categories = MEASURES[measure]
+    rolled = pivot_counts(detail, KEYS, MEASURES).rollup([0, 1, 2])
+    key_frame = rolled.key_frame
+    counts = rolled.counts[measure]
+
+    # 省区+网点小计
+    expected = expected_pivot(detail, KEYS[:2], column, categories, margins=False)
+    for i in np.flatnonzero((key_frame['客户名称'] == '小计').to_numpy()):
+        key = tuple(key_frame.loc[i, KEYS[:2]])
+        want = expected.loc[key].tolist() if key in expected.index else [0] * len(categories)
+        assert counts[i].tolist() == want
+
+    # 省区小计
+    expected = expected_pivot(detail, KEYS[:1], column, categories, margins=False)
+    for i in np.flatnonzero((key_frame['揽收网点名称'] == '小计').to_numpy()):
+        province = key_frame.loc[i, '省区名称']
+        want = expected.loc[province].tolist() if province in expected.index else [0] * len(categories)
+        assert counts[i].tolist() == want
+
+    # 总计与 margins 一致
+    expected = expected_pivot(detail, KEYS, column, categories)
+    assert counts[-1].tolist() == expected.loc['总计'].iloc[0, :-1].tolist()
+    assert rolled.sheet(measure)['总计'].iloc[-1] == expected.loc['总计'].iloc[0, -1]
+
+
+def test_rollup_keeps_detail_rows(detail):
+    pivot = pivot_counts(detail, KEYS, MEASURES)
+    rolled = pivot.rollup([0, 1, 2])
+    is_detail = ~rolled.key_frame.isin(['小计', '总计']).any(axis=1).to_numpy()
+    assert rolled.counts['入库前后'][is_detail].tolist() == pivot.counts['入库前后'].tolist()
+
+
+def test_rollup_empty_and_invalid_levels(detail):
+    empty = pivot_counts(detail.iloc[:0], KEYS, MEASURES).rollup([0, 1, 2])
+    assert len(empty.key_frame) == 0
+
+    with pytest.raises(ValueError):
+        pivot_counts(detail, KEYS, MEASURES).rollup([3])
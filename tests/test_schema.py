@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ccr_tools.schema import key_mask, normalize_keys
+
+
+@pytest.mark.parametrize('series, expected', [
+    (pd.Series([1e10, np.nan, 1.5]), ['10000000000', None, '1.5']),
+    (pd.Series([1001, 1002]), ['1001', '1002']),
+    (pd.Series([' YT001', None]), ['YT001', None]),
+    (pd.Series([1001, 'K9', None], dtype=object), ['1001', 'K9', None]),
+    (pd.Series([1001.0, np.nan], dtype='category'), ['1001', None]),
+])
+def test_normalize_keys(series, expected):
+    result = normalize_keys(series)
+    assert [None if pd.isna(value) else value for value in result] == expected
+
+
+@pytest.mark.parametrize('series', [
+    pd.Series([10000000000.0, np.nan, 10000000001.0]),
+    pd.Series([10000000000, 12, 10000000001]),
+    pd.Series(['10000000000', None, '10000000001']),
+    pd.Series([10000000000, 'K9', 10000000001], dtype=object),
+    pd.Series(['10000000000', 'K9', '10000000001'], dtype='category'),
+])
+def test_key_mask_matches_without_converting_rows(series):
+    keys = set(normalize_keys(pd.Series([10000000000, 10000000001])))
+    assert key_mask(series, keys).tolist() == [True, False, True]
@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ccr_tools.script_loader import find_script, load_script
+
+split_script = load_script(find_script(7))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    path = tmp_path / 'data'
+    path.mkdir()
+    return path
+
+
+def write_waybills(data_dir, count, name='单号列表.csv'):
+    path = data_dir / name
+    pd.DataFrame({'运单号': [f"YT{i:08d}" for i in range(count)]}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_small_file_is_not_copied(data_dir):
+    path = write_waybills(data_dir, 5)
+    assert split_script.split_excel_file(path, rows_per_file=5) == [path]
+    assert sorted(os.listdir(data_dir)) == ['单号列表.csv']
+
+
+def test_split_by_rows(data_dir):
+    path = write_waybills(data_dir, 12)
+    split_files = split_script.split_excel_file(path, rows_per_file=5)
+    assert [len(pd.read_csv(split_file)) for split_file in split_files] == [5, 5, 2]
+
+
+def test_small_file_is_converted_when_format_changes(data_dir):
+    path = write_waybills(data_dir, 3)
+    split_files = split_script.split_excel_file(path, rows_per_file=5, output_format='xlsx')
+    assert [os.path.basename(split_file) for split_file in split_files] == ['单号列表_1.xlsx']
+    assert len(pd.read_excel(split_files[0])) == 3
+
+
+def test_partial_split_is_removed_on_error(data_dir, monkeypatch):
+    path = write_waybills(data_dir, 12)
+    original_append = split_script.SplitPartWriter.append
+
+    def failing_append(self, row):
+        if self.path.endswith('_3.csv'):
+            raise OSError('磁盘已满')
+        original_append(self, row)
+
+    monkeypatch.setattr(split_script.SplitPartWriter, 'append', failing_append)
+    assert split_script.split_excel_file(path, rows_per_file=5) is None
+    assert sorted(os.listdir(data_dir)) == ['单号列表.csv']
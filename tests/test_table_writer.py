@@ -0,0 +1,74 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+from ccr_tools import table_writer
+from ccr_tools.table_writer import write_sheets, write_table
+
+
+def frame(rows):
+    return pd.DataFrame({'单号': [f"W{i:04d}" for i in range(rows)], '数量': list(range(rows))})
+
+
+def chunks(rows, size=4):
+    df = frame(rows)
+    for start in range(0, rows, size):
+        yield df.iloc[start:start + size]
+
+
+def test_rows_over_limit_split_into_sheets_with_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(table_writer, 'EXCEL_MAX_ROWS', 5)
+    path = str(tmp_path / '结果.xlsx')
+
+    row_counts, paths = write_sheets({'明细': chunks(10), '汇总': frame(3)}, path)
+
+    assert row_counts == {'明细': 10, '汇总': 3}
+    workbook = load_workbook(paths[0], read_only=True)
+    # 每个工作表最多 5 行（含表头），10 行数据分到 3 个工作表
+    assert workbook.sheetnames == ['明细', '明细_2', '明细_3', '汇总']
+    values = []
+    for title in ['明细', '明细_2', '明细_3']:
+        rows = list(workbook[title].iter_rows(values_only=True))
+        assert rows[0] == ('单号', '数量')
+        assert len(rows) <= 5
+        values.extend(row[1] for row in rows[1:])
+    assert values == list(range(10))
+    workbook.close()
+
+
+def test_failed_write_leaves_no_partial_file(tmp_path):
+    def broken_chunks():
+        yield frame(3)
+        raise RuntimeError('读取中断')
+
+    output_dir = tmp_path / 'out'
+    for fmt in ('xlsx', 'csv', 'parquet'):
+        with pytest.raises(RuntimeError):
+            write_table(broken_chunks(), str(output_dir / f"结果.{fmt}"))
+        assert os.listdir(output_dir) == []
+
+
+def test_failed_rewrite_keeps_previous_file(tmp_path):
+    path = write_table(frame(3), str(tmp_path / '结果.xlsx'))
+
+    def broken_chunks():
+        yield frame(5)
+        raise RuntimeError('读取中断')
+
+    with pytest.raises(RuntimeError):
+        write_table(broken_chunks(), path)
+    assert pd.read_excel(path)['数量'].tolist() == [0, 1, 2]
+
+
+@pytest.mark.parametrize('fmt', ['xlsx', 'csv'])
+def test_empty_chunks_write_header(tmp_path, fmt):
+    path = write_table(iter([]), str(tmp_path / f"结果.{fmt}"), sheet_name='查询结果', columns=['单号', '数量'])
+
+    if fmt == 'xlsx':
+        result = pd.read_excel(path, sheet_name='查询结果')
+    else:
+        result = pd.read_csv(path, encoding='utf-8-sig')
+    assert list(result.columns) == ['单号', '数量']
+    assert result.empty
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ccr_tools.script_loader import find_script, load_script
+
+time_diff_script = load_script(find_script(3))
+
+
+def detail_with_blank_waybill():
+    # 单号列有一个空值，读入后为 float64（10000000000.0）
+    return pd.DataFrame({
+        '省区名称': ['浙江', '浙江', '浙江'],
+        '单号': [10000000000, np.nan, 10000000001],
+        '揽收网点名称': ['网点A', '网点A', '网点B'],
+        'K码': [1001, 1001, 1002],
+        '客户名称': ['甲', '甲', '乙'],
+        '进线时间': ['2026-10-03 09:00:00', '2026-10-03 10:00:00', '2026-10-03 11:00:00'],
+        '工单小类': ['签收延误', '签收延误', '派送延误'],
+        '投诉/催查内容': ['a', 'b', 'c'],
+    })
+
+
+@pytest.fixture
+def tracking_path(tmp_path):
+    path = tmp_path / '查询结果-运单号.csv'
+    pd.DataFrame({
+        '运单号': [10000000000, 10000000000, 10000000001],
+        '操作时间': ['2026-10-02 09:00:00', '2026-10-01 09:00:00', '2026-10-04 09:00:00'],
+        '操作名称': ['入柜', '入库', '入柜'],
+    }).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('mode', ['chunked', 'store', 'in_memory'])
+def test_blank_waybill_does_not_break_matching(tracking_path, tmp_path, mode):
+    df_a = detail_with_blank_waybill()
+    assert df_a['单号'].dtype == np.float64
+
+    if mode == 'chunked':
+        result = time_diff_script.build_time_diff_detail(df_a, tracking_path)
+    elif mode == 'store':
+        result = time_diff_script.build_time_diff_detail(df_a, tracking_path, str(tmp_path / 'inbound.sqlite'))
+    else:
+        result = time_diff_script.build_time_diff_detail(df_a, tracking_path, chunksize=None)
+
+    assert result['入库时间'].tolist()[0] == pd.Timestamp('2026-10-01 09:00:00')
+    assert pd.isna(result['入库时间'].tolist()[1])
+    assert result['入库时间'].tolist()[2] == pd.Timestamp('2026-10-04 09:00:00')
+    assert result['入库前后'].tolist() == ['入库后', '无入库', '入库前']
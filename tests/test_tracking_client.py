@@ -0,0 +1,62 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from ccr_tools.script_loader import find_script, load_script
+from ccr_tools.tracking_client import HttpTrackingClient, TrackingClient, TRACKING_COLUMNS, query_tracking
+from ccr_tools.tracking_stub_server import make_server
+
+
+def test_tracking_client_requires_query_batch():
+    with pytest.raises(TypeError):
+        TrackingClient()
+
+    class IncompleteClient(TrackingClient):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteClient()
+
+
+def test_query_tracking_against_stub_server():
+    server = make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}/query"
+        waybills = [f"YT{i:08d}" for i in range(25)] + ['YT00000000', None]
+        with HttpTrackingClient(endpoint) as client:
+            result = pd.concat(query_tracking(waybills, client, batch_size=10, max_workers=2), ignore_index=True)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert list(result.columns) == TRACKING_COLUMNS
+    assert result['运单号'].nunique() == 25
+
+
+class EmptyClient(TrackingClient):
+    def query_batch(self, waybills):
+        return pd.DataFrame(columns=TRACKING_COLUMNS)
+
+
+def test_read_waybills_normalizes_numeric_keys(tmp_path):
+    script = load_script(find_script(15))
+    path = tmp_path / '单号列表.xlsx'
+    pd.DataFrame({'单号': [123456789012.0, None, 987654321098.0]}).to_excel(path, index=False)
+
+    assert script.read_waybills(str(path)).tolist() == ['123456789012', '987654321098']
+
+
+def test_empty_input_writes_header(tmp_path):
+    script = load_script(find_script(15))
+    path = tmp_path / '单号列表.csv'
+    pd.DataFrame({'单号': []}).to_csv(path, index=False)
+
+    result = script.main(str(path), str(tmp_path / 'out'), 'D', client=EmptyClient())
+
+    assert result['success'], result['message']
+    output = pd.read_excel(result['output_path'], sheet_name='查询结果')
+    assert list(output.columns) == TRACKING_COLUMNS
+    assert output.empty